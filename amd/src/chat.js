@@ -16,6 +16,7 @@
 define(['jquery', 'core/ajax', 'core/notification', 'core/str'], function($, Ajax, Notification, Str) {
 
     var currentChatId = null;
+    var courseId = 0;
     var backendUrl = '';
     var sesskey = '';
     var userId = 0;
@@ -26,6 +27,7 @@ define(['jquery', 'core/ajax', 'core/notification', 'core/str'], function($, Aja
     var init = function(config) {
         userId = config.userid;
         currentChatId = config.chatid;
+        courseId = config.courseid;
         backendUrl = config.backendurl;
         sesskey = config.sesskey;
 
@@ -232,6 +234,18 @@ define(['jquery', 'core/ajax', 'core/notification', 'core/str'], function($, Aja
         $('#chat-messages').append($thinking);
         scrollToBottom();
 
+        var complete = function() {
+            $input.prop('disabled', false);
+            $('#send-btn').prop('disabled', false);
+            $input.focus();
+        };
+
+        // Stream the answer where the browser supports it
+        if (window.fetch && window.TextDecoder && window.ReadableStream) {
+            streamMessage(message, $thinking).then(complete);
+            return;
+        }
+
         // Send to backend
         $.ajax({
             url: M.cfg.wwwroot + '/local/aiassistant/api.php',
@@ -240,6 +254,7 @@ define(['jquery', 'core/ajax', 'core/notification', 'core/str'], function($, Aja
                 action: 'chat',
                 message: message,
                 chatid: currentChatId || 0,
+                courseid: courseId,
                 theme: $('#theme-select').val(),
                 sesskey: M.cfg.sesskey
             },
@@ -262,11 +277,112 @@ define(['jquery', 'core/ajax', 'core/notification', 'core/str'], function($, Aja
                 $thinking.remove();
                 Notification.alert('Error', 'Could not send message: ' + error, 'OK');
             },
-            complete: function() {
-                $input.prop('disabled', false);
-                $('#send-btn').prop('disabled', false);
-                $input.focus();
+            complete: complete
+        });
+    };
+
+    /**
+     * Send a message and render the answer as it streams in
+     *
+     * @param {String} message User message
+     * @param {jQuery} $thinking Placeholder element that receives the tokens
+     * @return {Promise} Resolved when the stream has finished
+     */
+    var streamMessage = function(message, $thinking) {
+        var body = new URLSearchParams();
+        body.append('action', 'chatstream');
+        body.append('message', message);
+        body.append('chatid', currentChatId || 0);
+        body.append('courseid', courseId);
+        body.append('theme', $('#theme-select').val());
+        body.append('sesskey', M.cfg.sesskey);
+
+        var $content = $thinking.find('.message-content');
+        var decoder = new TextDecoder();
+        var buffer = '';
+        var text = '';
+        var finished = false;
+        var newChat = !currentChatId;
+
+        var handleEvent = function(event) {
+            switch (event.type) {
+                case 'chat':
+                    currentChatId = event.chatid;
+                    break;
+                case 'token':
+                    $thinking.removeClass('thinking');
+                    text += event.content;
+                    $content.html(formatMessage(text));
+                    scrollToBottom();
+                    break;
+                case 'done':
+                    finished = true;
+                    $thinking.remove();
+                    appendMessage('assistant', event.content, event);
+                    break;
+                case 'error':
+                    Notification.alert('Error', event.detail || 'An error occurred', 'OK');
+                    break;
+            }
+        };
+
+        // Events are separated by a blank line; only complete frames are handled
+        var processBuffer = function() {
+            var boundary = buffer.indexOf('\n\n');
+            while (boundary !== -1) {
+                var frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                var data = frame.split('\n').filter(function(line) {
+                    return line.indexOf('data:') === 0;
+                }).map(function(line) {
+                    return line.slice(5).trim();
+                }).join('');
+
+                if (data) {
+                    handleEvent(JSON.parse(data));
+                }
+                boundary = buffer.indexOf('\n\n');
+            }
+        };
+
+        return fetch(M.cfg.wwwroot + '/local/aiassistant/api.php', {
+            method: 'POST',
+            body: body,
+            credentials: 'same-origin',
+            headers: {'Accept': 'text/event-stream'}
+        }).then(function(response) {
+            if (!response.ok || !response.body) {
+                throw new Error('HTTP ' + response.status);
+            }
+
+            var reader = response.body.getReader();
+            var read = function() {
+                return reader.read().then(function(result) {
+                    if (result.done) {
+                        buffer += decoder.decode();
+                        processBuffer();
+                        return null;
+                    }
+                    buffer += decoder.decode(result.value, {stream: true});
+                    processBuffer();
+                    return read();
+                });
+            };
+            return read();
+        }).then(function() {
+            if (!finished) {
+                $thinking.remove();
+                if (text) {
+                    appendMessage('assistant', text, {});
+                }
+            }
+            if (newChat) {
+                loadChatHistory();
             }
+        }).catch(function(error) {
+            $thinking.remove();
+            Notification.alert('Error', 'Could not send message: ' + error.message, 'OK');
         });
     };
 
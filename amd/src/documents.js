@@ -18,6 +18,9 @@ define(['jquery', 'core/notification'], function($, Notification) {
     var backendUrl = '';
     var sesskey = '';
 
+    /** Milliseconds between status checks of documents being ingested */
+    var POLL_INTERVAL = 3000;
+
     /**
      * Initialize document management
      */
@@ -36,6 +39,52 @@ define(['jquery', 'core/notification'], function($, Notification) {
             e.preventDefault();
             addURL();
         });
+
+        pollStatuses();
+    };
+
+    /**
+     * Refresh documents that are still being ingested until they finish
+     */
+    var pollStatuses = function() {
+        var rows = $('tr[data-documentid]').filter(function() {
+            var status = $(this).attr('data-status');
+            return status === 'pending' || status === 'processing';
+        });
+        if (!rows.length) {
+            return;
+        }
+
+        var requests = rows.map(function() {
+            var row = $(this);
+            return $.ajax({
+                url: M.cfg.wwwroot + '/local/aiassistant/api.php',
+                method: 'POST',
+                data: {
+                    action: 'documentstatus',
+                    sesskey: M.cfg.sesskey,
+                    documentid: row.attr('data-documentid')
+                }
+            }).done(function(response) {
+                if (!response.success) {
+                    return;
+                }
+                var label = response.statuslabel;
+                var progress = response.progress;
+                if (response.status === 'processing' && progress) {
+                    label += progress.total_pages
+                        ? ' (' + progress.pages_done + '/' + progress.total_pages + ')'
+                        : ' (' + progress.upserted + ')';
+                }
+                row.attr('data-status', response.status);
+                row.find('.document-status').text(label);
+                row.find('.document-chunks').text(response.chunks);
+            });
+        }).get();
+
+        $.when.apply($, requests).always(function() {
+            setTimeout(pollStatuses, POLL_INTERVAL);
+        });
     };
 
     /**
@@ -46,6 +95,7 @@ define(['jquery', 'core/notification'], function($, Notification) {
         formData.append('action', 'upload_document');
         formData.append('sesskey', M.cfg.sesskey);
         formData.append('title', $('#pdf-title').val());
+        formData.append('courseid', $('#pdf-course').val());
         formData.append('file', $('#pdf-file')[0].files[0]);
 
         // Disable form
@@ -92,7 +142,9 @@ define(['jquery', 'core/notification'], function($, Notification) {
                 action: 'add_url',
                 sesskey: M.cfg.sesskey,
                 title: title,
-                url: url
+                url: url,
+                crawl: $('#url-crawl').is(':checked') ? 1 : 0,
+                courseid: $('#url-course').val()
             },
             success: function(response) {
                 if (response.success) {
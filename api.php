@@ -32,12 +32,19 @@ try {
             $message = required_param('message', PARAM_RAW);
             $chatid = optional_param('chatid', 0, PARAM_INT);
             $theme = optional_param('theme', 'default', PARAM_ALPHA);
+            $courseid = optional_param('courseid', 0, PARAM_INT);
 
-            // Create new chat if needed
+            // Create new chat if needed, in the course it was opened from
             if (empty($chatid)) {
-                $chatid = \local_aiassistant\chat_manager::create_chat($USER->id, $theme);
+                if ($courseid && !can_access_course(get_course($courseid))) {
+                    throw new moodle_exception('nopermission');
+                }
+                $chatid = \local_aiassistant\chat_manager::create_chat($USER->id, $theme, '', $courseid);
             }
 
+            // Retrieval stays within the chat's course and site-wide documents
+            $courseid = \local_aiassistant\chat_manager::get_course_id($chatid);
+
             // Save user message
             \local_aiassistant\chat_manager::add_message($chatid, 'user', $message);
 
@@ -52,7 +59,7 @@ try {
 
             // Call backend API
             $backendurl = get_config('local_aiassistant', 'backendurl');
-            $response = \local_aiassistant\api_client::chat($backendurl, $message, $messages, $userage);
+            $response = \local_aiassistant\api_client::chat($backendurl, $message, $messages, $userage, $chatid, $courseid);
 
             // Save assistant response
             \local_aiassistant\chat_manager::add_message($chatid, 'assistant', $response['content'], [
@@ -67,6 +74,75 @@ try {
             ]);
             break;
 
+        case 'chatstream':
+            require_capability('local/aiassistant:use', context_system::instance());
+            $message = required_param('message', PARAM_RAW);
+            $chatid = optional_param('chatid', 0, PARAM_INT);
+            $theme = optional_param('theme', 'default', PARAM_ALPHA);
+            $courseid = optional_param('courseid', 0, PARAM_INT);
+
+            // Create new chat if needed, in the course it was opened from
+            if (empty($chatid)) {
+                if ($courseid && !can_access_course(get_course($courseid))) {
+                    throw new moodle_exception('nopermission');
+                }
+                $chatid = \local_aiassistant\chat_manager::create_chat($USER->id, $theme, '', $courseid);
+            }
+
+            // Retrieval stays within the chat's course and site-wide documents
+            $courseid = \local_aiassistant\chat_manager::get_course_id($chatid);
+
+            // Save user message
+            \local_aiassistant\chat_manager::add_message($chatid, 'user', $message);
+
+            // Get chat history for context
+            $messages = \local_aiassistant\chat_manager::get_messages($chatid);
+
+            // Get user age for age-based responses
+            $userage = null;
+            if (get_config('local_aiassistant', 'enableageresponses') && !empty($USER->profile['age'])) {
+                $userage = $USER->profile['age'];
+            }
+
+            // Release the session lock so other requests are not blocked while streaming
+            \core\session\manager::write_close();
+
+            header('Content-Type: text/event-stream');
+            header('Cache-Control: no-cache');
+            header('X-Accel-Buffering: no');
+            while (ob_get_level() > 0) {
+                ob_end_flush();
+            }
+
+            $send = function($frame) {
+                echo $frame;
+                flush();
+            };
+            $send("event: chat\ndata: " . json_encode(['type' => 'chat', 'chatid' => $chatid]) . "\n\n");
+
+            // Relay backend events to the browser as they arrive
+            try {
+                $backendurl = get_config('local_aiassistant', 'backendurl');
+                $response = \local_aiassistant\api_client::chat_stream($backendurl, $message, $messages, $userage, $chatid,
+                    function($event, $frame) use ($send) {
+                        $send($frame);
+                    },
+                    $courseid
+                );
+            } catch (Exception $e) {
+                $send("event: error\ndata: " . json_encode(['type' => 'error', 'detail' => $e->getMessage()]) . "\n\n");
+                break;
+            }
+
+            // Save assistant response
+            if ($response) {
+                \local_aiassistant\chat_manager::add_message($chatid, 'assistant', $response['content'], [
+                    'sources' => $response['sources'] ?? [],
+                    'model' => $response['model'] ?? '',
+                ]);
+            }
+            break;
+
         case 'get_history':
             require_capability('local/aiassistant:use', context_system::instance());
             $chats = \local_aiassistant\chat_manager::get_user_chats($USER->id);
@@ -114,6 +190,10 @@ try {
         case 'upload_document':
             require_capability('local/aiassistant:managecontent', context_system::instance());
             $title = required_param('title', PARAM_TEXT);
+            $courseid = optional_param('courseid', 0, PARAM_INT);
+            if ($courseid) {
+                get_course($courseid); // Throws if the course does not exist.
+            }
 
             // Handle file upload
             if (isset($_FILES['file']) && $_FILES['file']['error'] === UPLOAD_ERR_OK) {
@@ -131,12 +211,19 @@ try {
                         'pdf',
                         $USER->id,
                         '',
-                        $filepath
+                        $filepath,
+                        $courseid
                     );
 
-                    // Send to backend for processing
+                    // Queue on the backend; the page polls documentstatus for the outcome
                     $backendurl = get_config('local_aiassistant', 'backendurl');
-                    \local_aiassistant\api_client::ingest_document($backendurl, $documentid, $filepath, 'pdf');
+                    try {
+                        \local_aiassistant\api_client::ingest_document($backendurl, $documentid, $filepath, 'pdf', $courseid);
+                    } catch (Exception $e) {
+                        \local_aiassistant\document_manager::update_status($documentid, 'failed');
+                        throw $e;
+                    }
+                    \local_aiassistant\document_manager::update_status($documentid, 'processing');
 
                     echo json_encode([
                         'success' => true,
@@ -154,17 +241,31 @@ try {
             require_capability('local/aiassistant:managecontent', context_system::instance());
             $title = required_param('title', PARAM_TEXT);
             $url = required_param('url', PARAM_URL);
+            $crawl = optional_param('crawl', 0, PARAM_BOOL);
+            $courseid = optional_param('courseid', 0, PARAM_INT);
+            if ($courseid) {
+                get_course($courseid); // Throws if the course does not exist.
+            }
 
             $documentid = \local_aiassistant\document_manager::add_document(
                 $title,
-                'url',
+                $crawl ? 'site' : 'url',
                 $USER->id,
-                $url
+                $url,
+                '',
+                $courseid
             );
 
-            // Send to backend for processing
+            // Queue on the backend; the page polls documentstatus for the outcome
             $backendurl = get_config('local_aiassistant', 'backendurl');
-            \local_aiassistant\api_client::ingest_document($backendurl, $documentid, $url, 'url');
+            try {
+                \local_aiassistant\api_client::ingest_document($backendurl, $documentid, $url, $crawl ? 'crawl' : 'url',
+                    $courseid);
+            } catch (Exception $e) {
+                \local_aiassistant\document_manager::update_status($documentid, 'failed');
+                throw $e;
+            }
+            \local_aiassistant\document_manager::update_status($documentid, 'processing');
 
             echo json_encode([
                 'success' => true,
@@ -172,6 +273,15 @@ try {
             ]);
             break;
 
+        case 'documentstatus':
+            require_capability('local/aiassistant:managecontent', context_system::instance());
+            $documentid = required_param('documentid', PARAM_INT);
+
+            $status = \local_aiassistant\document_manager::refresh_status($documentid);
+
+            echo json_encode(['success' => true] + $status);
+            break;
+
         default:
             throw new moodle_exception('invalidaction');
     }
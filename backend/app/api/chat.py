@@ -2,20 +2,26 @@
 Chat API endpoints
 """
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from loguru import logger
+import json
 
 from app.services.agent_service import AgentService
+from app.services.session_store import ChatSessionStore
 
 router = APIRouter()
 agent_service = AgentService()
+session_store = ChatSessionStore.get_instance()
 
 
 class ChatRequest(BaseModel):
     """Chat request model"""
     message: str
-    history: Optional[List[Dict[str, str]]] = []
+    history: Optional[List[Dict[str, str]]] = None
+    chat_id: Optional[int] = None
+    course_id: Optional[int] = None  # Moodle course; retrieval is limited to its and site-wide documents
     user_age: Optional[int] = None
     llm_provider: Optional[str] = None
     api_key: Optional[str] = None
@@ -27,6 +33,9 @@ class ChatResponse(BaseModel):
     sources: List[str] = []
     route: str
     model: str
+    cached: bool = False
+    context_tokens: Dict[str, int] = {}
+    timings: Dict[str, float] = {}
 
 
 @router.post("/chat", response_model=ChatResponse)
@@ -46,15 +55,113 @@ async def chat(request: ChatRequest):
 
         logger.info(f"Chat request: {request.message[:100]}...")
 
+        history = await load_history(request)
+
         # Process through agent
         result = await agent_service.process_query(
             query=request.message,
-            history=request.history,
-            user_age=request.user_age
+            history=history,
+            user_age=request.user_age,
+            chat_id=request.chat_id,
+            course_id=request.course_id
         )
 
+        await save_turn(request, result)
+
         return ChatResponse(**result)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Chat error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+async def load_history(request: ChatRequest) -> List[Dict[str, str]]:
+    """
+    Resolve the chat history for a request
+
+    A full history from the client replaces the stored session. Without one,
+    the stored session for chat_id is used; if the backend does not know the
+    session, a 409 asks the client to resend with the full history.
+    """
+    if request.history is not None:
+        history = list(request.history)
+        # Moodle stores the new message before sending the transcript
+        if history and history[-1].get("role") == "user" and history[-1].get("content") == request.message:
+            history.pop()
+        if request.chat_id is not None:
+            await session_store.replace(request.chat_id, history)
+        return history
+
+    if request.chat_id is None:
+        return []
+
+    history = await session_store.get(request.chat_id)
+    if history is None:
+        raise HTTPException(status_code=409, detail="Unknown chat session, resend with full history")
+    return history
+
+
+async def save_turn(request: ChatRequest, result: Dict[str, Any]):
+    """Record the new message and answer in the chat session"""
+    if request.chat_id is None or result.get("route") == "error":
+        return
+
+    await session_store.append(request.chat_id, [
+        {"role": "user", "content": request.message},
+        {"role": "assistant", "content": result["content"]}
+    ])
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Format an agent event as a Server-Sent Events frame"""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Process a chat message, streaming the answer as Server-Sent Events
+
+    Emits a "route" event, a "sources" event, one "token" event per text
+    fragment and a final "done" event carrying the full response.
+
+    Args:
+        request: Chat request with message and optional history
+
+    Returns:
+        text/event-stream response
+    """
+    if not request.message or not request.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+
+    logger.info(f"Streaming chat request: {request.message[:100]}...")
+
+    history = await load_history(request)
+
+    async def event_stream():
+        try:
+            async for event in agent_service.stream_query(
+                query=request.message,
+                history=history,
+                user_age=request.user_age,
+                chat_id=request.chat_id,
+                course_id=request.course_id
+            ):
+                if event["type"] == "done":
+                    await save_turn(request, event)
+                yield format_sse(event)
+
+        except Exception as e:
+            logger.error(f"Chat stream error: {e}", exc_info=True)
+            yield format_sse({"type": "error", "detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
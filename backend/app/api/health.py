@@ -4,6 +4,15 @@ Health check endpoints
 from fastapi import APIRouter
 from app.config import settings
 from app.services.vector_store import VectorStoreService
+from app.services.response_cache import SemanticResponseCache
+from app.services.summary_service import ConversationSummaryService
+from app.services.session_store import ChatSessionStore
+from app.services.rerank_service import RerankService
+from app.services.progress_service import IngestionProgressTracker
+from app.services.extraction_service import ExtractionService
+from app.services.job_queue import IngestionJobQueue
+from app.services.url_fetcher import URLFetcher
+from app.services.embedding_service import EmbeddingService
 
 router = APIRouter()
 
@@ -45,6 +54,35 @@ async def detailed_health_check():
             },
             "web_search": {
                 "status": "enabled" if settings.enable_web_search else "disabled"
+            },
+            "response_cache": {
+                "status": "enabled" if settings.enable_response_cache else "disabled",
+                "info": SemanticResponseCache.get_instance().get_stats()
+            },
+            "conversation_summary": {
+                "status": "enabled" if settings.enable_conversation_summary else "disabled",
+                "info": ConversationSummaryService.get_instance().get_stats()
+            },
+            "embeddings": {
+                "status": "healthy" if EmbeddingService.get_instance().initialized else "not initialized",
+                "info": EmbeddingService.get_instance().get_stats()
+            },
+            "rerank": {
+                "status": "enabled" if RerankService.get_instance().available else "disabled",
+                "info": RerankService.get_instance().get_stats()
+            },
+            "chat_sessions": {
+                "status": "healthy",
+                "info": ChatSessionStore.get_instance().get_stats()
+            },
+            "ingestion": {
+                "status": "healthy",
+                "info": {
+                    **IngestionProgressTracker.get_instance().get_stats(),
+                    "jobs": IngestionJobQueue.get_instance().get_stats(),
+                    "extraction": ExtractionService.get_instance().get_stats(),
+                    "url_fetcher": URLFetcher.get_instance().get_stats()
+                }
             }
         }
     }
@@ -1,14 +1,19 @@
 """
 Document ingestion API endpoints
 """
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from pydantic import BaseModel, HttpUrl
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, HttpUrl, ValidationError
+from typing import List, Literal, Optional
+from pathlib import Path
 from loguru import logger
-import tempfile
-import os
+import base64
+import json
 
+from app.config import settings
 from app.services.document_service import DocumentService
+from app.services.job_queue import IngestionJobQueue
+from app.services.progress_service import IngestionProgressTracker
 
 router = APIRouter()
 document_service = DocumentService()
@@ -18,6 +23,10 @@ class URLIngestRequest(BaseModel):
     """URL ingestion request"""
     document_id: int
     source: HttpUrl
+    course_id: int = Field(0, ge=0)  # Moodle course whose chats may retrieve it, 0 for site-wide
+    incremental: bool = True
+    priority: int = 0
+    callback_url: Optional[HttpUrl] = None
 
 
 class PDFIngestRequest(BaseModel):
@@ -26,77 +35,193 @@ class PDFIngestRequest(BaseModel):
     source: Optional[str] = None
     file_content: Optional[str] = None
     filename: Optional[str] = None
+    course_id: int = Field(0, ge=0)
+    incremental: bool = True
+    priority: int = 0
+    callback_url: Optional[HttpUrl] = None
+
+
+class CrawlIngestRequest(BaseModel):
+    """Site crawl ingestion request"""
+    document_id: int
+    source: HttpUrl  # seed page or sitemap.xml
+    max_pages: int = Field(100, ge=1)
+    max_depth: int = Field(2, ge=0)
+    same_domain: bool = True
+    course_id: int = Field(0, ge=0)
+    incremental: bool = True
+    priority: int = 0
+    callback_url: Optional[HttpUrl] = None
+
+
+class BulkIngestItem(BaseModel):
+    """One document of a bulk ingestion manifest"""
+    document_id: int
+    type: Literal['pdf', 'url', 'crawl']
+    source: Optional[str] = None  # URL, seed page, or path of a PDF the backend can read
+    file: Optional[str] = None  # name of the multipart field holding the PDF
+    filename: Optional[str] = None
+    max_pages: int = Field(100, ge=1)
+    max_depth: int = Field(2, ge=0)
+    same_domain: bool = True
+    course_id: int = Field(0, ge=0)
+    incremental: bool = True
+
+
+class BulkIngestManifest(BaseModel):
+    """Bulk ingestion manifest"""
+    items: List[BulkIngestItem] = Field(..., min_length=1)
+    priority: int = 0
+
+
+class URLPruneRequest(BaseModel):
+    """Documents Moodle still has; tracked URL documents not listed are deleted"""
+    document_ids: List[int]
 
 
 class IngestResponse(BaseModel):
-    """Ingestion response"""
+    """Ingestion response, returned as soon as the job is queued"""
     success: bool
-    chunks: Optional[int] = None
+    job_id: Optional[str] = None
+    status: Optional[str] = None
     error: Optional[str] = None
 
 
+def job_response(job: dict) -> IngestResponse:
+    """Build the response for a queued job"""
+    return IngestResponse(success=True, job_id=job['job_id'], status=job['status'])
+
+
+async def submit_pdf(
+    document_id: int,
+    file_path: str,
+    spooled: bool,
+    filename: Optional[str],
+    incremental: bool,
+    priority: int,
+    callback_url: Optional[str] = None,
+    course_id: int = 0
+) -> dict:
+    """Queue a PDF job, deleting the spooled file if that fails"""
+    queue = IngestionJobQueue.get_instance()
+    try:
+        return await queue.submit(
+            document_id=document_id,
+            kind='pdf',
+            params={
+                'file_path': file_path,
+                'filename': filename,
+                'incremental': incremental,
+                'spooled': spooled,
+                'course_id': course_id
+            },
+            priority=priority,
+            callback_url=callback_url
+        )
+    except Exception:
+        if spooled:
+            await queue.discard(file_path)
+        raise
+
+
 @router.post("/ingest/url", response_model=IngestResponse)
 async def ingest_url(request: URLIngestRequest):
     """
-    Ingest content from a URL
+    Queue ingestion of content from a URL
 
     Args:
         request: URL ingestion request
 
     Returns:
-        Ingestion result
+        Job ID to poll at /api/jobs/{job_id}
     """
     try:
         logger.info(f"Ingesting URL for document {request.document_id}: {request.source}")
 
-        result = await document_service.ingest_url(
+        job = await IngestionJobQueue.get_instance().submit(
             document_id=request.document_id,
-            url=str(request.source)
+            kind='url',
+            params={'url': str(request.source), 'incremental': request.incremental, 'course_id': request.course_id},
+            priority=request.priority,
+            callback_url=str(request.callback_url) if request.callback_url else None
         )
+        return job_response(job)
 
-        if result['success']:
-            return IngestResponse(
-                success=True,
-                chunks=result['chunks']
-            )
-        else:
-            raise HTTPException(status_code=400, detail=result.get('error', 'Ingestion failed'))
-
-    except HTTPException:
-        raise
     except Exception as e:
         logger.error(f"URL ingestion error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/ingest/crawl", response_model=IngestResponse)
+async def ingest_crawl(request: CrawlIngestRequest):
+    """
+    Queue a crawl of a site, ingested as one document
+
+    Args:
+        request: Crawl ingestion request
+
+    Returns:
+        Job ID to poll at /api/jobs/{job_id}
+    """
+    try:
+        logger.info(f"Crawling site for document {request.document_id}: {request.source}")
+
+        job = await IngestionJobQueue.get_instance().submit(
+            document_id=request.document_id,
+            kind='crawl',
+            params={
+                'url': str(request.source),
+                'max_pages': request.max_pages,
+                'max_depth': request.max_depth,
+                'same_domain': request.same_domain,
+                'incremental': request.incremental,
+                'course_id': request.course_id
+            },
+            priority=request.priority,
+            callback_url=str(request.callback_url) if request.callback_url else None
+        )
+        return job_response(job)
+
+    except Exception as e:
+        logger.error(f"Crawl ingestion error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/ingest/pdf", response_model=IngestResponse)
 async def ingest_pdf(request: PDFIngestRequest):
     """
-    Ingest a PDF document
+    Queue ingestion of a PDF document
 
     Args:
         request: PDF ingestion request
 
     Returns:
-        Ingestion result
+        Job ID to poll at /api/jobs/{job_id}
     """
     try:
         logger.info(f"Ingesting PDF for document {request.document_id}")
 
-        result = await document_service.ingest_pdf(
-            document_id=request.document_id,
-            file_path=request.source,
-            file_content=request.file_content,
-            filename=request.filename
-        )
-
-        if result['success']:
-            return IngestResponse(
-                success=True,
-                chunks=result['chunks']
-            )
+        # Handle base64 encoded content; /ingest/pdf/upload avoids the extra copies
+        if request.file_content:
+            file_path = await IngestionJobQueue.get_instance().spool(base64.b64decode(request.file_content))
+            spooled = True
+        elif request.source and Path(request.source).exists():
+            file_path = request.source
+            spooled = False
         else:
-            raise HTTPException(status_code=400, detail=result.get('error', 'Ingestion failed'))
+            raise HTTPException(status_code=400, detail="Invalid file path")
+
+        job = await submit_pdf(
+            request.document_id,
+            file_path,
+            spooled,
+            request.filename,
+            request.incremental,
+            request.priority,
+            str(request.callback_url) if request.callback_url else None,
+            request.course_id
+        )
+        return job_response(job)
 
     except HTTPException:
         raise
@@ -105,61 +230,210 @@ async def ingest_pdf(request: PDFIngestRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/ingest/pdf/upload")
+@router.post("/ingest/pdf/upload", response_model=IngestResponse)
 async def upload_and_ingest_pdf(
     document_id: int = Form(...),
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    incremental: bool = Form(True),
+    priority: int = Form(0),
+    callback_url: Optional[str] = Form(None),
+    course_id: int = Form(0, ge=0)
 ):
     """
-    Upload and ingest a PDF file
+    Upload a PDF file and queue its ingestion
 
     Args:
         document_id: Moodle document ID
         file: Uploaded PDF file
+        incremental: Only embed changed chunks if the document exists
+        priority: Higher runs first
+        callback_url: URL to POST the finished job to
+        course_id: Moodle course whose chats may retrieve the document, 0 for site-wide
 
     Returns:
-        Ingestion result
+        Job ID to poll at /api/jobs/{job_id}
     """
     try:
         logger.info(f"Uploading and ingesting PDF for document {document_id}: {file.filename}")
 
         # Validate file type
-        if not file.filename.endswith('.pdf'):
+        if not (file.filename or '').lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="File must be a PDF")
 
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_path = tmp_file.name
+        # Copy the upload to the spool in chunks rather than reading it whole
+        file_path = await IngestionJobQueue.get_instance().spool(file.file)
+
+        job = await submit_pdf(
+            document_id, file_path, True, file.filename, incremental, priority, callback_url, course_id
+        )
+        return job_response(job)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"PDF upload error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/ingest/bulk")
+async def ingest_bulk(request: Request):
+    """
+    Ingest many documents in one request, streaming results as NDJSON
+
+    The body is a JSON manifest, or multipart form data with the manifest
+    in a 'manifest' field and each uploaded PDF in the field its item names
+    in 'file'. Every item becomes a job; BULK_INGEST_CONCURRENCY of them run
+    at once and share embedding and upsert batches. One JSON line is
+    written per document as its job finishes, in the format of
+    /api/jobs/{job_id}.
+
+    Args:
+        request: Manifest as JSON or multipart form data
+
+    Returns:
+        application/x-ndjson stream of finished jobs
+    """
+    queue = IngestionJobQueue.get_instance()
+    spooled: List[str] = []
+    try:
+        form = None
+        if request.headers.get('content-type', '').startswith('multipart/form-data'):
+            form = await request.form()
+            raw = form.get('manifest')
+            if not isinstance(raw, str):
+                raise HTTPException(status_code=400, detail="Missing manifest field")
+        else:
+            raw = await request.body()
 
         try:
-            # Ingest the PDF
-            result = await document_service.ingest_pdf(
-                document_id=document_id,
-                file_path=tmp_path,
-                filename=file.filename
+            manifest = BulkIngestManifest.model_validate_json(raw)
+        except ValidationError as e:
+            # Without the input: for unparseable JSON it is the raw bytes body
+            raise HTTPException(
+                status_code=422,
+                detail=e.errors(include_url=False, include_context=False, include_input=False)
+            )
+        if len(manifest.items) > settings.bulk_ingest_max_items:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {settings.bulk_ingest_max_items} documents per bulk request"
             )
 
-            if result['success']:
-                return IngestResponse(
-                    success=True,
-                    chunks=result['chunks']
-                )
+        for item in manifest.items:
+            if item.type == 'pdf' and item.file:
+                upload = form.get(item.file) if form is not None else None
+                if upload is None or isinstance(upload, str):
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Missing file {item.file} for document {item.document_id}"
+                    )
+            elif item.type == 'pdf':
+                if not item.source or not Path(item.source).exists():
+                    raise HTTPException(status_code=400, detail=f"Invalid file path for document {item.document_id}")
+            elif not item.source or not item.source.startswith(('http://', 'https://')):
+                raise HTTPException(status_code=400, detail=f"Invalid URL for document {item.document_id}")
+
+        items = []
+        for item in manifest.items:
+            if item.type == 'pdf':
+                if item.file:
+                    upload = form.get(item.file)
+                    file_path = await queue.spool(upload.file)
+                    spooled.append(file_path)
+                    filename = item.filename or upload.filename
+                else:
+                    file_path = item.source
+                    filename = item.filename
+                params = {
+                    'file_path': file_path,
+                    'filename': filename,
+                    'incremental': item.incremental,
+                    'spooled': bool(item.file),
+                    'course_id': item.course_id
+                }
+            elif item.type == 'crawl':
+                params = {
+                    'url': item.source,
+                    'max_pages': item.max_pages,
+                    'max_depth': item.max_depth,
+                    'same_domain': item.same_domain,
+                    'incremental': item.incremental,
+                    'course_id': item.course_id
+                }
             else:
-                raise HTTPException(status_code=400, detail=result.get('error', 'Ingestion failed'))
+                params = {'url': item.source, 'incremental': item.incremental, 'course_id': item.course_id}
+            items.append({'document_id': item.document_id, 'kind': item.type, 'params': params})
 
-        finally:
-            # Clean up temporary file
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+        logger.info(f"Bulk ingesting {len(items)} documents")
+        results = await queue.submit_bulk(items, manifest.priority)
 
     except HTTPException:
+        for file_path in spooled:
+            await queue.discard(file_path)
         raise
     except Exception as e:
-        logger.error(f"PDF upload error: {e}", exc_info=True)
+        for file_path in spooled:
+            await queue.discard(file_path)
+        logger.error(f"Bulk ingestion error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def lines():
+        async for job in results:
+            yield json.dumps(job) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Get an ingestion job's status and progress
+
+    Args:
+        job_id: Job ID returned by an ingestion endpoint
+
+    Returns:
+        Job status, progress counters and, once done, the ingestion result
+    """
+    job = await IngestionJobQueue.get_instance().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/documents/{document_id}/job")
+async def get_document_job(document_id: int):
+    """
+    Get the latest ingestion job of a document
+
+    Args:
+        document_id: Moodle document ID
+
+    Returns:
+        Job status, progress counters and, once done, the ingestion result
+    """
+    job = await IngestionJobQueue.get_instance().get_latest(document_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No ingestion job for this document")
+    return job
+
+
+@router.get("/ingest/progress/{document_id}")
+async def ingest_progress(document_id: int):
+    """
+    Get the progress of a document's latest ingestion
+
+    Args:
+        document_id: Moodle document ID
+
+    Returns:
+        Status, pages and chunks done so far
+    """
+    progress = IngestionProgressTracker.get_instance().get(document_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="No ingestion recorded for this document")
+    return progress
+
 
 @router.delete("/documents/{document_id}")
 async def delete_document(document_id: int):
@@ -187,3 +461,23 @@ async def delete_document(document_id: int):
     except Exception as e:
         logger.error(f"Delete error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/documents/prune-urls")
+async def prune_url_documents(request: URLPruneRequest):
+    """
+    Delete refreshed URL documents that were deleted in Moodle
+
+    Args:
+        request: IDs of all documents Moodle still has
+
+    Returns:
+        IDs of the deleted documents
+    """
+    try:
+        pruned = await document_service.prune_url_documents(request.document_ids)
+        return {"success": True, "pruned": pruned}
+
+    except Exception as e:
+        logger.error(f"Prune error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
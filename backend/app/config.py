@@ -2,7 +2,7 @@
 Configuration management for AI Assistant backend
 """
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Optional, Dict
 
 
 class Settings(BaseSettings):
@@ -16,12 +16,41 @@ class Settings(BaseSettings):
     anthropic_model: str = "claude-3-opus-20240229"
     openai_embedding_model: str = "text-embedding-3-small"
 
+    # Embeddings
+    embedding_provider: str = "openai"  # openai, local
+    local_embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    embedding_device: str = "cpu"
+    embedding_batch_size: int = 64
+    embedding_workers: int = 1  # threads running the local model
+    embedding_query_batch_wait_ms: float = 2.0  # window for batching concurrent queries
+    embedding_query_prefix: str = ""  # instruction prefix some retrieval models expect on queries
+    enable_embedding_cache: bool = True
+    embedding_cache_memory_entries: int = 20000
+    embedding_cache_path: Optional[str] = None  # SQLite file for the persistent tier
+    embedding_cache_max_entries: int = 1000000  # SQLite tier cap, least recently used evicted first
+
     # Qdrant
     qdrant_host: str = "qdrant"
     qdrant_port: int = 6333
     qdrant_api_key: Optional[str] = None
     qdrant_collection_name: str = "moodle_knowledge"
     qdrant_vector_size: int = 1536
+    qdrant_prefer_grpc: bool = False
+    qdrant_grpc_port: int = 6334
+    qdrant_max_connections: int = 100  # REST connection pool size
+    qdrant_max_keepalive_connections: int = 20
+
+    # Qdrant collection tuning, applied when the collection is created;
+    # existing collections are migrated with python -m app.migrate_collection
+    qdrant_payload_indexes: str = "document_id:integer,course_id:integer,metadata.type:keyword,metadata.source:keyword"
+    qdrant_on_disk_vectors: bool = False  # keep original vectors memory-mapped on disk instead of in RAM
+    qdrant_quantization: str = "none"  # none, int8 (scalar quantized copy of the vectors kept in RAM)
+    qdrant_quantization_quantile: float = 0.99
+    qdrant_quantization_rescore: bool = True  # re-score quantized candidates with the original vectors
+    qdrant_quantization_oversampling: float = 2.0  # candidates fetched per result before rescoring
+    qdrant_hnsw_m: int = 16
+    qdrant_hnsw_ef_construct: int = 100
+    qdrant_search_ef: int = 0  # HNSW ef at search time, 0 for Qdrant's default
 
     # Search
     enable_web_search: bool = True
@@ -33,6 +62,49 @@ class Settings(BaseSettings):
     debug: bool = False
     chunk_size: int = 1000
     chunk_overlap: int = 200
+    chunk_length_unit: str = "chars"  # chars, tokens (CHUNK_SIZE and CHUNK_OVERLAP in tokens)
+    chunk_tokenizer: str = "cl100k_base"  # tiktoken encoding used when measuring in tokens
+
+    # Ingestion pipeline
+    ingest_batch_size: int = 64  # chunks per embedding request and upsert
+    ingest_embed_concurrency: int = 2  # embedding requests in flight per document
+    ingest_queue_size: int = 2  # embedded batches waiting for upsert
+    ingest_max_retries: int = 3
+    ingest_retry_backoff_seconds: float = 1.0
+    pdf_page_window: int = 20  # PDF pages extracted, split and written at a time
+    ingest_progress_max_entries: int = 1000
+    extraction_workers: int = 2  # processes for PDF and HTML extraction, 0 to use a thread
+    extraction_min_pages_per_task: int = 4
+    html_extractor: str = "native"  # native (single pass), html2text (BeautifulSoup + html2text)
+
+    # Ingestion jobs
+    job_workers: int = 2  # documents ingested concurrently
+    job_journal_path: Optional[str] = None  # SQLite file so queued jobs survive restarts
+    job_spool_dir: Optional[str] = None  # where submitted PDFs wait for their job, default MOODLE_UPLOAD_DIR/jobs
+    job_max_attempts: int = 3  # runs before a job interrupted by restarts is given up
+    job_max_finished: int = 1000  # finished jobs kept in memory
+    job_retention_hours: int = 168
+    upload_chunk_bytes: int = 1024 * 1024  # copy size when spooling uploaded files
+    bulk_ingest_concurrency: int = 16  # bulk-submitted documents ingested at once, across all bulk requests
+    bulk_ingest_linger_ms: int = 50  # how long a partial shared batch waits for chunks of other documents
+    bulk_ingest_max_items: int = 1000
+
+    # URL fetching
+    fetch_timeout_seconds: float = 30.0
+    fetch_max_bytes: int = 20 * 1024 * 1024
+    fetch_max_connections: int = 20
+    fetch_max_keepalive_connections: int = 10
+    url_state_path: Optional[str] = None  # SQLite file for ETag/Last-Modified/content hash of ingested URLs
+    url_refresh_interval_minutes: int = 0  # re-check URL documents this often, 0 to disable
+    url_refresh_priority: int = -10
+    url_refresh_max_failures: int = 5  # consecutive failed refreshes before a URL is no longer refreshed, 0 for never
+
+    # Site crawling
+    crawl_concurrency: int = 8  # pages fetched at once per crawl
+    crawl_per_host_concurrency: int = 4
+    crawl_batch_pages: int = 10  # pages split and embedded together
+    crawl_max_pages: int = 2000  # upper bound on a request's max_pages
+    crawl_max_sitemaps: int = 50  # nested sitemaps followed from a sitemap index
 
     # Moodle
     moodle_base_url: str = "http://localhost"
@@ -48,6 +120,58 @@ class Settings(BaseSettings):
     rag_score_threshold: float = 0.7
     max_history_length: int = 10
 
+    # Retrieval
+    search_mode: str = "dense"  # dense, hybrid
+    hybrid_candidate_multiplier: int = 4  # candidates per ranking = top_k * multiplier
+    hybrid_rrf_k: int = 60
+    bm25_k1: float = 1.2
+    bm25_b: float = 0.75
+
+    # Reranking
+    enable_rerank: bool = False
+    rerank_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    rerank_candidates: int = 20  # chunks retrieved before reranking down to rag_top_k
+    rerank_max_candidates: int = 50  # hard cap on pairs scored per query
+    rerank_batch_size: int = 32
+    rerank_max_length: int = 512
+    rerank_workers: int = 1  # concurrent cross-encoder passes
+
+    # Query routing
+    router_mode: str = "hybrid"  # llm, local, hybrid
+    router_confidence_threshold: float = 0.6
+    router_examples_path: Optional[str] = None
+
+    # Agent execution
+    agent_execution_mode: str = "sequential"  # sequential, speculative
+    speculative_web_search: bool = False
+
+    # Semantic response cache
+    enable_response_cache: bool = True
+    response_cache_max_distance: float = 0.05  # cosine distance
+    response_cache_ttl_seconds: int = 3600
+    response_cache_max_entries: int = 5000
+    response_cache_max_bytes: int = 64 * 1024 * 1024
+    response_cache_routes: str = "rag,llm"
+    response_cache_max_history: int = 0  # only cache queries with at most this many prior messages
+
+    # Context assembly
+    context_token_budget: int = 6000  # prompt tokens when the model has no entry below
+    context_token_budgets: Dict[str, int] = {}  # per-model prompt token budgets
+    context_min_history_messages: int = 2  # recent messages packed before retrieved context
+
+    # Conversation summaries
+    enable_conversation_summary: bool = True
+    summary_recent_messages: int = 6  # newest messages always sent verbatim
+    summary_batch_messages: int = 4  # fold older messages once this many have accumulated
+    summary_max_words: int = 200
+    summary_max_chats: int = 10000
+
+    # Chat sessions
+    session_max_sessions: int = 1000
+    session_max_bytes: int = 64 * 1024 * 1024
+    session_store_path: Optional[str] = None  # SQLite file for sessions evicted from memory
+    session_disk_max_sessions: int = 100000
+
     # Rate limiting
     rate_limit_per_minute: int = 30
 
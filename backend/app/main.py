@@ -11,6 +11,10 @@ from app.config import settings
 from app.api import chat, ingest, health
 from app.services.vector_store import VectorStoreService
 from app.services.llm_service import LLMService
+from app.services.rerank_service import RerankService
+from app.services.extraction_service import ExtractionService
+from app.services.job_queue import IngestionJobQueue
+from app.services.url_fetcher import URLFetcher
 
 # Configure logging
 logger.remove()
@@ -55,6 +59,14 @@ async def startup_event():
         llm_service = LLMService.get_instance()
         logger.info(f"✓ LLM service initialized with provider: {settings.llm_provider}")
 
+        # Load the rerank model up front so the first query does not pay for it
+        if settings.enable_rerank:
+            logger.info("Loading rerank model...")
+            await RerankService.get_instance().initialize()
+
+        # Resume ingestion jobs left over from the last run
+        await IngestionJobQueue.get_instance().start()
+
         logger.info("🚀 Backend startup complete!")
 
     except Exception as e:
@@ -66,6 +78,9 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down Moodle AI Assistant backend...")
+    await IngestionJobQueue.get_instance().stop()
+    ExtractionService.get_instance().shutdown()
+    await URLFetcher.get_instance().close()
 
 
 @app.exception_handler(Exception)
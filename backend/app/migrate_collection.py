@@ -0,0 +1,58 @@
+"""
+Apply the Qdrant collection tuning settings to an existing collection
+
+Usage (from backend/):
+    python -m app.migrate_collection [--dry-run] [--wait]
+
+New collections are created with QDRANT_ON_DISK_VECTORS, QDRANT_QUANTIZATION
+and QDRANT_HNSW_* already applied; this updates a collection created before
+they were set or changed. Qdrant rebuilds the affected structures in the
+background, so search keeps working; --wait polls until the collection is
+green again.
+"""
+import argparse
+import asyncio
+
+from app.config import settings
+from app.services.vector_store import VectorStoreService
+
+
+async def migrate(dry_run: bool, wait: bool):
+    store = VectorStoreService.get_instance()
+    await store.initialize()
+
+    result = await store.migrate_collection(dry_run=dry_run)
+    changes = result['changes']
+    if not changes:
+        print(f"{settings.qdrant_collection_name} already matches the settings")
+        return
+
+    for name, change in changes.items():
+        if name == 'payload_indexes':
+            for field, (current, desired) in change.items():
+                print(f"  index {field}: {current} -> {desired}")
+        else:
+            print(f"  {name}: {change[0]} -> {change[1]}")
+
+    if not result['applied']:
+        print("Dry run, nothing changed")
+        return
+
+    status = (await store.client.get_collection(settings.qdrant_collection_name)).status
+    while wait and status.value != 'green':
+        print(f"Collection status {status.value}, waiting for the optimizers...")
+        await asyncio.sleep(5)
+        status = (await store.client.get_collection(settings.qdrant_collection_name)).status
+    print(f"✓ Migrated {settings.qdrant_collection_name} (status {status.value})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Only show what would change")
+    parser.add_argument("--wait", action="store_true", help="Wait until Qdrant finished rebuilding")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.dry_run, args.wait))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,47 @@
 """
 LangGraph agent service with intelligent query routing
 """
-from typing import Dict, Any, List, Optional, Literal
+from typing import Dict, Any, List, Optional, Literal, Awaitable, Tuple, AsyncIterator
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, END
 from langchain.schema import HumanMessage, AIMessage
 from loguru import logger
+import asyncio
+import time
 
 from app.config import settings
 from app.services.vector_store import VectorStoreService
 from app.services.llm_service import LLMService
 from app.services.search_service import SearchService
+from app.services.router_service import QueryRouterService
+from app.services.response_cache import SemanticResponseCache
+from app.services.context_packer import ContextPacker
+from app.services.summary_service import ConversationSummaryService
+from app.services.rerank_service import RerankService
+
+ERROR_RESPONSE = "I apologize, but I encountered an error while processing your request. Please try again."
 
 
 class AgentState(TypedDict):
     """State for the agent graph"""
     query: str
     history: List[Dict[str, str]]
+    chat_id: Optional[int]
+    course_id: int
+    summary: Optional[Dict[str, Any]]
     user_age: Optional[int]
     rag_results: Optional[List[Dict[str, Any]]]
     search_results: Optional[List[Dict[str, Any]]]
     route: Optional[Literal["rag", "llm", "search"]]
+    route_confidence: Optional[float]
     response: Optional[str]
     sources: Optional[List[str]]
+    speculative: Optional[Dict[str, asyncio.Task]]
+    query_embedding: Optional[List[float]]
+    cache_key: Optional[Tuple[str, str, int, int]]
+    cache_hit: bool
+    context_tokens: Dict[str, int]
+    timings: Dict[str, float]
 
 
 class AgentService:
@@ -32,6 +51,11 @@ class AgentService:
         self.vector_store = VectorStoreService.get_instance()
         self.llm_service = LLMService.get_instance()
         self.search_service = SearchService()
+        self.router = QueryRouterService.get_instance()
+        self.response_cache = SemanticResponseCache.get_instance()
+        self.context_packer = ContextPacker(self.llm_service.get_model_name())
+        self.summary_service = ConversationSummaryService.get_instance()
+        self.reranker = RerankService.get_instance()
         self.graph = self._build_graph()
 
     def _build_graph(self) -> StateGraph:
@@ -43,6 +67,8 @@ class AgentService:
         workflow.add_node("retrieve_from_rag", self._retrieve_from_rag)
         workflow.add_node("search_web", self._search_web)
         workflow.add_node("generate_response", self._generate_response)
+        if self.reranker.available:
+            workflow.add_node("rerank_results", self._rerank_results)
 
         # Define edges
         workflow.set_entry_point("route_query")
@@ -53,11 +79,16 @@ class AgentService:
             {
                 "rag": "retrieve_from_rag",
                 "search": "search_web",
-                "llm": "generate_response"
+                "llm": "generate_response",
+                "cached": END
             }
         )
 
-        workflow.add_edge("retrieve_from_rag", "generate_response")
+        if self.reranker.available:
+            workflow.add_edge("retrieve_from_rag", "rerank_results")
+            workflow.add_edge("rerank_results", "generate_response")
+        else:
+            workflow.add_edge("retrieve_from_rag", "generate_response")
         workflow.add_edge("search_web", "generate_response")
         workflow.add_edge("generate_response", END)
 
@@ -66,57 +97,105 @@ class AgentService:
     async def _route_query(self, state: AgentState) -> AgentState:
         """
         Determine which route to take for the query
-        Uses LLM to classify the query type
+        Uses the local classifier, falling back to the LLM when unsure
         """
         query = state["query"]
         logger.info(f"Routing query: {query[:100]}...")
+        start = time.perf_counter()
 
-        # Use LLM to classify query intent
-        classification_prompt = f"""Classify the following user query into one of these categories:
-
-1. "knowledge_base" - Questions about course materials, documents, or information that would be in uploaded PDFs/URLs
-2. "current_events" - Questions about recent events, news, or time-sensitive information
-3. "general" - General questions, explanations, help with concepts
-
-Query: {query}
-
-Respond with ONLY one word: knowledge_base, current_events, or general"""
+        # In speculative mode the query is already being embedded for the search
+        embedding = (state.get("speculative") or {}).pop("embedding", None)
 
         try:
-            messages = [{"role": "user", "content": classification_prompt}]
-            classification = await self.llm_service.generate_response(messages)
-            classification = classification.strip().lower()
-
-            if "knowledge_base" in classification:
-                state["route"] = "rag"
-                logger.info("→ Route: RAG (Knowledge Base)")
-            elif "current_events" in classification or "current" in classification:
-                state["route"] = "search"
-                logger.info("→ Route: Web Search")
+            if self._cache_applies(state):
+                # Embed while routing; the embedding is reused by RAG search
+                decision, state["query_embedding"] = await asyncio.gather(
+                    self.router.route(query),
+                    embedding if embedding is not None else self._embed_query_safely(query)
+                )
             else:
-                state["route"] = "llm"
-                logger.info("→ Route: Direct LLM")
+                decision = await self.router.route(query)
+
+            state["route"] = decision["route"]
+            state["route_confidence"] = decision["confidence"]
+            logger.info(
+                f"→ Route: {decision['route']} ({decision['category']}, "
+                f"{decision['router']}, confidence {decision['confidence']:.2f})"
+            )
 
         except Exception as e:
             logger.error(f"Routing failed: {e}, defaulting to RAG")
             state["route"] = "rag"  # Default to RAG
 
+        self._record_timing(state, "route_query", start)
+
+        if state.get("query_embedding") and state["route"] in self._cacheable_routes():
+            self._lookup_cache(state)
+
+        # Stop speculative work the route will not await before generation starts
+        self._discard_speculative_tasks(
+            state.get("speculative"),
+            keep=None if state.get("cache_hit") else state["route"]
+        )
+
         return state
 
     def _decide_route(self, state: AgentState) -> str:
         """Decide which node to go to next"""
+        if state.get("cache_hit"):
+            return "cached"
         return state["route"]
 
+    def _cacheable_routes(self) -> List[str]:
+        """Routes whose answers may be served from the response cache"""
+        return [r.strip() for r in settings.response_cache_routes.split(",") if r.strip()]
+
+    def _cache_applies(self, state: AgentState) -> bool:
+        """Whether the response cache should be consulted for this query"""
+        return (
+            settings.enable_response_cache
+            and len(state.get("history") or []) <= settings.response_cache_max_history
+        )
+
+    async def _embed_query_safely(self, query: str) -> Optional[List[float]]:
+        """Embed the query, returning None on failure"""
+        try:
+            return await self.vector_store.embed_query(query)
+        except Exception as e:
+            logger.error(f"Query embedding failed: {e}")
+            return None
+
+    def _lookup_cache(self, state: AgentState):
+        """Serve the response from the semantic cache if a similar query was answered"""
+        start = time.perf_counter()
+        age_band = self.llm_service.get_age_band(state.get("user_age"))
+        state["cache_key"] = (age_band, state["route"], self.vector_store.kb_version, state["course_id"])
+
+        cached = self.response_cache.lookup(state["query_embedding"], *state["cache_key"])
+        if cached:
+            state["response"] = cached["content"]
+            state["sources"] = list(cached["sources"])
+            state["cache_hit"] = True
+
+        self._record_timing(state, "cache_lookup", start)
+
     async def _retrieve_from_rag(self, state: AgentState) -> AgentState:
         """Retrieve relevant documents from RAG system"""
         query = state["query"]
         logger.info("Retrieving from RAG...")
+        start = time.perf_counter()
 
         try:
-            results = await self.vector_store.search(
-                query=query,
-                top_k=settings.rag_top_k,
-                score_threshold=settings.rag_score_threshold
+            results = await self._await_speculative(
+                state,
+                "rag",
+                lambda: self.vector_store.search(
+                    query=query,
+                    top_k=self._rag_candidates(),
+                    score_threshold=settings.rag_score_threshold,
+                    filter_dict=self._rag_filter(state["course_id"]),
+                    query_embedding=state.get("query_embedding")
+                )
             )
 
             if results:
@@ -129,16 +208,53 @@ Respond with ONLY one word: knowledge_base, current_events, or general"""
         except Exception as e:
             logger.error(f"RAG retrieval failed: {e}")
             state["route"] = "llm"  # Fall back on error
+            state["cache_key"] = None  # Don't cache an answer given without context
 
+        self._record_timing(state, "retrieve_from_rag", start)
         return state
 
+    async def _rerank_results(self, state: AgentState) -> AgentState:
+        """Reorder retrieved chunks with the cross-encoder and keep the best"""
+        results = state.get("rag_results")
+        if not results:
+            return state
+
+        start = time.perf_counter()
+
+        try:
+            state["rag_results"] = await self.reranker.rerank(state["query"], results, settings.rag_top_k)
+            logger.info(f"✓ Reranked {len(results)} candidates")
+
+        except Exception as e:
+            logger.error(f"Reranking failed: {e}, keeping retrieval order")
+            state["rag_results"] = results[:settings.rag_top_k]
+
+        self._record_timing(state, "rerank", start)
+        return state
+
+    @staticmethod
+    def _rag_filter(course_id: int) -> Dict[str, Any]:
+        """Limit retrieval to the chat's course and site-wide documents (course 0)"""
+        return {"course_id": [course_id, 0] if course_id else [0]}
+
+    def _rag_candidates(self) -> int:
+        """Number of chunks to retrieve, over-fetching when reranking"""
+        if self.reranker.available:
+            return max(settings.rag_top_k, settings.rerank_candidates)
+        return settings.rag_top_k
+
     async def _search_web(self, state: AgentState) -> AgentState:
         """Search the web for current information"""
         query = state["query"]
         logger.info("Searching web...")
+        start = time.perf_counter()
 
         try:
-            results = await self.search_service.search(query, max_results=5)
+            results = await self._await_speculative(
+                state,
+                "search",
+                lambda: self.search_service.search(query, max_results=5)
+            )
 
             if results:
                 state["search_results"] = results
@@ -150,51 +266,18 @@ Respond with ONLY one word: knowledge_base, current_events, or general"""
         except Exception as e:
             logger.error(f"Web search failed: {e}")
             state["route"] = "llm"
+            state["cache_key"] = None
 
+        self._record_timing(state, "search_web", start)
         return state
 
     async def _generate_response(self, state: AgentState) -> AgentState:
         """Generate final response using LLM"""
-        query = state["query"]
-        history = state.get("history", [])
-        user_age = state.get("user_age")
-
         logger.info("Generating response...")
+        start = time.perf_counter()
 
         try:
-            # Build context
-            context = ""
-            sources = []
-
-            # Add RAG context if available
-            if state.get("rag_results"):
-                context += "\n\n=== Relevant Information from Knowledge Base ===\n"
-                for i, result in enumerate(state["rag_results"], 1):
-                    context += f"\n[Source {i}]: {result['text']}\n"
-                    source_info = result['metadata'].get('source', 'Unknown')
-                    sources.append(source_info)
-                context += "\n"
-
-            # Add web search context if available
-            if state.get("search_results"):
-                context += "\n\n=== Current Information from Web ===\n"
-                context += self.search_service.format_search_results(state["search_results"])
-                sources.extend([r['link'] for r in state["search_results"]])
-
-            # Get age-appropriate system prompt
-            system_prompt = self.llm_service.get_age_based_system_prompt(user_age)
-
-            if context:
-                system_prompt += f"\n\nUse the following context to answer the user's question:\n{context}"
-                system_prompt += "\n\nCite your sources when using this information."
-
-            # Build message history
-            messages = []
-            for msg in history[-settings.max_history_length:]:
-                messages.append(msg)
-
-            # Add current query
-            messages.append({"role": "user", "content": query})
+            messages, system_prompt, sources = self._build_prompt(state)
 
             # Generate response
             response = await self.llm_service.generate_response(
@@ -203,22 +286,171 @@ Respond with ONLY one word: knowledge_base, current_events, or general"""
             )
 
             state["response"] = response
-            state["sources"] = list(set(sources))  # Remove duplicates
+            state["sources"] = sources
+            self._store_in_cache(state)
 
             logger.info("✓ Response generated")
 
         except Exception as e:
             logger.error(f"Response generation failed: {e}")
-            state["response"] = "I apologize, but I encountered an error while processing your request. Please try again."
+            state["response"] = ERROR_RESPONSE
             state["sources"] = []
 
+        self._record_timing(state, "generate_response", start)
         return state
 
+    def _build_prompt(self, state: AgentState) -> Tuple[List[Dict[str, str]], str, List[str]]:
+        """
+        Build the messages and system prompt for the final LLM call
+
+        Context is packed into the model's token budget and the per-section
+        token counts are recorded in the state.
+
+        Returns:
+            Messages, system prompt and de-duplicated sources
+        """
+        # Get age-appropriate system prompt
+        system_prompt = self.llm_service.get_age_based_system_prompt(state.get("user_age"))
+
+        # Messages already folded into the rolling summary are not resent
+        history = state.get("history", [])
+        summary = state.get("summary")
+        if summary:
+            history = history[summary["covered"]:]
+
+        packed = self.context_packer.pack(
+            system_prompt=system_prompt,
+            query=state["query"],
+            history=history,
+            rag_results=state.get("rag_results"),
+            search_results=state.get("search_results"),
+            format_search_result=self.search_service.format_search_result,
+            summary=summary["summary"] if summary else None
+        )
+        state["context_tokens"] = packed["token_counts"]
+
+        return packed["messages"], packed["system_prompt"], packed["sources"]
+
+    def _store_in_cache(self, state: AgentState):
+        """Cache a freshly generated response if the query was eligible"""
+        if state.get("cache_key"):
+            age_band, route, kb_version, course_id = state["cache_key"]
+            self.response_cache.store(
+                state["query_embedding"],
+                age_band,
+                route,
+                kb_version,
+                {"content": state["response"], "sources": state["sources"]},
+                course_id=course_id
+            )
+
+    def _update_summary(self, state: AgentState):
+        """Schedule a background summary update once the answer is ready"""
+        if (
+            state.get("chat_id") is None
+            or not settings.enable_conversation_summary
+            or state.get("response") in (None, ERROR_RESPONSE)
+        ):
+            return
+
+        transcript = state["history"] + [
+            {"role": "user", "content": state["query"]},
+            {"role": "assistant", "content": state["response"]}
+        ]
+        self.summary_service.schedule_update(state["chat_id"], transcript)
+
+    def _record_timing(self, state: AgentState, stage: str, start: float):
+        """Record how long a stage took in milliseconds"""
+        state["timings"][stage] = round((time.perf_counter() - start) * 1000, 2)
+
+    async def _timed(self, stage: str, coro: Awaitable) -> Tuple[Any, str, float]:
+        """Await a coroutine and return its result with its own duration"""
+        start = time.perf_counter()
+        result = await coro
+        return result, stage, round((time.perf_counter() - start) * 1000, 2)
+
+    def _start_speculative_tasks(self, query: str, course_id: int) -> Dict[str, asyncio.Task]:
+        """
+        Start retrieval before the route is known
+
+        Vector search (and optionally web search) runs concurrently with
+        routing; the retrieval node picks up the result instead of issuing
+        its own request. The query is embedded once, by the "embedding" task,
+        which routing reuses for the cache lookup.
+        """
+        embedding = asyncio.create_task(self._embed_query_safely(query))
+        tasks = {
+            "embedding": embedding,
+            "rag": asyncio.create_task(self._timed(
+                "speculative_rag",
+                self._search_with_embedding(query, course_id, embedding)
+            ))
+        }
+
+        if settings.speculative_web_search and settings.enable_web_search:
+            tasks["search"] = asyncio.create_task(self._timed(
+                "speculative_search",
+                self.search_service.search(query, max_results=5)
+            ))
+
+        for task in tasks.values():
+            task.add_done_callback(self._retrieve_speculative_error)
+        return tasks
+
+    async def _search_with_embedding(self, query: str, course_id: int, embedding: asyncio.Task) -> List[Dict[str, Any]]:
+        """Vector search once the shared query embedding is ready; embeds again only if that failed"""
+        return await self.vector_store.search(
+            query=query,
+            top_k=self._rag_candidates(),
+            score_threshold=settings.rag_score_threshold,
+            filter_dict=self._rag_filter(course_id),
+            query_embedding=await embedding
+        )
+
+    @staticmethod
+    def _retrieve_speculative_error(task: asyncio.Task):
+        """Retrieve the error of a speculative task, which the route may never await"""
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Speculative retrieval failed: {task.exception()}")
+
+    async def _await_speculative(self, state: AgentState, key: str, fallback) -> Any:
+        """
+        Use a speculative result if one was started, otherwise run the fallback
+
+        Args:
+            state: Agent state
+            key: Speculative task key ("rag" or "search")
+            fallback: Callable returning the coroutine to run sequentially
+        """
+        task = (state.get("speculative") or {}).pop(key, None)
+        if task is None:
+            return await fallback()
+
+        result, stage, elapsed = await task
+        state["timings"][stage] = elapsed
+        return result
+
+    def _discard_speculative_tasks(self, tasks: Optional[Dict[str, asyncio.Task]], keep: Optional[str] = None):
+        """
+        Cancel speculative work that the chosen route will not use
+
+        Args:
+            tasks: Speculative tasks still pending pickup; discarded ones are removed
+            keep: Key of the task the route will await, if any
+        """
+        for key in [key for key in (tasks or {}) if key != keep]:
+            task = tasks.pop(key)
+            if not task.done():
+                task.cancel()
+            logger.debug(f"Discarded speculative {key} retrieval")
+
     async def process_query(
         self,
         query: str,
         history: Optional[List[Dict[str, str]]] = None,
-        user_age: Optional[int] = None
+        user_age: Optional[int] = None,
+        chat_id: Optional[int] = None,
+        course_id: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Process a user query through the agent
@@ -227,32 +459,35 @@ Respond with ONLY one word: knowledge_base, current_events, or general"""
             query: User's question
             history: Chat history
             user_age: User's age for customization
+            chat_id: Moodle chat ID, enables rolling summaries
+            course_id: Moodle course, limits retrieval to its and site-wide documents
 
         Returns:
             Response with content and sources
         """
         logger.info(f"Processing query: {query[:100]}...")
+        start = time.perf_counter()
 
-        initial_state: AgentState = {
-            "query": query,
-            "history": history or [],
-            "user_age": user_age,
-            "rag_results": None,
-            "search_results": None,
-            "route": None,
-            "response": None,
-            "sources": None
-        }
+        initial_state = self._initial_state(query, history, user_age, chat_id, course_id)
+        speculative = initial_state["speculative"]
 
         try:
             # Run through the graph
             final_state = await self.graph.ainvoke(initial_state)
 
+            timings = final_state.get("timings", {})
+            timings["total"] = round((time.perf_counter() - start) * 1000, 2)
+
+            self._update_summary(final_state)
+
             return {
                 "content": final_state["response"],
                 "sources": final_state.get("sources", []),
                 "route": final_state.get("route", "unknown"),
-                "model": settings.llm_provider
+                "model": settings.llm_provider,
+                "cached": final_state.get("cache_hit", False),
+                "context_tokens": final_state.get("context_tokens", {}),
+                "timings": timings
             }
 
         except Exception as e:
@@ -261,5 +496,141 @@ Respond with ONLY one word: knowledge_base, current_events, or general"""
                 "content": "I apologize, but I encountered an error. Please try again.",
                 "sources": [],
                 "route": "error",
-                "model": settings.llm_provider
+                "model": settings.llm_provider,
+                "timings": {}
             }
+
+        finally:
+            self._discard_speculative_tasks(speculative)
+
+    async def stream_query(
+        self,
+        query: str,
+        history: Optional[List[Dict[str, str]]] = None,
+        user_age: Optional[int] = None,
+        chat_id: Optional[int] = None,
+        course_id: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a user query, streaming events as they become available
+
+        Runs the same stages as the graph, but streams the final LLM call so
+        the caller can show tokens as soon as they are generated.
+
+        Args:
+            query: User's question
+            history: Chat history
+            user_age: User's age for customization
+            chat_id: Moodle chat ID, enables rolling summaries
+            course_id: Moodle course, limits retrieval to its and site-wide documents
+
+        Yields:
+            Events with a "type" of route, sources, token or done
+        """
+        logger.info(f"Streaming query: {query[:100]}...")
+        start = time.perf_counter()
+
+        state = self._initial_state(query, history, user_age, chat_id, course_id)
+        speculative = state["speculative"]
+
+        try:
+            state = await self._route_query(state)
+            yield {"type": "route", "route": state["route"], "confidence": state.get("route_confidence")}
+
+            if not state.get("cache_hit"):
+                if state["route"] == "rag":
+                    state = await self._retrieve_from_rag(state)
+                    if self.reranker.available:
+                        state = await self._rerank_results(state)
+                elif state["route"] == "search":
+                    state = await self._search_web(state)
+
+            if state.get("cache_hit"):
+                yield {"type": "sources", "sources": state["sources"]}
+                yield {"type": "token", "content": state["response"]}
+            else:
+                messages, system_prompt, sources = self._build_prompt(state)
+                yield {"type": "sources", "sources": sources}
+
+                generation_start = time.perf_counter()
+                parts = []
+                try:
+                    async for token in self.llm_service.stream_response(messages, system_prompt):
+                        if not parts:
+                            self._record_timing(state, "first_token", start)
+                        parts.append(token)
+                        yield {"type": "token", "content": token}
+
+                    state["response"] = "".join(parts)
+                    state["sources"] = sources
+                    self._store_in_cache(state)
+
+                except Exception as e:
+                    logger.error(f"Response streaming failed: {e}")
+                    if not parts:
+                        parts.append(ERROR_RESPONSE)
+                        yield {"type": "token", "content": ERROR_RESPONSE}
+                    state["response"] = "".join(parts)
+                    state["sources"] = []
+
+                self._record_timing(state, "generate_response", generation_start)
+
+            self._record_timing(state, "total", start)
+            self._update_summary(state)
+
+            yield {
+                "type": "done",
+                "content": state["response"],
+                "sources": state["sources"],
+                "route": state["route"],
+                "model": settings.llm_provider,
+                "cached": state["cache_hit"],
+                "context_tokens": state["context_tokens"],
+                "timings": state["timings"]
+            }
+
+        finally:
+            self._discard_speculative_tasks(speculative)
+
+    def _initial_state(
+        self,
+        query: str,
+        history: Optional[List[Dict[str, str]]],
+        user_age: Optional[int],
+        chat_id: Optional[int] = None,
+        course_id: Optional[int] = None
+    ) -> AgentState:
+        """Build the starting state, launching speculative retrieval if enabled"""
+        course_id = course_id or 0
+        speculative = None
+        if settings.agent_execution_mode == "speculative":
+            speculative = self._start_speculative_tasks(query, course_id)
+
+        history = list(history or [])
+
+        summary = None
+        if chat_id is not None and settings.enable_conversation_summary:
+            summary = self.summary_service.get_summary(chat_id)
+            if summary and summary["covered"] > len(history):
+                summary = None  # History was edited since it was summarised
+
+        return {
+            "query": query,
+            "history": history,
+            "chat_id": chat_id,
+            "course_id": course_id,
+            "summary": summary,
+            "user_age": user_age,
+            "rag_results": None,
+            "search_results": None,
+            "route": None,
+            "route_confidence": None,
+            "response": None,
+            "sources": None,
+            "speculative": speculative,
+            "query_embedding": None,
+            "cache_key": None,
+            "cache_hit": False,
+            "context_tokens": {},
+            "timings": {}
+        }
@@ -0,0 +1,227 @@
+"""
+Token-budgeted prompt assembly for response generation
+"""
+from typing import Dict, Any, List, Optional, Callable
+import tiktoken
+from loguru import logger
+
+from app.config import settings
+
+# Approximate per-message formatting overhead of chat completion APIs
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Truncated items shorter than this are dropped instead
+MIN_TRUNCATED_TOKENS = 32
+
+RAG_HEADER = "\n\n=== Relevant Information from Knowledge Base ===\n"
+SEARCH_HEADER = "\n\n=== Current Information from Web ===\nWeb Search Results:\n\n"
+SUMMARY_HEADER = "\n\nSummary of the earlier conversation:\n"
+CONTEXT_INSTRUCTIONS = "\n\nUse the following context to answer the user's question:\n"
+CITATION_INSTRUCTIONS = "\n\nCite your sources when using this information."
+
+
+class TokenBudget:
+    """Running token allowance for a single prompt"""
+
+    def __init__(self, packer: "ContextPacker", total: int):
+        self.packer = packer
+        self.remaining = total
+
+    def consume(self, text: str) -> int:
+        """Charge text against the budget unconditionally"""
+        tokens = self.packer.count(text)
+        self.remaining -= tokens
+        return tokens
+
+    def fit(self, text: str) -> Optional[str]:
+        """
+        Charge text against the budget, truncating it if needed
+
+        Returns:
+            The (possibly truncated) text, or None if nothing useful fits
+        """
+        tokens = self.packer.count(text)
+        if tokens <= self.remaining:
+            self.remaining -= tokens
+            return text
+
+        if self.remaining < MIN_TRUNCATED_TOKENS:
+            return None
+
+        text = self.packer.truncate(text, self.remaining)
+        self.remaining -= self.packer.count(text)
+        return text
+
+
+class ContextPacker:
+    """
+    Fits the system prompt, chat history, retrieved chunks and web results
+    into a token budget
+
+    Sections are filled in priority order: system prompt and current query,
+    the summary of earlier conversation, the most recent history messages, knowledge base chunks (best first),
+    web results, then older history. The item that overflows the budget is
+    truncated and everything after it in that section is dropped.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self.budget = settings.context_token_budgets.get(model, settings.context_token_budget)
+
+        try:
+            self.encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Non-OpenAI models: cl100k_base is a close enough approximation
+            self.encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count(self, text: str) -> int:
+        """Count tokens in text"""
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Truncate text to at most max_tokens tokens"""
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoding.decode(tokens[:max_tokens - 1]) + "…"
+
+    def pack(
+        self,
+        system_prompt: str,
+        query: str,
+        history: List[Dict[str, str]],
+        rag_results: Optional[List[Dict[str, Any]]] = None,
+        search_results: Optional[List[Dict[str, Any]]] = None,
+        format_search_result: Optional[Callable[[int, Dict[str, Any]], str]] = None,
+        summary: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Assemble the prompt within the token budget
+
+        Args:
+            system_prompt: Base system prompt
+            query: Current user query
+            history: Chat history, oldest first
+            rag_results: Knowledge base chunks, best first
+            search_results: Web search results
+            format_search_result: Formatter for a single web result
+            summary: Summary of conversation older than the history
+
+        Returns:
+            Messages, system prompt, sources and per-section token counts
+        """
+        counts = {"system": 0, "query": 0, "summary": 0, "history": 0, "rag": 0, "search": 0}
+        budget = TokenBudget(self, self.budget)
+
+        # Mandatory sections
+        counts["system"] = budget.consume(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+        budget.remaining -= MESSAGE_OVERHEAD_TOKENS
+        if self.count(query) > budget.remaining // 2:
+            query = self.truncate(query, max(MIN_TRUNCATED_TOKENS, budget.remaining // 2))
+        counts["query"] = budget.consume(query) + MESSAGE_OVERHEAD_TOKENS
+        budget.remaining -= MESSAGE_OVERHEAD_TOKENS
+
+        if summary:
+            summary_text = budget.fit(SUMMARY_HEADER + summary)
+            if summary_text:
+                system_prompt += summary_text
+                counts["summary"] = self.count(summary_text)
+
+        recent = history[-settings.max_history_length:]
+        split = max(0, len(recent) - settings.context_min_history_messages)
+        kept_history: Dict[int, Dict[str, str]] = {}
+
+        # Most recent turns first so follow-up questions keep their context
+        newest = range(len(recent) - 1, split - 1, -1)
+        counts["history"] += self._fill_history(budget, recent, newest, kept_history)
+
+        sources = []
+        context = ""
+
+        # Reserve room for the instructions wrapping any retrieved context
+        instruction_tokens = self.count(CONTEXT_INSTRUCTIONS + CITATION_INSTRUCTIONS)
+        budget.remaining -= instruction_tokens
+
+        if rag_results and budget.remaining > MIN_TRUNCATED_TOKENS:
+            section = ""
+            header_tokens = self.count(RAG_HEADER)
+            budget.remaining -= header_tokens
+            for i, result in enumerate(rag_results, 1):
+                text = budget.fit(f"\n[Source {i}]: {result['text']}\n")
+                if text is None:
+                    break
+                section += text
+                sources.append(result['metadata'].get('source', 'Unknown'))
+                if budget.remaining <= 0:
+                    break
+            if section:
+                context += RAG_HEADER + section + "\n"
+                counts["rag"] = header_tokens + self.count(section)
+            else:
+                budget.remaining += header_tokens
+
+        if search_results and format_search_result and budget.remaining > MIN_TRUNCATED_TOKENS:
+            section = ""
+            header_tokens = self.count(SEARCH_HEADER)
+            budget.remaining -= header_tokens
+            for i, result in enumerate(search_results, 1):
+                text = budget.fit(format_search_result(i, result))
+                if text is None:
+                    break
+                section += text
+                sources.append(result['link'])
+                if budget.remaining <= 0:
+                    break
+            if section:
+                context += SEARCH_HEADER + section
+                counts["search"] = header_tokens + self.count(section)
+            else:
+                budget.remaining += header_tokens
+
+        if context:
+            system_prompt += CONTEXT_INSTRUCTIONS + context + CITATION_INSTRUCTIONS
+            counts["system"] += instruction_tokens
+        else:
+            budget.remaining += instruction_tokens
+
+        # Older history only gets what is left
+        counts["history"] += self._fill_history(budget, recent, range(split - 1, -1, -1), kept_history)
+
+        messages = [kept_history[i] for i in sorted(kept_history)]
+        messages.append({"role": "user", "content": query})
+
+        counts["total"] = sum(counts.values())
+        counts["budget"] = self.budget
+        counts["history_messages"] = len(kept_history)
+        counts["history_dropped"] = len(history) - len(kept_history)
+
+        if counts["total"] > self.budget:
+            logger.warning(f"Prompt uses {counts['total']} tokens, over the {self.budget} token budget")
+
+        return {
+            "messages": messages,
+            "system_prompt": system_prompt,
+            "sources": list(set(sources)),  # Remove duplicates
+            "token_counts": counts
+        }
+
+    def _fill_history(
+        self,
+        budget: TokenBudget,
+        history: List[Dict[str, str]],
+        indices: range,
+        kept: Dict[int, Dict[str, str]]
+    ) -> int:
+        """Add history messages in the given order until the budget runs out"""
+        used = 0
+        for i in indices:
+            if budget.remaining <= MESSAGE_OVERHEAD_TOKENS:
+                break
+            budget.remaining -= MESSAGE_OVERHEAD_TOKENS
+            content = budget.fit(history[i]["content"])
+            if content is None:
+                budget.remaining += MESSAGE_OVERHEAD_TOKENS
+                break
+            kept[i] = {"role": history[i]["role"], "content": content}
+            used += self.count(content) + MESSAGE_OVERHEAD_TOKENS
+        return used
@@ -0,0 +1,217 @@
+"""
+Concurrent crawler that feeds a site's pages into ingestion
+"""
+from typing import Dict, Any, AsyncIterator, Optional
+from urllib.parse import urlsplit, urlunsplit
+from xml.etree import ElementTree
+import asyncio
+import hashlib
+import time
+
+from loguru import logger
+
+from app.config import settings
+from app.services.extraction_service import ExtractionService
+from app.services.url_fetcher import URLFetcher
+
+# Links to these are not pages worth fetching
+SKIPPED_EXTENSIONS = (
+    '.pdf', '.zip', '.gz', '.tar', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.ico',
+    '.css', '.js', '.json', '.mp3', '.mp4', '.avi', '.mov', '.woff', '.woff2', '.ttf', '.exe',
+    '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx'
+)
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonical_url(url: str) -> Optional[str]:
+    """
+    Normalise a URL so the same page is only crawled once
+
+    Lowercases scheme and host, drops default ports and fragments, and
+    gives empty paths a '/'. Non-HTTP URLs return None.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    host = parts.hostname.lower()
+    if parts.port and parts.port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{parts.port}"
+    return urlunsplit((scheme, host, parts.path or '/', parts.query, ''))
+
+
+class SiteCrawler:
+    """
+    Crawl one site from a seed page or a sitemap.xml
+
+    CRAWL_CONCURRENCY fetches run at once, at most CRAWL_PER_HOST_CONCURRENCY
+    of them against any one host. Pages are deduplicated by canonical URL
+    (after redirects and rel=canonical) and by a hash of their extracted
+    text, and handed out by pages() as they arrive, so the caller can embed
+    earlier pages while later ones are still being fetched.
+    """
+
+    def __init__(self, seed: str, max_pages: int, max_depth: int, same_domain: bool = True):
+        self.seed = seed
+        self.max_pages = min(max_pages, settings.crawl_max_pages)
+        self.max_depth = max_depth
+        self.same_domain = same_domain
+        self.host = urlsplit(canonical_url(seed) or seed).netloc
+
+        self.fetcher = URLFetcher.get_instance()
+        self.extraction = ExtractionService.get_instance()
+        self._seen_urls = set()
+        self._seen_hashes = set()
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+        self.fetched = 0
+        self.pages_found = 0
+        self.duplicates = 0
+        self.errors = 0
+        self.started: Optional[float] = None
+
+    async def pages(self) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Crawl the site
+
+        Yields:
+            Dicts with 'url', 'title' and 'text', in the order they were fetched
+        """
+        self.started = time.perf_counter()
+        frontier: asyncio.Queue = asyncio.Queue()
+        results: asyncio.Queue = asyncio.Queue(maxsize=settings.crawl_batch_pages * 2)
+
+        await self._seed_frontier(frontier)
+
+        async def finish():
+            await frontier.join()
+            await results.put(None)
+
+        tasks = [
+            asyncio.create_task(self._worker(frontier, results))
+            for _ in range(settings.crawl_concurrency)
+        ]
+        tasks.append(asyncio.create_task(finish()))
+
+        try:
+            while True:
+                page = await results.get()
+                if page is None:
+                    break
+                yield page
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get crawl statistics"""
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return {
+            'pages': self.pages_found,
+            'fetched': self.fetched,
+            'duplicates': self.duplicates,
+            'errors': self.errors,
+            'seconds': round(elapsed, 2),
+            'pages_per_second': round(self.pages_found / elapsed, 2) if elapsed else 0.0
+        }
+
+    async def _seed_frontier(self, frontier: asyncio.Queue):
+        """Queue the seed page, or every page listed in a sitemap"""
+        if not urlsplit(self.seed).path.endswith('.xml'):
+            self._enqueue(frontier, self.seed, 0)
+            return
+
+        sitemaps = [self.seed]
+        seen_sitemaps = set()
+        while sitemaps and len(seen_sitemaps) < settings.crawl_max_sitemaps:
+            sitemap = sitemaps.pop(0)
+            if sitemap in seen_sitemaps:
+                continue
+            seen_sitemaps.add(sitemap)
+
+            fetched = await self.fetcher.fetch(sitemap)
+            root = ElementTree.fromstring(fetched['content'])
+            locations = [
+                element.text.strip() for element in root.iter()
+                if element.tag.endswith('loc') and element.text
+            ]
+            if root.tag.endswith('sitemapindex'):
+                sitemaps.extend(locations)
+            else:
+                for location in locations:
+                    self._enqueue(frontier, location, 0)
+
+        logger.info(f"✓ Sitemap {self.seed} listed {frontier.qsize()} pages")
+
+    def _enqueue(self, frontier: asyncio.Queue, url: str, depth: int):
+        """Queue a URL unless it was seen, is off-site or is not a page"""
+        url = canonical_url(url)
+        if url is None or url in self._seen_urls:
+            return
+        if self.same_domain and urlsplit(url).netloc != self.host:
+            return
+        if urlsplit(url).path.lower().endswith(SKIPPED_EXTENSIONS):
+            return
+
+        self._seen_urls.add(url)
+        frontier.put_nowait((url, depth))
+
+    async def _worker(self, frontier: asyncio.Queue, results: asyncio.Queue):
+        """Fetch queued URLs, queue their links and hand out new pages"""
+        while True:
+            url, depth = await frontier.get()
+            try:
+                if self.pages_found >= self.max_pages:
+                    continue
+
+                page = await self._fetch_page(url)
+                if page is None:
+                    continue
+
+                if depth < self.max_depth:
+                    for link in page['links']:
+                        self._enqueue(frontier, link, depth + 1)
+
+                text_hash = hashlib.sha256(page['text'].encode('utf-8')).hexdigest()
+                if text_hash in self._seen_hashes:
+                    self.duplicates += 1
+                    continue
+                self._seen_hashes.add(text_hash)
+
+                if self.pages_found >= self.max_pages:
+                    continue
+                self.pages_found += 1
+                await results.put({'url': page['url'], 'title': page['title'], 'text': page['text']})
+
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Failed to crawl {url}: {e}")
+
+            finally:
+                frontier.task_done()
+
+    async def _fetch_page(self, url: str) -> Optional[Dict[str, Any]]:
+        """Fetch and parse one HTML page, or None if it is not a new page"""
+        host = urlsplit(url).netloc
+        limit = self._host_limits.setdefault(host, asyncio.Semaphore(settings.crawl_per_host_concurrency))
+        async with limit:
+            fetched = await self.fetcher.fetch(url)
+        self.fetched += 1
+
+        if 'html' not in fetched['content_type']:
+            return None
+
+        # A redirect or rel=canonical may point at a page crawled already
+        final_url = canonical_url(fetched['url']) or url
+        page = await self.extraction.parse_page(fetched['content'], final_url)
+        for alias in (final_url, canonical_url(page['canonical'] or '')):
+            if alias and alias != url:
+                if alias in self._seen_urls:
+                    self.duplicates += 1
+                    return None
+                self._seen_urls.add(alias)
+
+        page['url'] = final_url
+        return page
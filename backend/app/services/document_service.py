@@ -1,181 +1,340 @@
 """
 Document ingestion and processing service
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable, Tuple
 from pathlib import Path
 import base64
+import os
 import tempfile
-import requests
-from bs4 import BeautifulSoup
-import html2text
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader, WebBaseLoader
 from loguru import logger
 
 from app.config import settings
-from app.services.vector_store import VectorStoreService
+from app.services.vector_store import VectorStoreService, DocumentSync, SharedBatchWriter
+from app.services.progress_service import IngestionProgressTracker
+from app.services.extraction_service import ExtractionService
+from app.services.url_fetcher import URLFetcher
+from app.services.crawler import SiteCrawler
+from app.services.text_splitter import TextSplitter
 
 
 class DocumentService:
     """Service for document ingestion and processing"""
 
     def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.chunk_size,
-            chunk_overlap=settings.chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        self.text_splitter = TextSplitter()
         self.vector_store = VectorStoreService.get_instance()
+        self.progress = IngestionProgressTracker.get_instance()
+        self.extraction = ExtractionService.get_instance()
+        self.fetcher = URLFetcher.get_instance()
 
     async def ingest_pdf(
         self,
         document_id: int,
         file_path: Optional[str] = None,
         file_content: Optional[str] = None,
-        filename: Optional[str] = None
+        filename: Optional[str] = None,
+        incremental: bool = True,
+        writer: Optional[SharedBatchWriter] = None,
+        course_id: int = 0
     ) -> Dict[str, Any]:
         """
         Ingest a PDF document
 
+        Pages are extracted, split and written in windows, so memory use does
+        not grow with the page count; progress is recorded per window.
+
         Args:
             document_id: Moodle document ID
             file_path: Path to PDF file (if local)
             file_content: Base64 encoded file content
             filename: Original filename
+            incremental: Only embed changed chunks if the document exists
+            writer: Shared batch writer when ingested as part of a bulk request
+            course_id: Moodle course whose chats may retrieve the document, 0 for site-wide
 
         Returns:
-            Ingestion result with chunk count
+            Ingestion result with chunk counts
         """
         logger.info(f"Ingesting PDF document {document_id}")
+        tmp_path = None
 
         try:
             # Handle base64 encoded content
             if file_content:
-                content = base64.b64decode(file_content)
                 with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                    tmp_file.write(content)
-                    file_path = tmp_file.name
+                    tmp_path = file_path = tmp_file.name
+                    tmp_file.write(base64.b64decode(file_content))
 
             if not file_path or not Path(file_path).exists():
                 raise ValueError("Invalid file path")
 
-            # Load PDF
-            loader = PyPDFLoader(file_path)
-            documents = loader.load()
+            source = filename or Path(file_path).name
+            total_pages = await self.extraction.count_pdf_pages(file_path)
+            self.progress.start(document_id, source, total_pages)
 
-            # Extract text and metadata
-            texts = []
-            metadatas = []
+            # Extract, split and write one window of pages at a time
+            sync = await self.vector_store.start_sync(document_id, incremental, writer, course_id)
+            pages_done = 0
+            chunks_done = 0
 
-            for i, doc in enumerate(documents):
-                texts.append(doc.page_content)
-                metadatas.append({
-                    'source': filename or Path(file_path).name,
-                    'page': i + 1,
-                    'type': 'pdf'
-                })
+            async for window in self._pdf_windows(file_path, total_pages):
+                texts = [text for _, text in window]
+                metadatas = [{'source': source, 'page': page, 'type': 'pdf'} for page, _ in window]
+                chunks, chunk_metadatas = self.text_splitter.split_texts(texts, metadatas)
 
-            # Split into chunks
-            chunks = self.text_splitter.create_documents(texts, metadatas)
+                await sync.add(chunks, chunk_metadatas, **self._progress_callbacks(document_id, sync))
 
-            # Prepare for vector store
-            chunk_texts = [chunk.page_content for chunk in chunks]
-            chunk_metadatas = [chunk.metadata for chunk in chunks]
+                pages_done += len(window)
+                chunks_done += len(chunks)
+                self.progress.update(document_id, pages_done=pages_done, chunks_done=chunks_done)
 
-            # Add to vector store
-            num_chunks = await self.vector_store.add_documents(
-                texts=chunk_texts,
-                metadatas=chunk_metadatas,
-                document_id=document_id
-            )
+            counts = await sync.finish()
+            if not incremental:
+                counts['removed'] = None
 
-            logger.info(f"✓ Successfully ingested PDF: {num_chunks} chunks")
+            logger.info(f"✓ Successfully ingested PDF: {chunks_done} chunks")
 
-            return {
+            result = {
                 'success': True,
-                'chunks': num_chunks,
-                'pages': len(documents)
+                'chunks': chunks_done,
+                'pages': total_pages,
+                **counts
             }
+            self.progress.finish(document_id, result)
+            return result
 
         except Exception as e:
             logger.error(f"Failed to ingest PDF: {e}")
+            self.progress.fail(document_id, str(e))
             return {
                 'success': False,
                 'error': str(e)
             }
 
+        finally:
+            # Clean up temporary file
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
     async def ingest_url(
         self,
         document_id: int,
-        url: str
+        url: str,
+        incremental: bool = True,
+        writer: Optional[SharedBatchWriter] = None,
+        course_id: int = 0
     ) -> Dict[str, Any]:
         """
         Ingest content from a URL
 
+        In incremental mode the page is fetched conditionally, and if it has
+        not changed since the last ingestion nothing else is done.
+
         Args:
             document_id: Moodle document ID
             url: URL to ingest
+            incremental: Only embed changed chunks if the document exists
+            writer: Shared batch writer when ingested as part of a bulk request
+            course_id: Moodle course whose chats may retrieve the document, 0 for site-wide
 
         Returns:
-            Ingestion result with chunk count
+            Ingestion result with chunk counts; 'unchanged' is True if the
+            page was skipped
         """
         logger.info(f"Ingesting URL: {url}")
+        self.progress.start(document_id, url)
 
         try:
-            # Fetch URL content
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
+            # Fetch URL content; a document moved to another course is fetched
+            # in full, since its unchanged chunks need the new course
+            state = self.fetcher.get_state(document_id)
+            moved = state is not None and state['course_id'] != course_id
+            fetched = await self.fetcher.fetch(url, document_id if incremental and not moved else None)
+
+            if not fetched['modified']:
+                await self.fetcher.mark_checked(document_id)
+                state = self.fetcher.get_state(document_id)
+                logger.info(f"✓ URL unchanged, skipped: {url}")
+
+                result = {
+                    'success': True,
+                    'chunks': state['chunks'],
+                    'title': state['title'],
+                    'added': 0,
+                    'kept': state['chunks'],
+                    'removed': 0,
+                    'unchanged': True
+                }
+                self.progress.update(document_id, chunks_done=state['chunks'])
+                self.progress.finish(document_id, result)
+                return result
+
+            # Convert HTML to markdown in the extraction pool
+            text, title = await self.extraction.html_to_markdown(fetched['content'])
+            title = title or url
 
-            # Parse HTML
-            soup = BeautifulSoup(response.content, 'html.parser')
+            # Split into chunks
+            chunks, metadatas = self.text_splitter.split_texts(
+                [text],
+                [{'source': url, 'type': 'url', 'title': title}]
+            )
 
-            # Remove script and style elements
-            for script in soup(["script", "style", "nav", "footer", "header"]):
-                script.decompose()
+            # Add to vector store
+            sync = await self.vector_store.start_sync(document_id, incremental, writer, course_id)
+            await sync.add(chunks, metadatas, **self._progress_callbacks(document_id, sync))
+            counts = await sync.finish()
+            if not incremental:
+                counts['removed'] = None
 
-            # Convert to markdown
-            h = html2text.HTML2Text()
-            h.ignore_links = False
-            h.ignore_images = True
-            text = h.handle(str(soup))
+            await self.fetcher.save_state(document_id, url, fetched, len(chunks), title, course_id)
 
-            # Clean up text
-            text = '\n'.join([line.strip() for line in text.split('\n') if line.strip()])
+            logger.info(f"✓ Successfully ingested URL: {len(chunks)} chunks")
 
-            # Split into chunks
-            chunks = self.text_splitter.split_text(text)
+            result = {
+                'success': True,
+                'chunks': len(chunks),
+                'title': title,
+                **counts
+            }
+            self.progress.update(document_id, chunks_done=len(chunks))
+            self.progress.finish(document_id, result)
+            return result
 
-            # Prepare metadata
-            metadatas = [{
-                'source': url,
-                'type': 'url',
-                'title': soup.title.string if soup.title else url
-            } for _ in chunks]
+        except Exception as e:
+            logger.error(f"Failed to ingest URL: {e}")
+            await self.fetcher.mark_failed(document_id)
+            self.progress.fail(document_id, str(e))
+            return {
+                'success': False,
+                'error': str(e)
+            }
 
-            # Add to vector store
-            num_chunks = await self.vector_store.add_documents(
-                texts=chunks,
-                metadatas=metadatas,
-                document_id=document_id
-            )
+    async def ingest_site(
+        self,
+        document_id: int,
+        url: str,
+        max_pages: int = 100,
+        max_depth: int = 2,
+        same_domain: bool = True,
+        incremental: bool = True,
+        writer: Optional[SharedBatchWriter] = None,
+        course_id: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Crawl a site and ingest its pages as one document
 
-            logger.info(f"✓ Successfully ingested URL: {num_chunks} chunks")
+        Pages are split, embedded and written in batches of CRAWL_BATCH_PAGES
+        while the crawl continues.
 
-            return {
+        Args:
+            document_id: Moodle document ID
+            url: Seed page or sitemap.xml
+            max_pages: Maximum pages to ingest
+            max_depth: Maximum link depth from the seed or sitemap pages
+            same_domain: Only follow links on the seed's host
+            incremental: Only embed changed chunks if the document exists
+            writer: Shared batch writer when ingested as part of a bulk request
+            course_id: Moodle course whose chats may retrieve the document, 0 for site-wide
+
+        Returns:
+            Ingestion result with chunk counts and crawl statistics
+        """
+        logger.info(f"Crawling site: {url}")
+        self.progress.start(document_id, url)
+        crawler = SiteCrawler(url, max_pages, max_depth, same_domain)
+
+        try:
+            sync = await self.vector_store.start_sync(document_id, incremental, writer, course_id)
+            pages_done = 0
+            chunks_done = 0
+            batch: List[Dict[str, Any]] = []
+
+            async def store(batch: List[Dict[str, Any]]) -> int:
+                chunks, metadatas = self.text_splitter.split_texts(
+                    [page['text'] for page in batch],
+                    [{'source': page['url'], 'type': 'url', 'title': page['title'] or page['url']} for page in batch]
+                )
+                await sync.add(chunks, metadatas, **self._progress_callbacks(document_id, sync))
+                return len(chunks)
+
+            async for page in crawler.pages():
+                batch.append(page)
+                if len(batch) >= settings.crawl_batch_pages:
+                    chunks_done += await store(batch)
+                    pages_done += len(batch)
+                    batch = []
+                    self.progress.update(document_id, pages_done=pages_done, chunks_done=chunks_done)
+
+            if batch:
+                chunks_done += await store(batch)
+                pages_done += len(batch)
+                self.progress.update(document_id, pages_done=pages_done, chunks_done=chunks_done)
+
+            if not pages_done:
+                raise ValueError(f"No pages could be crawled from {url}")
+
+            counts = await sync.finish()
+            if not incremental:
+                counts['removed'] = None
+
+            stats = crawler.get_stats()
+            logger.info(
+                f"✓ Successfully crawled site: {pages_done} pages, {chunks_done} chunks, "
+                f"{stats['pages_per_second']} pages/s"
+            )
+
+            result = {
                 'success': True,
-                'chunks': num_chunks,
-                'title': soup.title.string if soup.title else url
+                'chunks': chunks_done,
+                'pages': pages_done,
+                'crawl': stats,
+                **counts
             }
+            self.progress.finish(document_id, result)
+            return result
 
         except Exception as e:
-            logger.error(f"Failed to ingest URL: {e}")
+            logger.error(f"Failed to crawl site: {e}")
+            self.progress.fail(document_id, str(e))
             return {
                 'success': False,
                 'error': str(e)
             }
 
+    async def _pdf_windows(self, file_path: str, total_pages: int) -> AsyncIterator[List[Tuple[int, str]]]:
+        """
+        Yield the text of a PDF's pages in windows of PDF_PAGE_WINDOW pages
+
+        Each window is extracted in the process pool, split across workers.
+
+        Args:
+            file_path: Path to the PDF
+            total_pages: Page count of the PDF
+
+        Yields:
+            (page number, text) pairs for each window, page numbers from 1
+        """
+        window = max(1, settings.pdf_page_window)
+        for start in range(0, total_pages, window):
+            yield await self.extraction.extract_pdf_pages(file_path, start, min(start + window, total_pages))
+
+    def _progress_callbacks(self, document_id: int, sync: DocumentSync) -> Dict[str, Callable[[int, int], None]]:
+        """
+        Build callbacks that record embedded and upserted chunks of a sync
+
+        Counts continue from the chunks the sync added in earlier windows.
+        """
+        base = sync.added
+
+        def on_embedded(done: int, total: int):
+            self.progress.update(document_id, embedded=base + done)
+
+        def on_upserted(done: int, total: int):
+            self.progress.update(document_id, upserted=base + done)
+
+        return {'embed_callback': on_embedded, 'progress_callback': on_upserted}
+
     async def delete_document(self, document_id: int) -> bool:
         """
         Delete a document from the vector store
@@ -187,4 +346,27 @@ class DocumentService:
             Success status
         """
         logger.info(f"Deleting document {document_id}")
+        await self.fetcher.forget(document_id)
         return await self.vector_store.delete_document(document_id)
+
+    async def prune_url_documents(self, document_ids: List[int]) -> List[int]:
+        """
+        Delete tracked URL documents that Moodle no longer has
+
+        Catches documents whose deletion never reached the backend, which
+        would otherwise keep being refreshed.
+
+        Args:
+            document_ids: IDs of all documents Moodle still has
+
+        Returns:
+            IDs of the deleted documents
+        """
+        keep = set(document_ids)
+        pruned = [document_id for document_id in self.fetcher.get_tracked() if document_id not in keep]
+        for document_id in pruned:
+            await self.delete_document(document_id)
+
+        if pruned:
+            logger.info(f"✓ Pruned {len(pruned)} URL documents deleted in Moodle")
+        return pruned
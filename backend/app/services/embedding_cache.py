@@ -0,0 +1,207 @@
+"""
+Content-addressed cache of embeddings for chunks and queries
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from loguru import logger
+
+from app.config import settings
+
+CacheKey = Tuple[str, str]
+
+
+class EmbeddingCache:
+    """
+    Singleton cache of embeddings keyed by (model, sha256(text))
+
+    A bounded in-memory LRU sits in front of an optional SQLite tier that
+    stores vectors as float32 blobs. The SQLite tier is capped at a maximum
+    number of entries; the least recently used rows are evicted first.
+    """
+
+    _instance = None
+
+    def __init__(self):
+        self._memory: "OrderedDict[CacheKey, np.ndarray]" = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_requests = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._disk_entries = 0
+        if settings.embedding_cache_path:
+            self._db = sqlite3.connect(settings.embedding_cache_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, used REAL NOT NULL, "
+                "PRIMARY KEY (model, hash))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_used ON embeddings (used)")
+            self._db.commit()
+            self._disk_entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @classmethod
+    def get_instance(cls):
+        """Get singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @staticmethod
+    def key(model: str, text: str) -> CacheKey:
+        """Build the cache key for a text"""
+        return model, hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    async def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Look up embeddings for texts
+
+        Args:
+            model: Embedding model identifier
+            texts: Texts to look up
+
+        Returns:
+            One embedding per text, or None where the text is not cached
+        """
+        keys = [self.key(model, text) for text in texts]
+        found: Dict[CacheKey, np.ndarray] = {}
+
+        for key in keys:
+            if key in self._memory and key not in found:
+                self._memory.move_to_end(key)
+                found[key] = self._memory[key]
+
+        from_disk = set()
+        missing = list({key for key in keys if key not in found})
+        if missing and self._db is not None:
+            loaded = await asyncio.to_thread(self._load, model, [key[1] for key in missing])
+            for key in missing:
+                vector = loaded.get(key[1])
+                if vector is not None:
+                    found[key] = vector
+                    from_disk.add(key)
+                    self._remember(key, vector)
+
+        results = []
+        for key in keys:
+            vector = found.get(key)
+            if vector is None:
+                self.misses += 1
+                results.append(None)
+            else:
+                if key in from_disk:
+                    self.disk_hits += 1
+                else:
+                    self.memory_hits += 1
+                results.append(vector.tolist())
+
+        if texts and all(result is not None for result in results):
+            self.saved_requests += 1
+
+        return results
+
+    async def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """
+        Store embeddings for texts
+
+        Args:
+            model: Embedding model identifier
+            texts: Embedded texts
+            vectors: Their embeddings
+        """
+        entries = {}
+        for text, vector in zip(texts, vectors):
+            key = self.key(model, text)
+            array = np.asarray(vector, dtype=np.float32)
+            self._remember(key, array)
+            entries[key[1]] = array
+
+        if entries and self._db is not None:
+            await asyncio.to_thread(self._store, model, entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "disk_entries": self._disk_entries,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "saved_embeddings": self.memory_hits + self.disk_hits,
+            "saved_requests": self.saved_requests,
+            "memory_evictions": self.memory_evictions,
+            "disk_evictions": self.disk_evictions
+        }
+
+    def _remember(self, key: CacheKey, vector: np.ndarray):
+        """Add a vector to the in-memory LRU"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > settings.embedding_cache_memory_entries:
+            self._memory.popitem(last=False)
+            self.memory_evictions += 1
+
+    def _load(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Read vectors from SQLite and mark them as recently used; a read error is a miss"""
+        loaded = {}
+        try:
+            with self._db_lock:
+                for start in range(0, len(hashes), 500):
+                    batch = hashes[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._db.execute(
+                        f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                        [model, *batch]
+                    ).fetchall()
+                    for text_hash, blob in rows:
+                        loaded[text_hash] = np.frombuffer(blob, dtype=np.float32)
+
+                if loaded:
+                    now = time.time()
+                    self._db.executemany(
+                        "UPDATE embeddings SET used = ? WHERE model = ? AND hash = ?",
+                        [(now, model, text_hash) for text_hash in loaded]
+                    )
+                    self._db.commit()
+        except Exception as e:
+            logger.error(f"Failed to load embeddings: {e}")
+            return {}
+        return loaded
+
+    def _store(self, model: str, entries: Dict[str, np.ndarray]):
+        """Write vectors to SQLite, evicting the least recently used over the cap"""
+        now = time.time()
+        try:
+            with self._db_lock:
+                before = self._db.total_changes
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO embeddings (model, hash, vector, used) VALUES (?, ?, ?, ?)",
+                    [(model, text_hash, vector.tobytes(), now) for text_hash, vector in entries.items()]
+                )
+                self._disk_entries += self._db.total_changes - before
+
+                excess = self._disk_entries - settings.embedding_cache_max_entries
+                if excess > 0:
+                    self._db.execute(
+                        "DELETE FROM embeddings WHERE rowid IN "
+                        "(SELECT rowid FROM embeddings ORDER BY used LIMIT ?)",
+                        (excess,)
+                    )
+                    self._disk_entries -= excess
+                    self.disk_evictions += excess
+                self._db.commit()
+        except Exception as e:
+            logger.error(f"Failed to store embeddings: {e}")
@@ -0,0 +1,267 @@
+"""
+Embedding service with remote (OpenAI) and local (sentence-transformers) backends
+"""
+from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+
+from langchain.embeddings.base import Embeddings
+from langchain_openai import OpenAIEmbeddings
+from loguru import logger
+
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+from app.config import settings
+from app.services.embedding_cache import EmbeddingCache
+
+# Output sizes of OpenAI embedding models, so startup needs no API call
+OPENAI_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+
+class EmbeddingService(Embeddings):
+    """
+    Singleton embedding provider selected by EMBEDDING_PROVIDER
+
+    The local backend runs sentence-transformers on a dedicated thread pool so
+    encoding never blocks the event loop. Concurrent query embeddings are
+    collected for a few milliseconds and encoded as one batch. Results are
+    cached by content, so unchanged chunks and repeated queries are not
+    embedded again. VectorStoreService calls it through the LangChain
+    Embeddings methods (aembed_query, aembed_documents), so it can also be
+    handed to any LangChain component that takes an embedding model.
+    """
+
+    _instance = None
+
+    def __init__(self):
+        self.provider = settings.embedding_provider
+        self.model = None
+        self.dimension: Optional[int] = None
+        self.cache = EmbeddingCache.get_instance()
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.embedding_workers,
+            thread_name_prefix="embedding"
+        )
+        self.initialized = False
+
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._batch_tasks = set()
+        self.query_batches = 0
+        self.queries = 0
+
+    @classmethod
+    def get_instance(cls):
+        """Get singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    async def initialize(self):
+        """Load the embedding model and check it matches the collection"""
+        if self.initialized:
+            return
+
+        try:
+            if self.provider == "openai":
+                self.model = OpenAIEmbeddings(
+                    model=settings.openai_embedding_model,
+                    openai_api_key=settings.openai_api_key,
+                    chunk_size=settings.embedding_batch_size
+                )
+                self.dimension = OPENAI_DIMENSIONS.get(settings.openai_embedding_model)
+                if self.dimension is None:
+                    self.dimension = len(await self.model.aembed_query("dimension check"))
+
+            elif self.provider == "local":
+                if not SENTENCE_TRANSFORMERS_AVAILABLE:
+                    raise ValueError("EMBEDDING_PROVIDER=local requires sentence-transformers")
+
+                loop = asyncio.get_running_loop()
+                self.model = await loop.run_in_executor(
+                    self.executor,
+                    lambda: SentenceTransformer(settings.local_embedding_model, device=settings.embedding_device)
+                )
+                self.dimension = self.model.get_sentence_embedding_dimension()
+
+            else:
+                raise ValueError(f"Unsupported embedding provider: {self.provider}")
+
+            if self.dimension != settings.qdrant_vector_size:
+                raise ValueError(
+                    f"Embedding model {self.get_model_name()} produces {self.dimension}-dimensional "
+                    f"vectors but QDRANT_VECTOR_SIZE is {settings.qdrant_vector_size}"
+                )
+
+            self.initialized = True
+            logger.info(f"✓ Initialized {self.provider} embeddings: {self.get_model_name()} ({self.dimension} dims)")
+
+        except Exception as e:
+            logger.error(f"Failed to initialize embeddings: {e}")
+            raise
+
+    def get_model_name(self) -> str:
+        """Get the configured model name for the active provider"""
+        if self.provider == "local":
+            return settings.local_embedding_model
+        return settings.openai_embedding_model
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed document chunks
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One embedding per text
+        """
+        if not self.initialized:
+            await self.initialize()
+
+        if not texts:
+            return []
+
+        if not settings.enable_embedding_cache:
+            return await self._embed_documents(texts)
+
+        cache_model = self._cache_model()
+        vectors = await self.cache.get_many(cache_model, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if not missing:
+            return vectors
+
+        embedded = await self._embed_documents(missing)
+        await self.cache.put_many(cache_model, missing, embedded)
+
+        by_text = dict(zip(missing, embedded))
+        return [vector if vector is not None else by_text[text] for text, vector in zip(texts, vectors)]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        Embed a search query, batching concurrent local queries
+
+        Args:
+            text: Query text
+
+        Returns:
+            Query embedding
+        """
+        if not self.initialized:
+            await self.initialize()
+
+        if not settings.enable_embedding_cache:
+            return await self._embed_query(text)
+
+        cache_model = self._cache_model()
+        cache_text = settings.embedding_query_prefix + text if self.provider == "local" else text
+        cached = (await self.cache.get_many(cache_model, [cache_text]))[0]
+        if cached is not None:
+            return cached
+
+        vector = await self._embed_query(text)
+        await self.cache.put_many(cache_model, [cache_text], [vector])
+        return vector
+
+    async def _embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts with the active provider, bypassing the cache"""
+        if self.provider == "openai":
+            return await self.model.aembed_documents(texts)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._encode, texts)
+
+    async def _embed_query(self, text: str) -> List[float]:
+        """Embed a query with the active provider, bypassing the cache"""
+        if self.provider == "openai":
+            return await self.model.aembed_query(text)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((settings.embedding_query_prefix + text, future))
+
+        if len(self._pending) >= settings.embedding_batch_size:
+            self._flush_queries()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(
+                settings.embedding_query_batch_wait_ms / 1000,
+                self._flush_queries
+            )
+
+        return await future
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed document chunks synchronously"""
+        if self.provider == "openai":
+            return self.model.embed_documents(texts)
+        return self._encode(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a search query synchronously"""
+        if self.provider == "openai":
+            return self.model.embed_query(text)
+        return self._encode([settings.embedding_query_prefix + text])[0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get embedding statistics"""
+        return {
+            "provider": self.provider,
+            "model": self.get_model_name(),
+            "dimension": self.dimension,
+            "queries": self.queries,
+            "query_batches": self.query_batches,
+            "avg_query_batch": round(self.queries / self.query_batches, 2) if self.query_batches else 0.0,
+            "cache": self.cache.get_stats() if settings.enable_embedding_cache else None
+        }
+
+    def _cache_model(self) -> str:
+        """Cache namespace, so vectors from different models never mix"""
+        return f"{self.provider}:{self.get_model_name()}"
+
+    def _flush_queries(self):
+        """Encode every pending query in one batch"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            # Keep a reference until done, or the task may be garbage collected mid-batch
+            task = asyncio.create_task(self._encode_queries(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _encode_queries(self, batch: List[Tuple[str, asyncio.Future]]):
+        """Encode a batch of queries and resolve their futures"""
+        self.query_batches += 1
+        self.queries += len(batch)
+
+        try:
+            loop = asyncio.get_running_loop()
+            vectors = await loop.run_in_executor(self.executor, self._encode, [text for text, _ in batch])
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        """Run the local model over texts"""
+        return self.model.encode(
+            texts,
+            batch_size=settings.embedding_batch_size,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+            convert_to_numpy=True
+        ).tolist()
@@ -0,0 +1,447 @@
+"""
+CPU-bound text extraction run in a process pool, off the event loop
+"""
+from typing import Iterator, List, Dict, Any, Optional, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+import asyncio
+import multiprocessing
+import re
+import time
+
+from bs4 import BeautifulSoup
+import html2text
+from pypdf import PdfReader
+from loguru import logger
+
+from app.config import settings
+
+CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+@contextmanager
+def _open_pdf(file_path: str) -> Iterator[PdfReader]:
+    """
+    Open a PDF for the length of one task
+
+    Given a file rather than a path, pypdf reads objects from it as pages are
+    parsed instead of loading the whole file, and the reader is dropped with
+    the task, so a long-lived pool worker keeps nothing between tasks.
+    """
+    with open(file_path, 'rb') as stream:
+        yield PdfReader(stream)
+
+
+def count_pdf_pages(file_path: str) -> int:
+    """Count the pages of a PDF"""
+    with _open_pdf(file_path) as reader:
+        return len(reader.pages)
+
+
+def extract_pdf_pages(file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """
+    Extract the text of a range of PDF pages
+
+    Args:
+        file_path: Path to the PDF
+        start: First page index (0-based)
+        end: Page index to stop before
+
+    Returns:
+        (page number, text) pairs, page numbers from 1
+    """
+    with _open_pdf(file_path) as reader:
+        return [(i + 1, reader.pages[i].extract_text()) for i in range(start, end)]
+
+
+def html_to_markdown(html: bytes) -> Tuple[str, Optional[str]]:
+    """
+    Convert an HTML page to markdown
+
+    Args:
+        html: Raw page content
+
+    Returns:
+        Cleaned markdown text and the page title, if any
+    """
+    page = HTML_EXTRACTORS[settings.html_extractor](html, None)
+    return page['text'], page['title']
+
+
+def parse_page(html: bytes, base_url: str) -> Dict[str, Any]:
+    """
+    Convert an HTML page to markdown and collect what a crawler needs
+
+    Args:
+        html: Raw page content
+        base_url: URL the page was fetched from, for resolving links
+
+    Returns:
+        Dict with 'text', 'title', absolute 'links' and the 'canonical' URL if declared
+    """
+    return HTML_EXTRACTORS[settings.html_extractor](html, base_url)
+
+
+def extract_html(html: bytes, base_url: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Convert an HTML page to markdown in one pass of the stdlib tokenizer
+
+    Args:
+        html: Raw page content
+        base_url: URL the page was fetched from; links are left as written without one
+
+    Returns:
+        Dict with 'text', 'title', 'links' and 'canonical'
+    """
+    parser = _MarkdownParser()
+    parser.feed(_decode(html))
+    parser.close()
+    return parser.result(base_url)
+
+
+def extract_html_soup(html: bytes, base_url: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Convert an HTML page to markdown with BeautifulSoup and html2text
+
+    The original extraction path: parse, strip page chrome, serialise the
+    tree and convert it again. Kept as HTML_EXTRACTOR=html2text.
+
+    Args:
+        html: Raw page content
+        base_url: URL the page was fetched from; links are left as written without one
+
+    Returns:
+        Dict with 'text', 'title', 'links' and 'canonical'
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Collect links before navigation elements are removed
+    links = [_resolve(base_url, a['href']) for a in soup.find_all('a', href=True)]
+    canonical = soup.find('link', rel='canonical', href=True)
+    title = soup.title.string if soup.title else None
+
+    # Remove script and style elements
+    for script in soup(["script", "style", "nav", "footer", "header"]):
+        script.decompose()
+
+    # Convert to markdown
+    h = html2text.HTML2Text()
+    h.ignore_links = False
+    h.ignore_images = True
+    text = h.handle(str(soup))
+
+    return {
+        'title': title,
+        'links': links,
+        'canonical': _resolve(base_url, canonical['href']) if canonical else None,
+        # Clean up text
+        'text': '\n'.join([line.strip() for line in text.split('\n') if line.strip()])
+    }
+
+
+def _resolve(base_url: Optional[str], href: str) -> str:
+    """Make a link absolute when the page URL is known"""
+    return urljoin(base_url, href) if base_url else href
+
+
+def _decode(html: Union[bytes, str]) -> str:
+    """Decode a page with the charset it declares, or UTF-8"""
+    if isinstance(html, str):
+        return html
+
+    declared = CHARSET_PATTERN.search(html[:2048])
+    if declared:
+        try:
+            return html.decode(declared.group(1).decode('ascii'), errors='replace')
+        except LookupError:
+            pass
+    return html.decode('utf-8', errors='replace')
+
+
+class _MarkdownParser(HTMLParser):
+    """
+    Streaming HTML to markdown converter
+
+    Text is written out as the tokenizer reaches it, one line per block:
+    headings as '#' lines (so the splitter can cut on them), list items as
+    '*' or '1.', table rows as cells joined by ' | ', quotes as '>' and
+    links as [text](href). Script, style and page chrome (nav, header,
+    footer) are skipped, though links inside them are still collected for
+    the crawler. Emphasis markers and images are dropped.
+    """
+
+    SKIPPED = {'script', 'style', 'nav', 'footer', 'header', 'noscript', 'template', 'svg'}
+    HEADINGS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+    BLOCKS = {
+        'p', 'div', 'section', 'article', 'main', 'aside', 'table', 'thead', 'tbody', 'tfoot',
+        'dl', 'dt', 'dd', 'figure', 'figcaption', 'form', 'fieldset', 'details', 'summary',
+        'address', 'hr', 'body'
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: List[str] = []
+        self.parts: List[str] = []
+        self.prefix = ''
+        self.skip = 0
+        self.pre = 0
+        self.quote = 0
+        self.lists: List[List[Any]] = []  # [ordered, next number] per open list
+        self.anchors: List[Tuple[str, int]] = []  # (href, index of the link text in parts)
+        self.cells = 0
+
+        self.title: Optional[str] = None
+        self.in_title = False
+        self.links: List[str] = []
+        self.canonical: Optional[str] = None
+
+    def result(self, base_url: Optional[str]) -> Dict[str, Any]:
+        """Get the converted page once fed"""
+        self._flush()
+        return {
+            'title': self.title,
+            'links': [_resolve(base_url, href) for href in self.links],
+            'canonical': _resolve(base_url, self.canonical) if self.canonical else None,
+            'text': '\n'.join(self.lines)
+        }
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+        if tag == 'a' or tag == 'link':
+            attributes = dict(attrs)
+            href = attributes.get('href')
+            if href and tag == 'a':
+                self.links.append(href)
+                if not self.skip:
+                    self.anchors.append((href, len(self.parts)))
+            elif href and 'canonical' in (attributes.get('rel') or '').lower().split():
+                self.canonical = self.canonical or href
+            return
+
+        if tag in self.SKIPPED:
+            self.skip += 1
+            return
+        if self.skip:
+            return
+
+        if tag == 'title':
+            self.in_title = self.title is None
+        elif tag in self.HEADINGS:
+            self._flush()
+            self.prefix = '#' * self.HEADINGS[tag] + ' '
+        elif tag == 'li':
+            self._flush()
+            if self.lists and self.lists[-1][0]:
+                self.prefix = f"{self.lists[-1][1]}. "
+                self.lists[-1][1] += 1
+            else:
+                self.prefix = '* '
+        elif tag == 'ul' or tag == 'ol':
+            self._flush()
+            self.lists.append([tag == 'ol', 1])
+        elif tag == 'tr':
+            self._flush()
+            self.cells = 0
+        elif tag == 'td' or tag == 'th':
+            if self.cells:
+                self.parts.append(' | ')
+            self.cells += 1
+        elif tag == 'br':
+            self._flush()
+        elif tag == 'pre':
+            self._flush()
+            self.pre += 1
+        elif tag == 'blockquote':
+            self._flush()
+            self.quote += 1
+        elif tag in self.BLOCKS:
+            self._flush()
+
+    def handle_endtag(self, tag: str):
+        if tag in self.SKIPPED:
+            self.skip = max(0, self.skip - 1)
+            return
+        if self.skip:
+            return
+
+        if tag == 'title':
+            self.in_title = False
+        elif tag == 'a':
+            if self.anchors:
+                href, start = self.anchors.pop()
+                text = ' '.join(''.join(self.parts[start:]).split())
+                if text and not href.startswith(('#', 'javascript:')):
+                    self.parts[start:] = [f"[{text}]({href})"]
+        elif tag == 'ul' or tag == 'ol':
+            self._flush()
+            if self.lists:
+                self.lists.pop()
+        elif tag == 'pre':
+            self._flush()
+            self.pre = max(0, self.pre - 1)
+        elif tag == 'blockquote':
+            self._flush()
+            self.quote = max(0, self.quote - 1)
+        elif tag in self.HEADINGS or tag == 'li' or tag == 'tr' or tag in self.BLOCKS:
+            self._flush()
+
+    def handle_data(self, data: str):
+        if self.skip:
+            return
+        if self.in_title:
+            self.title = (self.title or '') + data
+            return
+        self.parts.append(data)
+
+    def _flush(self):
+        """End the current block, writing it out as one or more lines"""
+        if not self.parts:
+            self.prefix = ''
+            return
+
+        text = ''.join(self.parts)
+        self.parts = []
+        quote = '> ' * self.quote
+        if self.pre:
+            lines = [line.strip() for line in text.split('\n')]
+        else:
+            lines = [' '.join(text.split())]
+
+        for line in lines:
+            if line:
+                self.lines.append(quote + self.prefix + line)
+                self.prefix = ''
+        self.prefix = ''
+
+
+HTML_EXTRACTORS = {
+    'native': extract_html,
+    'html2text': extract_html_soup
+}
+
+
+class ExtractionService:
+    """
+    Singleton process pool for PDF parsing and HTML conversion
+
+    pypdf and the HTML parsers are pure Python, so running them on the event loop
+    (or a thread, because of the GIL) stalls every other request. Work is sent
+    to EXTRACTION_WORKERS processes instead; a window of PDF pages is split
+    into contiguous page ranges, one per worker, and reassembled in order.
+    With EXTRACTION_WORKERS=0 extraction runs in a thread.
+    """
+
+    _instance = None
+
+    def __init__(self):
+        self.workers = settings.extraction_workers
+        self.executor: Optional[ProcessPoolExecutor] = None
+        if self.workers > 0:
+            # Spawn rather than fork: the server process already runs threads
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+
+        self.pdf_pages = 0
+        self.pdf_seconds = 0.0
+        self.html_pages = 0
+
+    @classmethod
+    def get_instance(cls):
+        """Get singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    async def count_pdf_pages(self, file_path: str) -> int:
+        """Count the pages of a PDF without blocking the event loop"""
+        return await self._run(count_pdf_pages, file_path)
+
+    async def extract_pdf_pages(self, file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+        """
+        Extract a range of PDF pages across the pool
+
+        Args:
+            file_path: Path to the PDF
+            start: First page index (0-based)
+            end: Page index to stop before
+
+        Returns:
+            (page number, text) pairs in page order
+        """
+        started = time.perf_counter()
+        ranges = self._split(start, end)
+        parts = await asyncio.gather(*(
+            self._run(extract_pdf_pages, file_path, part_start, part_end)
+            for part_start, part_end in ranges
+        ))
+
+        self.pdf_pages += end - start
+        self.pdf_seconds += time.perf_counter() - started
+        return [page for part in parts for page in part]
+
+    async def html_to_markdown(self, html: bytes) -> Tuple[str, Optional[str]]:
+        """
+        Convert an HTML page to markdown in the pool
+
+        Args:
+            html: Raw page content
+
+        Returns:
+            Cleaned markdown text and the page title, if any
+        """
+        self.html_pages += 1
+        return await self._run(html_to_markdown, html)
+
+    async def parse_page(self, html: bytes, base_url: str) -> Dict[str, Any]:
+        """
+        Convert an HTML page to markdown and collect its links in the pool
+
+        Args:
+            html: Raw page content
+            base_url: URL the page was fetched from
+
+        Returns:
+            Dict with 'text', 'title', 'links' and 'canonical'
+        """
+        self.html_pages += 1
+        return await self._run(parse_page, html, base_url)
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+            logger.info("✓ Extraction pool stopped")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get extraction statistics"""
+        return {
+            "workers": self.workers,
+            "pdf_pages": self.pdf_pages,
+            "pdf_pages_per_second": round(self.pdf_pages / self.pdf_seconds, 1) if self.pdf_seconds else 0.0,
+            "html_pages": self.html_pages
+        }
+
+    def _split(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """Split a page range into contiguous parts, one per worker"""
+        pages = end - start
+        parts = max(1, min(self.workers, pages // max(1, settings.extraction_min_pages_per_task)))
+        size, extra = divmod(pages, parts)
+
+        ranges = []
+        for i in range(parts):
+            part_end = start + size + (1 if i < extra else 0)
+            ranges.append((start, part_end))
+            start = part_end
+        return ranges
+
+    async def _run(self, func, *args):
+        """Run a module-level function in the pool, or a thread without one"""
+        if self.executor is None:
+            return await asyncio.to_thread(func, *args)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
@@ -0,0 +1,515 @@
+"""
+Background ingestion jobs with priorities and a SQLite journal
+"""
+from typing import Dict, Any, AsyncIterator, BinaryIO, List, Optional, Union
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+import asyncio
+import itertools
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+import httpx
+from loguru import logger
+
+from app.config import settings
+from app.services.document_service import DocumentService
+from app.services.progress_service import IngestionProgressTracker
+from app.services.vector_store import SharedBatchWriter
+
+ACTIVE_STATUSES = ('queued', 'running')
+PROGRESS_FIELDS = ('pages_done', 'total_pages', 'chunks_done', 'embedded', 'upserted')
+
+
+class IngestionJobQueue:
+    """
+    Singleton queue that runs document ingestion outside HTTP requests
+
+    Ingestion endpoints submit a job and return its ID at once. JOB_WORKERS
+    worker tasks take jobs highest priority first (FIFO within a priority),
+    and never run two jobs for the same document at the same time. URL
+    documents are re-queued at low priority every
+    URL_REFRESH_INTERVAL_MINUTES, and skipped cheaply if unchanged. Every
+    state change is written to an optional SQLite journal; on startup,
+    jobs that were queued or running are queued again. Re-running an
+    interrupted job is safe because incremental ingestion only writes what
+    is missing. Uploaded PDFs are spooled to disk so they survive a restart
+    too, and are deleted when their job ends.
+
+    Bulk submissions become ordinary jobs as well, but are run straight
+    away by their own tasks, BULK_INGEST_CONCURRENCY at a time across all
+    bulk requests, writing through one SharedBatchWriter per request so
+    embedding and upsert batches are shared across the documents.
+    """
+
+    _instance = None
+
+    def __init__(self):
+        self.documents = DocumentService()
+        self.progress = IngestionProgressTracker.get_instance()
+        self.spool_dir = Path(settings.job_spool_dir or os.path.join(settings.moodle_upload_dir, "jobs"))
+
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._latest: Dict[int, str] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._workers: List[asyncio.Task] = []
+        self._bulk_tasks = set()
+        self._bulk_slots: Optional[asyncio.Semaphore] = None
+        self._document_locks: Dict[int, asyncio.Lock] = {}
+        self._lock_users: Dict[int, int] = {}
+        self.completed = 0
+        self.failed = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if settings.job_journal_path:
+            self._db = sqlite3.connect(settings.job_journal_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, document_id INTEGER NOT NULL, kind TEXT NOT NULL, "
+                "params TEXT NOT NULL, priority INTEGER NOT NULL, callback_url TEXT, "
+                "status TEXT NOT NULL, attempts INTEGER NOT NULL, progress TEXT, result TEXT, error TEXT, "
+                "created REAL NOT NULL, started REAL, finished REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_document ON jobs (document_id, created)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+            self._db.commit()
+
+    @classmethod
+    def get_instance(cls):
+        """Get singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    async def start(self):
+        """Start the workers and resume jobs left over from a previous run"""
+        if self._workers:
+            return
+
+        self._queue = asyncio.PriorityQueue()
+        self._bulk_slots = asyncio.Semaphore(settings.bulk_ingest_concurrency)
+        resumed = 0
+        if self._db is not None:
+            for job in await asyncio.to_thread(self._load_active):
+                job['status'] = 'queued'
+                self._remember(job)
+                self._queue.put_nowait((-job['priority'], next(self._sequence), job['job_id']))
+                resumed += 1
+            await asyncio.to_thread(self._prune)
+
+        self._workers = [
+            asyncio.create_task(self._worker(i))
+            for i in range(settings.job_workers)
+        ]
+        if settings.url_refresh_interval_minutes > 0:
+            self._workers.append(asyncio.create_task(self._refresh_urls()))
+        logger.info(f"✓ Started {settings.job_workers} ingestion workers ({resumed} jobs resumed)")
+
+    async def stop(self):
+        """Stop the workers; unfinished jobs are resumed on the next start"""
+        tasks = self._workers + list(self._bulk_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+
+    async def submit(
+        self,
+        document_id: int,
+        kind: str,
+        params: Dict[str, Any],
+        priority: int = 0,
+        callback_url: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Queue an ingestion job
+
+        Args:
+            document_id: Moodle document ID
+            kind: 'pdf', 'url' or 'crawl'
+            params: Arguments for the matching DocumentService method
+            priority: Higher runs first
+            callback_url: URL to POST the finished job to
+
+        Returns:
+            The queued job
+        """
+        if not self._workers:
+            await self.start()
+
+        job = await self._create(document_id, kind, params, priority, callback_url)
+        self._queue.put_nowait((-priority, next(self._sequence), job['job_id']))
+
+        logger.info(f"Queued {kind} job {job['job_id']} for document {document_id} (priority {priority})")
+        return self._view(job)
+
+    async def submit_bulk(self, items: List[Dict[str, Any]], priority: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run many ingestion jobs at once, sharing embedding and upsert batches
+
+        The jobs are created and journaled before this returns, so they can
+        be polled like any other job and are resumed by the workers after a
+        restart. They keep running if the caller stops reading results.
+
+        Args:
+            items: Dicts with 'document_id', 'kind' and 'params' as for submit()
+            priority: Priority recorded for the jobs, used if they are resumed
+
+        Returns:
+            Async iterator over the finished jobs, in the order they finish
+        """
+        if not self._workers:
+            await self.start()
+
+        jobs = [await self._create(item['document_id'], item['kind'], item['params'], priority) for item in items]
+        writer = SharedBatchWriter(self.documents.vector_store)
+        started = time.perf_counter()
+        logger.info(f"Running {len(jobs)} bulk jobs, {settings.bulk_ingest_concurrency} at a time")
+
+        async def run(job: Dict[str, Any]) -> Dict[str, Any]:
+            async with self._bulk_slots:
+                try:
+                    async with self._document_lock(job['document_id']):
+                        if job['status'] == 'queued':
+                            await self._run(job, writer)
+                except Exception as e:
+                    logger.error(f"Bulk job {job['job_id']} failed: {e}")
+            return self._view(job)
+
+        tasks = []
+        for job in jobs:
+            task = asyncio.create_task(run(job))
+            self._bulk_tasks.add(task)
+            task.add_done_callback(self._bulk_tasks.discard)
+            tasks.append(task)
+
+        async def results() -> AsyncIterator[Dict[str, Any]]:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+            logger.info(
+                f"✓ Bulk ingestion of {len(jobs)} documents took {time.perf_counter() - started:.1f}s, "
+                f"{writer.chunks} chunks in {writer.batches} shared batches"
+            )
+
+        return results()
+
+    async def spool(self, source: Union[bytes, BinaryIO], suffix: str = '.pdf') -> str:
+        """
+        Write submitted file content where a job can find it after a restart
+
+        File objects are copied in UPLOAD_CHUNK_BYTES chunks, so an upload is
+        never held in memory as a whole.
+
+        Args:
+            source: File bytes or a readable binary file object
+            suffix: File extension
+
+        Returns:
+            Path of the spooled file
+        """
+        path = self.spool_dir / f"{uuid.uuid4().hex}{suffix}"
+
+        def write():
+            self.spool_dir.mkdir(parents=True, exist_ok=True)
+            try:
+                with open(path, 'wb') as f:
+                    if isinstance(source, bytes):
+                        f.write(source)
+                    else:
+                        shutil.copyfileobj(source, f, settings.upload_chunk_bytes)
+            except BaseException:
+                path.unlink(missing_ok=True)
+                raise
+
+        await asyncio.to_thread(write)
+        return str(path)
+
+    async def discard(self, path: str):
+        """Delete a spooled file whose job could not be queued"""
+        await asyncio.to_thread(lambda: Path(path).unlink(missing_ok=True))
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a job with its current progress
+
+        Args:
+            job_id: Job ID
+
+        Returns:
+            Job, or None if unknown
+        """
+        job = self._jobs.get(job_id)
+        if job is None and self._db is not None:
+            job = await asyncio.to_thread(self._load, "job_id = ?", (job_id,))
+        return self._view(job) if job is not None else None
+
+    async def get_latest(self, document_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Get the most recent job for a document
+
+        Args:
+            document_id: Moodle document ID
+
+        Returns:
+            Job, or None if the document has none
+        """
+        job_id = self._latest.get(document_id)
+        if job_id is not None and job_id in self._jobs:
+            return self._view(self._jobs[job_id])
+
+        if self._db is not None:
+            job = await asyncio.to_thread(
+                self._load, "document_id = ? ORDER BY created DESC LIMIT 1", (document_id,)
+            )
+            if job is not None:
+                return self._view(job)
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue statistics"""
+        statuses = [job['status'] for job in self._jobs.values()]
+        return {
+            'workers': settings.job_workers if self._queue is not None else 0,
+            'queued': statuses.count('queued'),
+            'running': statuses.count('running'),
+            'completed': self.completed,
+            'failed': self.failed,
+            'journal': self._db is not None
+        }
+
+    async def _worker(self, index: int):
+        """Take jobs off the queue and run them"""
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            try:
+                if job is not None and job['status'] == 'queued':
+                    async with self._document_lock(job['document_id']):
+                        await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ingestion worker {index} failed on job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _refresh_urls(self):
+        """Queue low-priority re-ingestion of URL documents that are due"""
+        max_age = settings.url_refresh_interval_minutes * 60
+        while True:
+            await asyncio.sleep(min(60, max_age))
+            try:
+                for state in self.documents.fetcher.get_due(max_age):
+                    latest = self._jobs.get(self._latest.get(state['document_id'], ''))
+                    if latest is not None and latest['status'] in ACTIVE_STATUSES:
+                        continue
+                    await self.submit(
+                        document_id=state['document_id'],
+                        kind='url',
+                        params={'url': state['url'], 'incremental': True, 'course_id': state['course_id']},
+                        priority=settings.url_refresh_priority
+                    )
+            except Exception as e:
+                logger.error(f"Failed to schedule URL refresh: {e}")
+
+    async def _create(
+        self,
+        document_id: int,
+        kind: str,
+        params: Dict[str, Any],
+        priority: int,
+        callback_url: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Create and journal a queued job"""
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'document_id': document_id,
+            'kind': kind,
+            'params': params,
+            'priority': priority,
+            'callback_url': callback_url,
+            'status': 'queued',
+            'attempts': 0,
+            'progress': None,
+            'result': None,
+            'error': None,
+            'created': time.time(),
+            'started': None,
+            'finished': None
+        }
+        self._remember(job)
+        await self._journal(job)
+        return job
+
+    async def _run(self, job: Dict[str, Any], writer: Optional[SharedBatchWriter] = None):
+        """Run one job and record its outcome, writing through a shared writer if given"""
+        job.update(status='running', started=time.time(), attempts=job['attempts'] + 1)
+        await self._journal(job)
+
+        params = job['params']
+        if job['attempts'] > settings.job_max_attempts:
+            result = {'success': False, 'error': f"Gave up after {settings.job_max_attempts} attempts"}
+        elif job['kind'] == 'pdf':
+            result = await self.documents.ingest_pdf(
+                document_id=job['document_id'],
+                file_path=params['file_path'],
+                filename=params.get('filename'),
+                incremental=params.get('incremental', True),
+                writer=writer,
+                course_id=params.get('course_id', 0)
+            )
+        elif job['kind'] == 'crawl':
+            result = await self.documents.ingest_site(
+                document_id=job['document_id'],
+                url=params['url'],
+                max_pages=params['max_pages'],
+                max_depth=params['max_depth'],
+                same_domain=params['same_domain'],
+                incremental=params.get('incremental', True),
+                writer=writer,
+                course_id=params.get('course_id', 0)
+            )
+        else:
+            result = await self.documents.ingest_url(
+                document_id=job['document_id'],
+                url=params['url'],
+                incremental=params.get('incremental', True),
+                writer=writer,
+                course_id=params.get('course_id', 0)
+            )
+
+        job.update(
+            status='done' if result['success'] else 'failed',
+            result=result if result['success'] else None,
+            error=result.get('error'),
+            progress=self._progress(job),
+            finished=time.time()
+        )
+        if result['success']:
+            self.completed += 1
+        else:
+            self.failed += 1
+        await self._journal(job)
+
+        if params.get('spooled'):
+            await self.discard(params['file_path'])
+
+        logger.info(f"✓ Job {job['job_id']} for document {job['document_id']} {job['status']}")
+
+        if job['callback_url']:
+            await self._send_callback(job)
+
+    async def _send_callback(self, job: Dict[str, Any]):
+        """POST a finished job to its callback URL"""
+        try:
+            async with httpx.AsyncClient(timeout=10) as client:
+                response = await client.post(job['callback_url'], json=self._view(job))
+                response.raise_for_status()
+        except Exception as e:
+            logger.warning(f"Callback for job {job['job_id']} failed: {e}")
+
+    @asynccontextmanager
+    async def _document_lock(self, document_id: int):
+        """Keep jobs for one document from running concurrently"""
+        lock = self._document_locks.setdefault(document_id, asyncio.Lock())
+        self._lock_users[document_id] = self._lock_users.get(document_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._lock_users[document_id] -= 1
+            if not self._lock_users[document_id]:
+                del self._lock_users[document_id]
+                del self._document_locks[document_id]
+
+    def _progress(self, job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Current progress counters of a job"""
+        if job['status'] != 'running':
+            return job['progress']
+
+        entry = self.progress.get(job['document_id'])
+        if entry is None or entry['started'] < job['started']:
+            return None
+        return {field: entry[field] for field in PROGRESS_FIELDS}
+
+    def _view(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Public representation of a job"""
+        view = {key: job[key] for key in (
+            'job_id', 'document_id', 'kind', 'priority', 'status', 'attempts',
+            'result', 'error', 'created', 'started', 'finished'
+        )}
+        view['progress'] = self._progress(job)
+        return view
+
+    def _remember(self, job: Dict[str, Any]):
+        """Keep a job in memory, dropping the oldest finished jobs over the limit"""
+        self._jobs[job['job_id']] = job
+        self._latest[job['document_id']] = job['job_id']
+
+        finished = [job_id for job_id, entry in self._jobs.items() if entry['status'] not in ACTIVE_STATUSES]
+        for job_id in finished[:max(0, len(finished) - settings.job_max_finished)]:
+            entry = self._jobs.pop(job_id)
+            if self._latest.get(entry['document_id']) == job_id:
+                del self._latest[entry['document_id']]
+
+    async def _journal(self, job: Dict[str, Any]):
+        """Write a job's state to the journal"""
+        if self._db is not None:
+            await asyncio.to_thread(self._store, dict(job))
+
+    def _store(self, job: Dict[str, Any]):
+        """Upsert a job row"""
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO jobs (job_id, document_id, kind, params, priority, callback_url, "
+                    "status, attempts, progress, result, error, created, started, finished) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        job['job_id'], job['document_id'], job['kind'], json.dumps(job['params']),
+                        job['priority'], job['callback_url'], job['status'], job['attempts'],
+                        json.dumps(job['progress']), json.dumps(job['result']), job['error'],
+                        job['created'], job['started'], job['finished']
+                    )
+                )
+                self._db.commit()
+        except Exception as e:
+            logger.error(f"Failed to journal job {job['job_id']}: {e}")
+
+    def _load(self, where: str, args: tuple) -> Optional[Dict[str, Any]]:
+        """Load one job from the journal"""
+        with self._db_lock:
+            cursor = self._db.execute(f"SELECT * FROM jobs WHERE {where}", args)
+            row = cursor.fetchone()
+        return self._from_row(cursor.description, row) if row is not None else None
+
+    def _load_active(self) -> List[Dict[str, Any]]:
+        """Load jobs that were queued or running, oldest first"""
+        with self._db_lock:
+            cursor = self._db.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created", ACTIVE_STATUSES
+            )
+            return [self._from_row(cursor.description, row) for row in cursor.fetchall()]
+
+    def _prune(self):
+        """Delete finished jobs older than the retention period"""
+        cutoff = time.time() - settings.job_retention_hours * 3600
+        with self._db_lock:
+            self._db.execute("DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?", (cutoff,))
+            self._db.commit()
+
+    @staticmethod
+    def _from_row(description: tuple, row: tuple) -> Dict[str, Any]:
+        """Build a job from a journal row"""
+        job = dict(zip((column[0] for column in description), row))
+        for key in ('params', 'progress', 'result'):
+            job[key] = json.loads(job[key]) if job[key] is not None else None
+        return job
@@ -0,0 +1,177 @@
+"""
+In-process BM25 index over knowledge base chunks for lexical retrieval
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from collections import Counter
+import math
+import re
+
+from app.config import settings
+
+# Keeps course codes, versions and identifiers such as "cs-101", "h2o" or "e=mc2" whole
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._\-/=+][a-z0-9]+)*")
+PART_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from how i in is it its me my of on or
+so that the their them then there these this to was we what when where which who why
+will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into index terms
+
+    Compound tokens are kept whole and also split into their parts, so
+    "CS-101" matches queries for "cs-101", "cs 101" and "101".
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        parts = PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part not in STOPWORDS)
+    return terms
+
+
+class LexicalIndex:
+    """
+    Okapi BM25 index mirroring the points in the Qdrant collection
+
+    Postings are kept per term as {point_id: term frequency}, so adding and
+    deleting a document only touches its own chunks.
+    """
+
+    def __init__(self):
+        self.k1 = settings.bm25_k1
+        self.b = settings.bm25_b
+
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._terms: Dict[str, List[str]] = {}
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+        self._documents: Dict[Any, List[str]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, point_id: str, payload: Dict[str, Any]):
+        """
+        Index a single chunk
+
+        Args:
+            point_id: Qdrant point ID
+            payload: Point payload with 'text', 'metadata', 'document_id' and 'course_id'
+        """
+        if point_id in self._lengths:
+            self.remove(point_id)
+
+        terms = tokenize(payload.get('text', ''))
+        counts = Counter(terms)
+        for term, count in counts.items():
+            self._postings.setdefault(term, {})[point_id] = count
+
+        self._lengths[point_id] = len(terms)
+        self._terms[point_id] = list(counts)
+        self._payloads[point_id] = payload
+        self._documents.setdefault(payload.get('document_id'), []).append(point_id)
+        self._total_length += len(terms)
+
+    def remove(self, point_id: str):
+        """Remove a single chunk from the index"""
+        if point_id not in self._lengths:
+            return
+
+        for term in self._terms.pop(point_id):
+            postings = self._postings[term]
+            postings.pop(point_id, None)
+            if not postings:
+                del self._postings[term]
+
+        self._total_length -= self._lengths.pop(point_id)
+        payload = self._payloads.pop(point_id)
+        document_points = self._documents.get(payload.get('document_id'), [])
+        if point_id in document_points:
+            document_points.remove(point_id)
+            if not document_points:
+                del self._documents[payload.get('document_id')]
+
+    def remove_document(self, document_id: Any):
+        """Remove every chunk of a Moodle document"""
+        for point_id in list(self._documents.get(document_id, [])):
+            self.remove(point_id)
+
+    def clear(self):
+        """Drop the whole index"""
+        self._postings.clear()
+        self._lengths.clear()
+        self._terms.clear()
+        self._payloads.clear()
+        self._documents.clear()
+        self._total_length = 0
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        filter_dict: Optional[Dict] = None
+    ) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """
+        Rank chunks by BM25 score
+
+        Args:
+            query: Search query
+            limit: Maximum number of results
+            filter_dict: Optional payload filters, matched like the Qdrant filter
+
+        Returns:
+            List of (point_id, score, payload), best first
+        """
+        if not self._lengths:
+            return []
+
+        total = len(self._lengths)
+        average_length = self._total_length / total or 1.0
+        scores: Dict[str, float] = {}
+
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for point_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[point_id] / average_length)
+                scores[point_id] = scores.get(point_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        if filter_dict:
+            scores = {
+                point_id: score for point_id, score in scores.items()
+                if self._matches(self._payloads[point_id], filter_dict)
+            }
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(point_id, score, self._payloads[point_id]) for point_id, score in ranked]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index statistics"""
+        return {
+            'chunks': len(self._lengths),
+            'terms': len(self._postings),
+            'documents': len(self._documents)
+        }
+
+    @staticmethod
+    def _matches(payload: Dict[str, Any], filter_dict: Dict) -> bool:
+        """Check a payload against exact-match filters with dotted keys, a list matching any of its values"""
+        for key, expected in filter_dict.items():
+            value: Any = payload
+            for part in key.split('.'):
+                value = value.get(part) if isinstance(value, dict) else None
+            matches = value in expected if isinstance(expected, (list, tuple)) else value == expected
+            if not matches:
+                return False
+        return True
@@ -1,10 +1,10 @@
 """
 LLM service for managing OpenAI and Anthropic models
 """
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
-from langchain.schema import HumanMessage, AIMessage, SystemMessage
+from langchain.schema import HumanMessage, AIMessage, SystemMessage, BaseMessage
 from loguru import logger
 
 from app.config import settings
@@ -58,6 +58,12 @@ class LLMService:
         """Get the LLM instance"""
         return self.llm
 
+    def get_model_name(self) -> str:
+        """Get the configured model name for the active provider"""
+        if settings.llm_provider == "anthropic":
+            return settings.anthropic_model
+        return settings.openai_model
+
     async def generate_response(
         self,
         messages: List[Dict[str, str]],
@@ -74,19 +80,7 @@ class LLMService:
             Generated response text
         """
         try:
-            # Convert to LangChain message format
-            langchain_messages = []
-
-            if system_prompt:
-                langchain_messages.append(SystemMessage(content=system_prompt))
-
-            for msg in messages:
-                if msg['role'] == 'user':
-                    langchain_messages.append(HumanMessage(content=msg['content']))
-                elif msg['role'] == 'assistant':
-                    langchain_messages.append(AIMessage(content=msg['content']))
-                elif msg['role'] == 'system':
-                    langchain_messages.append(SystemMessage(content=msg['content']))
+            langchain_messages = self._to_langchain_messages(messages, system_prompt)
 
             # Generate response
             response = await self.llm.ainvoke(langchain_messages)
@@ -96,6 +90,48 @@ class LLMService:
             logger.error(f"Failed to generate response: {e}")
             raise
 
+    async def stream_response(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a response from the LLM token by token
+
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            system_prompt: Optional system prompt
+
+        Yields:
+            Response text fragments as they arrive
+        """
+        langchain_messages = self._to_langchain_messages(messages, system_prompt)
+
+        async for chunk in self.llm.astream(langchain_messages):
+            if chunk.content:
+                yield chunk.content
+
+    def _to_langchain_messages(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None
+    ) -> List[BaseMessage]:
+        """Convert message dicts to LangChain message format"""
+        langchain_messages = []
+
+        if system_prompt:
+            langchain_messages.append(SystemMessage(content=system_prompt))
+
+        for msg in messages:
+            if msg['role'] == 'user':
+                langchain_messages.append(HumanMessage(content=msg['content']))
+            elif msg['role'] == 'assistant':
+                langchain_messages.append(AIMessage(content=msg['content']))
+            elif msg['role'] == 'system':
+                langchain_messages.append(SystemMessage(content=msg['content']))
+
+        return langchain_messages
+
     def get_age_based_system_prompt(self, user_age: Optional[int]) -> str:
         """
         Get system prompt based on user age
@@ -106,15 +142,36 @@ class LLMService:
         Returns:
             Age-appropriate system prompt
         """
-        if not settings.enable_age_based_responses or user_age is None:
+        age_band = self.get_age_band(user_age)
+
+        if age_band == "child":
+            return self._get_child_system_prompt()
+        elif age_band == "teen":
+            return self._get_teen_system_prompt()
+        elif age_band == "adult":
+            return self._get_adult_system_prompt()
+        else:
             return self._get_default_system_prompt()
 
+    def get_age_band(self, user_age: Optional[int]) -> str:
+        """
+        Get the age band used to pick a system prompt
+
+        Args:
+            user_age: User's age
+
+        Returns:
+            One of "default", "child", "teen" or "adult"
+        """
+        if not settings.enable_age_based_responses or user_age is None:
+            return "default"
+
         if user_age <= settings.child_age_max:
-            return self._get_child_system_prompt()
+            return "child"
         elif user_age <= settings.teen_age_max:
-            return self._get_teen_system_prompt()
+            return "teen"
         else:
-            return self._get_adult_system_prompt()
+            return "adult"
 
     def _get_default_system_prompt(self) -> str:
         """Default system prompt"""
@@ -0,0 +1,109 @@
+"""
+Progress tracking for document ingestion
+"""
+from typing import Dict, Any, Optional
+from collections import OrderedDict
+import time
+
+from app.config import settings
+
+
+class IngestionProgressTracker:
+    """
+    Singleton record of how far each document's ingestion has got
+
+    Entries are kept in memory per document ID, so a long PDF can be polled
+    while its windows are written. chunks_done counts chunks whose window is
+    fully written; embedded and upserted count only new chunks, since chunks
+    kept by an incremental sync need neither. Only the most recent entries
+    are kept; finished ones are dropped first.
+    """
+
+    _instance = None
+
+    def __init__(self):
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+
+    @classmethod
+    def get_instance(cls):
+        """Get singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def start(self, document_id: int, source: str, total_pages: Optional[int] = None):
+        """
+        Record the start of an ingestion, replacing any earlier entry
+
+        Args:
+            document_id: Moodle document ID
+            source: Filename or URL being ingested
+            total_pages: Page count if known
+        """
+        now = time.time()
+        self._entries.pop(document_id, None)
+        self._entries[document_id] = {
+            'document_id': document_id,
+            'status': 'running',
+            'source': source,
+            'pages_done': 0,
+            'total_pages': total_pages,
+            'chunks_done': 0,
+            'embedded': 0,
+            'upserted': 0,
+            'started': now,
+            'updated': now,
+            'error': None,
+            'result': None
+        }
+        self._evict()
+
+    def update(self, document_id: int, **fields):
+        """Update counters of a running ingestion"""
+        entry = self._entries.get(document_id)
+        if entry is not None:
+            entry.update(fields, updated=time.time())
+
+    def finish(self, document_id: int, result: Dict[str, Any]):
+        """Mark an ingestion as done"""
+        self.update(document_id, status='done', result=result)
+
+    def fail(self, document_id: int, error: str):
+        """Mark an ingestion as failed"""
+        self.update(document_id, status='failed', error=error)
+
+    def get(self, document_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Get the progress of a document's latest ingestion
+
+        Args:
+            document_id: Moodle document ID
+
+        Returns:
+            Progress entry, or None if nothing is recorded
+        """
+        entry = self._entries.get(document_id)
+        return dict(entry) if entry is not None else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get tracker statistics"""
+        running = sum(1 for entry in self._entries.values() if entry['status'] == 'running')
+        return {
+            'entries': len(self._entries),
+            'running': running
+        }
+
+    def _evict(self):
+        """Drop the oldest entries over the limit, finished ones first"""
+        excess = len(self._entries) - settings.ingest_progress_max_entries
+        if excess <= 0:
+            return
+
+        finished = [doc_id for doc_id, entry in self._entries.items() if entry['status'] != 'running']
+        for document_id in finished[:excess]:
+            del self._entries[document_id]
+            excess -= 1
+
+        while excess > 0:
+            self._entries.popitem(last=False)
+            excess -= 1
@@ -0,0 +1,121 @@
+"""
+Cross-encoder reranking of retrieved knowledge base chunks
+"""
+from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import time
+
+from loguru import logger
+
+try:
+    from sentence_transformers import CrossEncoder
+    CROSS_ENCODER_AVAILABLE = True
+except ImportError:
+    CROSS_ENCODER_AVAILABLE = False
+    logger.warning("sentence-transformers not available, reranking disabled")
+
+from app.config import settings
+
+
+class RerankService:
+    """
+    Singleton scoring (query, chunk) pairs with a local cross-encoder
+
+    All candidates of a query are scored in one batched pass on a dedicated
+    thread pool, so inference stays off the event loop and the number of
+    concurrent CPU-bound passes is bounded by the pool size.
+    """
+
+    _instance = None
+
+    def __init__(self):
+        self.model: Optional["CrossEncoder"] = None
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.rerank_workers,
+            thread_name_prefix="rerank"
+        )
+        self.initialized = False
+
+        self.batches = 0
+        self.total_ms = 0.0
+
+    @classmethod
+    def get_instance(cls):
+        """Get singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def available(self) -> bool:
+        """Whether reranking is enabled and the model can be loaded"""
+        return settings.enable_rerank and CROSS_ENCODER_AVAILABLE
+
+    async def initialize(self):
+        """Load the cross-encoder model"""
+        if self.initialized or not self.available:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+            self.model = await loop.run_in_executor(
+                self.executor,
+                lambda: CrossEncoder(settings.rerank_model, max_length=settings.rerank_max_length, device="cpu")
+            )
+            self.initialized = True
+            logger.info(f"✓ Rerank model loaded: {settings.rerank_model}")
+
+        except Exception as e:
+            logger.error(f"Failed to load rerank model: {e}")
+            raise
+
+    async def rerank(
+        self,
+        query: str,
+        results: List[Dict[str, Any]],
+        top_k: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Reorder search results by cross-encoder relevance
+
+        Args:
+            query: Search query
+            results: Search results, best first
+            top_k: Number of results to keep
+
+        Returns:
+            The top_k results with a 'rerank_score', best first
+        """
+        if not self.initialized:
+            await self.initialize()
+
+        candidates = results[:settings.rerank_max_candidates]
+        if not candidates:
+            return []
+
+        start = time.perf_counter()
+        pairs = [(query, result['text']) for result in candidates]
+
+        loop = asyncio.get_running_loop()
+        scores = await loop.run_in_executor(
+            self.executor,
+            lambda: self.model.predict(pairs, batch_size=settings.rerank_batch_size, show_progress_bar=False)
+        )
+
+        elapsed = (time.perf_counter() - start) * 1000
+        self.batches += 1
+        self.total_ms += elapsed
+        logger.debug(f"Reranked {len(candidates)} candidates in {elapsed:.1f}ms")
+
+        ranked = sorted(zip(candidates, scores), key=lambda item: float(item[1]), reverse=True)
+        return [{**result, 'rerank_score': float(score)} for result, score in ranked[:top_k]]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get rerank statistics"""
+        return {
+            "enabled": self.available,
+            "model": settings.rerank_model,
+            "batches": self.batches,
+            "avg_ms": round(self.total_ms / self.batches, 2) if self.batches else 0.0
+        }
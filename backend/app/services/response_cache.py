@@ -0,0 +1,227 @@
+"""
+Semantic response cache for reusing answers to similar queries
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+import itertools
+import time
+
+import numpy as np
+from loguru import logger
+
+from app.config import settings
+
+# Rough per-entry bookkeeping overhead in bytes (dicts, keys, timestamps)
+ENTRY_OVERHEAD_BYTES = 256
+
+CacheKey = Tuple[str, str, int]
+
+
+class SemanticResponseCache:
+    """
+    Singleton cache of agent responses keyed by query embedding
+
+    Entries are bucketed by (age band, route, course) and reused when a new
+    query's embedding is within the configured cosine distance of a cached
+    query. Entries expire after a TTL, the least recently used entries are
+    evicted once the entry or memory limit is reached, and the whole cache is
+    dropped when the knowledge base version changes.
+    """
+
+    _instance = None
+
+    def __init__(self):
+        self.max_distance = settings.response_cache_max_distance
+        self.ttl = settings.response_cache_ttl_seconds
+        self.max_entries = settings.response_cache_max_entries
+        self.max_bytes = settings.response_cache_max_bytes
+
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._buckets: Dict[CacheKey, List[int]] = {}
+        self._matrices: Dict[CacheKey, Tuple[List[int], np.ndarray]] = {}
+        self._ids = itertools.count()
+        self.kb_version = 0
+        self.current_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @classmethod
+    def get_instance(cls):
+        """Get singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def lookup(
+        self,
+        embedding: List[float],
+        age_band: str,
+        route: str,
+        kb_version: int,
+        course_id: int = 0
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Find a cached response for a similar query
+
+        Args:
+            embedding: Query embedding
+            age_band: Age band of the system prompt
+            route: Route chosen for the query
+            kb_version: Current knowledge base version
+            course_id: Moodle course the answer was retrieved for, 0 for none
+
+        Returns:
+            Cached response with content and sources, or None on a miss
+        """
+        if not self._sync_version(kb_version):
+            self.misses += 1
+            return None
+
+        key = (age_band, route, course_id)
+        self._expire(key)
+
+        ids, matrix = self._get_matrix(key)
+        if not ids:
+            self.misses += 1
+            return None
+
+        query = self._normalize(embedding)
+        similarities = matrix @ query
+        best = int(np.argmax(similarities))
+        distance = 1.0 - float(similarities[best])
+
+        if distance > self.max_distance:
+            self.misses += 1
+            return None
+
+        entry_id = ids[best]
+        self._entries.move_to_end(entry_id)
+        self.hits += 1
+        logger.info(f"✓ Response cache hit (distance {distance:.4f})")
+        return self._entries[entry_id]["response"]
+
+    def store(
+        self,
+        embedding: List[float],
+        age_band: str,
+        route: str,
+        kb_version: int,
+        response: Dict[str, Any],
+        course_id: int = 0
+    ):
+        """
+        Cache a response
+
+        Args:
+            embedding: Query embedding
+            age_band: Age band of the system prompt
+            route: Route chosen for the query
+            kb_version: Knowledge base version the response was built from
+            response: Response with content and sources
+            course_id: Moodle course the answer was retrieved for, 0 for none
+        """
+        if not self._sync_version(kb_version):
+            return
+
+        vector = self._normalize(embedding)
+        size = (
+            vector.nbytes
+            + len(response.get("content", "").encode("utf-8"))
+            + sum(len(s) for s in response.get("sources", []))
+            + ENTRY_OVERHEAD_BYTES
+        )
+        if size > self.max_bytes:
+            return
+
+        key = (age_band, route, course_id)
+        entry_id = next(self._ids)
+        self._entries[entry_id] = {
+            "key": key,
+            "vector": vector,
+            "response": response,
+            "created": time.monotonic(),
+            "size": size
+        }
+        self._buckets.setdefault(key, []).append(entry_id)
+        self._matrices.pop(key, None)
+        self.current_bytes += size
+
+        while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+            oldest_id = next(iter(self._entries))
+            self._remove(oldest_id)
+            self.evictions += 1
+
+    def invalidate(self):
+        """Drop every cached response"""
+        self._entries.clear()
+        self._buckets.clear()
+        self._matrices.clear()
+        self.current_bytes = 0
+        self.invalidations += 1
+        logger.info("Response cache invalidated")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "kb_version": self.kb_version
+        }
+
+    def _sync_version(self, kb_version: int) -> bool:
+        """
+        Invalidate when the knowledge base has changed
+
+        Returns:
+            False if the caller's version is older than the cache's
+        """
+        if kb_version > self.kb_version:
+            if self._entries:
+                self.invalidate()
+            self.kb_version = kb_version
+        return kb_version == self.kb_version
+
+    def _expire(self, key: CacheKey):
+        """Remove entries in a bucket that have outlived the TTL"""
+        cutoff = time.monotonic() - self.ttl
+        expired = [i for i in self._buckets.get(key, []) if self._entries[i]["created"] < cutoff]
+        for entry_id in expired:
+            self._remove(entry_id)
+            self.expirations += 1
+
+    def _get_matrix(self, key: CacheKey) -> Tuple[List[int], np.ndarray]:
+        """Get the stacked embeddings of a bucket, rebuilding after changes"""
+        if key not in self._matrices:
+            ids = list(self._buckets.get(key, []))
+            matrix = np.stack([self._entries[i]["vector"] for i in ids]) if ids else None
+            self._matrices[key] = (ids, matrix)
+        return self._matrices[key]
+
+    def _remove(self, entry_id: int):
+        """Remove a single entry"""
+        entry = self._entries.pop(entry_id)
+        key = entry["key"]
+        self._buckets[key].remove(entry_id)
+        if not self._buckets[key]:
+            del self._buckets[key]
+        self._matrices.pop(key, None)
+        self.current_bytes -= entry["size"]
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        """Convert to a unit-length float32 vector"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
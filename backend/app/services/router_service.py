@@ -0,0 +1,305 @@
+"""
+Query routing service with an in-process classifier and LLM fallback
+"""
+from typing import Dict, Any, List, Optional
+from collections import Counter
+import json
+import math
+import re
+
+from loguru import logger
+
+from app.config import settings
+from app.services.llm_service import LLMService
+
+
+# Classifier categories mapped to agent routes
+CATEGORY_ROUTES = {
+    "knowledge_base": "rag",
+    "current_events": "search",
+    "general": "llm",
+}
+
+# Labelled example queries used to train the local router
+DEFAULT_EXAMPLES: Dict[str, List[str]] = {
+    "knowledge_base": [
+        "What does the course syllabus say about late submissions?",
+        "Summarise chapter 3 of the lecture notes",
+        "What is the deadline for assignment 2 in this course?",
+        "According to the uploaded PDF, what are the learning outcomes?",
+        "What topics are covered in week 5 of the module?",
+        "Explain the marking rubric from the course handbook",
+        "What does the reading material say about photosynthesis?",
+        "Which textbook pages cover the quiz content?",
+        "What are the requirements for the final project in the course guide?",
+        "Find the section of the notes about Newton's second law",
+        "What did the lecture slides say about cell division?",
+        "Where in the document is the grading policy described?",
+        "What is the attendance policy in the syllabus?",
+        "List the key terms defined in unit 4 of the course materials",
+        "What examples are given in the lab manual for titration?",
+        "How many credits is this module according to the handbook?",
+        "What does our course document say about referencing style?",
+        "Show me the formula sheet from the uploaded resources",
+        "What chapters should I read before the midterm exam?",
+        "What is in the study guide for the final exam?",
+        "What does the teacher's handout say about fractions?",
+        "Quote the definition of entropy from the course notes",
+        "Which case studies are included in the module readings?",
+        "What are the safety rules listed in the lab document?",
+    ],
+    "current_events": [
+        "What is the latest news about climate change?",
+        "Who won the election yesterday?",
+        "What happened in the stock market today?",
+        "What are the current COVID guidelines this week?",
+        "Latest developments in artificial intelligence this month",
+        "What is the weather forecast for tomorrow?",
+        "Who won the football match last night?",
+        "What are today's top headlines?",
+        "What is the current price of bitcoin?",
+        "Any recent news about the Mars mission?",
+        "What did the prime minister announce this morning?",
+        "What new iPhone was released this year?",
+        "What are the trending topics right now?",
+        "Is there breaking news about the earthquake?",
+        "What is the current inflation rate?",
+        "Who is the current president of France?",
+        "What happened at the summit last week?",
+        "When is the next solar eclipse happening this year?",
+        "What are the latest results of the Olympics?",
+        "Recent announcements from NASA",
+        "What is the exchange rate of the euro today?",
+        "Show me news from this week about renewable energy",
+        "What movies came out this weekend?",
+        "Current status of the strike in the news",
+    ],
+    "general": [
+        "Explain how photosynthesis works",
+        "What is the difference between a virus and a bacterium?",
+        "Help me understand quadratic equations",
+        "How do I write a good essay introduction?",
+        "Can you explain recursion with an example?",
+        "What is the meaning of democracy?",
+        "Tell me a fun fact about space",
+        "How does gravity work?",
+        "What is a prime number?",
+        "Give me tips for studying for exams",
+        "How do I solve 2x + 3 = 7?",
+        "What causes the seasons on Earth?",
+        "Explain supply and demand simply",
+        "Translate hello into Spanish",
+        "What is the Pythagorean theorem?",
+        "How can I improve my handwriting?",
+        "Why is the sky blue?",
+        "What is an adjective?",
+        "How do plants grow from seeds?",
+        "Write a short poem about the ocean",
+        "What is the capital of Japan?",
+        "Explain the water cycle to a child",
+        "How do computers store information?",
+        "What are good ways to manage my time?",
+    ],
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def _extract_features(text: str) -> List[str]:
+    """Lowercased word unigrams and bigrams"""
+    tokens = _TOKEN_RE.findall(text.lower())
+    bigrams = [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return tokens + bigrams
+
+
+class LocalQueryRouter:
+    """Multinomial naive Bayes classifier trained on labelled example queries"""
+
+    def __init__(self, examples: Optional[Dict[str, List[str]]] = None):
+        self.categories: List[str] = []
+        self.log_priors: Dict[str, float] = {}
+        self.log_likelihoods: Dict[str, Dict[str, float]] = {}
+        self.log_unseen: Dict[str, float] = {}
+        self.train(examples or DEFAULT_EXAMPLES)
+
+    def train(self, examples: Dict[str, List[str]]):
+        """
+        Train the classifier
+
+        Args:
+            examples: Mapping of category name to example queries
+        """
+        total_examples = sum(len(queries) for queries in examples.values())
+        counts: Dict[str, Counter] = {}
+        vocabulary = set()
+
+        for category, queries in examples.items():
+            counter = Counter()
+            for query in queries:
+                counter.update(_extract_features(query))
+            counts[category] = counter
+            vocabulary.update(counter)
+
+        vocab_size = len(vocabulary) + 1
+        self.categories = list(examples.keys())
+
+        for category, counter in counts.items():
+            total = sum(counter.values()) + vocab_size
+            self.log_priors[category] = math.log(len(examples[category]) / total_examples)
+            self.log_likelihoods[category] = {
+                feature: math.log((count + 1) / total) for feature, count in counter.items()
+            }
+            self.log_unseen[category] = math.log(1 / total)
+
+        logger.debug(f"Local router trained on {total_examples} examples, {vocab_size - 1} features")
+
+    def classify(self, query: str) -> Dict[str, Any]:
+        """
+        Classify a query
+
+        Args:
+            query: User's question
+
+        Returns:
+            Category, route and confidence in [0, 1]
+        """
+        features = _extract_features(query)
+        known = [f for f in features if any(f in self.log_likelihoods[c] for c in self.categories)]
+
+        scores = {}
+        for category in self.categories:
+            likelihoods = self.log_likelihoods[category]
+            unseen = self.log_unseen[category]
+            scores[category] = self.log_priors[category] + sum(likelihoods.get(f, unseen) for f in known)
+
+        # Temper the posterior so long queries don't look overconfident
+        temperature = math.sqrt(max(1, len(known)))
+        peak = max(scores.values())
+        exp_scores = {c: math.exp((s - peak) / temperature) for c, s in scores.items()}
+        norm = sum(exp_scores.values())
+        category = max(exp_scores, key=exp_scores.get)
+
+        return {
+            "category": category,
+            "route": CATEGORY_ROUTES[category],
+            "confidence": exp_scores[category] / norm if known else 0.0,
+            "router": "local"
+        }
+
+
+class LLMQueryRouter:
+    """Classifies queries with a single LLM call"""
+
+    def __init__(self):
+        self.llm_service = LLMService.get_instance()
+
+    async def classify(self, query: str) -> Dict[str, Any]:
+        """
+        Classify a query using the LLM
+
+        Args:
+            query: User's question
+
+        Returns:
+            Category, route and confidence
+        """
+        classification_prompt = f"""Classify the following user query into one of these categories:
+
+1. "knowledge_base" - Questions about course materials, documents, or information that would be in uploaded PDFs/URLs
+2. "current_events" - Questions about recent events, news, or time-sensitive information
+3. "general" - General questions, explanations, help with concepts
+
+Query: {query}
+
+Respond with ONLY one word: knowledge_base, current_events, or general"""
+
+        messages = [{"role": "user", "content": classification_prompt}]
+        classification = await self.llm_service.generate_response(messages)
+        classification = classification.strip().lower()
+
+        if "knowledge_base" in classification:
+            category = "knowledge_base"
+        elif "current_events" in classification or "current" in classification:
+            category = "current_events"
+        else:
+            category = "general"
+
+        return {
+            "category": category,
+            "route": CATEGORY_ROUTES[category],
+            "confidence": 1.0,
+            "router": "llm"
+        }
+
+
+class QueryRouterService:
+    """Singleton router combining the local classifier with an LLM fallback"""
+
+    _instance = None
+
+    def __init__(self):
+        self.local_router = LocalQueryRouter(self._load_examples())
+        self.llm_router: Optional[LLMQueryRouter] = None
+        self.mode = settings.router_mode
+        self.threshold = settings.router_confidence_threshold
+
+    @classmethod
+    def get_instance(cls):
+        """Get singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def _load_examples(self) -> Dict[str, List[str]]:
+        """Load labelled examples from the configured file, falling back to the defaults"""
+        if not settings.router_examples_path:
+            return DEFAULT_EXAMPLES
+
+        try:
+            with open(settings.router_examples_path, encoding="utf-8") as f:
+                examples = json.load(f)
+            unknown = set(examples) - set(CATEGORY_ROUTES)
+            if unknown:
+                raise ValueError(f"Unknown router categories: {', '.join(sorted(unknown))}")
+            logger.info(f"✓ Loaded router examples from {settings.router_examples_path}")
+            return examples
+        except Exception as e:
+            logger.error(f"Failed to load router examples: {e}, using defaults")
+            return DEFAULT_EXAMPLES
+
+    def _get_llm_router(self) -> LLMQueryRouter:
+        """Create the LLM router on first use"""
+        if self.llm_router is None:
+            self.llm_router = LLMQueryRouter()
+        return self.llm_router
+
+    async def route(self, query: str) -> Dict[str, Any]:
+        """
+        Route a query
+
+        In "local" mode only the in-process classifier is used, in "llm" mode
+        every query goes to the LLM, and in "hybrid" mode the LLM is only
+        consulted when the local confidence is below the threshold.
+
+        Args:
+            query: User's question
+
+        Returns:
+            Category, route, confidence and the router that decided
+        """
+        if self.mode == "llm":
+            return await self._get_llm_router().classify(query)
+
+        decision = self.local_router.classify(query)
+
+        if self.mode == "hybrid" and decision["confidence"] < self.threshold:
+            logger.info(
+                f"Local router confidence {decision['confidence']:.2f} below "
+                f"{self.threshold:.2f}, falling back to LLM"
+            )
+            try:
+                return await self._get_llm_router().classify(query)
+            except Exception as e:
+                logger.error(f"LLM routing failed: {e}, using local decision")
+
+        return decision
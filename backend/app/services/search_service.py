@@ -122,8 +122,23 @@ class SearchService:
 
         formatted = "Web Search Results:\n\n"
         for i, result in enumerate(results, 1):
-            formatted += f"{i}. {result['title']}\n"
-            formatted += f"   {result['snippet']}\n"
-            formatted += f"   Source: {result['link']}\n\n"
+            formatted += self.format_search_result(i, result)
 
         return formatted
+
+    def format_search_result(self, index: int, result: Dict[str, Any]) -> str:
+        """
+        Format a single search result
+
+        Args:
+            index: 1-based position of the result
+            result: Search result
+
+        Returns:
+            Formatted text
+        """
+        return (
+            f"{index}. {result['title']}\n"
+            f"   {result['snippet']}\n"
+            f"   Source: {result['link']}\n\n"
+        )
@@ -0,0 +1,172 @@
+"""
+Server-side chat session store so clients only send new messages
+"""
+from typing import Dict, Any, List, Optional
+from collections import OrderedDict
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+from loguru import logger
+
+from app.config import settings
+
+# Rough per-message bookkeeping overhead in bytes
+MESSAGE_OVERHEAD_BYTES = 100
+
+
+class ChatSessionStore:
+    """
+    Singleton store of chat transcripts keyed by Moodle chat ID
+
+    Sessions live in a bounded in-memory LRU. When a session is evicted it is
+    spilled to SQLite if a store path is configured, and loaded back on the
+    next request for that chat. Unknown sessions return None so the caller
+    can ask the client for the full history.
+    """
+
+    _instance = None
+
+    def __init__(self):
+        self._sessions: "OrderedDict[int, List[Dict[str, str]]]" = OrderedDict()
+        self._sizes: Dict[int, int] = {}
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_loads = 0
+        self.evictions = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if settings.session_store_path:
+            self._db = sqlite3.connect(settings.session_store_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "chat_id INTEGER PRIMARY KEY, messages TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+            self._db.commit()
+
+    @classmethod
+    def get_instance(cls):
+        """Get singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    async def get(self, chat_id: int) -> Optional[List[Dict[str, str]]]:
+        """
+        Get a chat transcript
+
+        Args:
+            chat_id: Moodle chat ID
+
+        Returns:
+            Messages, oldest first, or None if the session is unknown
+        """
+        if chat_id in self._sessions:
+            self._sessions.move_to_end(chat_id)
+            self.hits += 1
+            return list(self._sessions[chat_id])
+
+        if self._db is not None:
+            messages = await asyncio.to_thread(self._load, chat_id)
+            if messages is not None:
+                self.disk_loads += 1
+                self.hits += 1
+                await self._put(chat_id, messages)
+                return list(messages)
+
+        self.misses += 1
+        return None
+
+    async def replace(self, chat_id: int, messages: List[Dict[str, str]]):
+        """
+        Replace a chat transcript with the full history sent by the client
+
+        Args:
+            chat_id: Moodle chat ID
+            messages: Messages, oldest first
+        """
+        await self._put(chat_id, [{"role": m["role"], "content": m["content"]} for m in messages])
+
+    async def append(self, chat_id: int, messages: List[Dict[str, str]]):
+        """
+        Append messages to a chat transcript
+
+        Args:
+            chat_id: Moodle chat ID
+            messages: New messages, oldest first
+        """
+        existing = await self.get(chat_id)
+        if existing is None:
+            # Without the earlier history the transcript would be wrong
+            return
+        await self._put(chat_id, existing + messages)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get session store statistics"""
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self.current_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_loads": self.disk_loads,
+            "evictions": self.evictions,
+            "disk": self._db is not None
+        }
+
+    async def _put(self, chat_id: int, messages: List[Dict[str, str]]):
+        """Store a session in memory, spilling least recently used ones"""
+        size = sum(len(m["content"].encode("utf-8")) + MESSAGE_OVERHEAD_BYTES for m in messages)
+
+        self.current_bytes -= self._sizes.get(chat_id, 0)
+        self._sessions[chat_id] = messages
+        self._sessions.move_to_end(chat_id)
+        self._sizes[chat_id] = size
+        self.current_bytes += size
+
+        evicted = []
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > settings.session_max_sessions
+            or self.current_bytes > settings.session_max_bytes
+        ):
+            old_id, old_messages = self._sessions.popitem(last=False)
+            self.current_bytes -= self._sizes.pop(old_id)
+            self.evictions += 1
+            evicted.append((old_id, old_messages))
+
+        if evicted and self._db is not None:
+            await asyncio.to_thread(self._spill, evicted)
+
+    def _load(self, chat_id: int) -> Optional[List[Dict[str, str]]]:
+        """Load a spilled session from SQLite"""
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT messages FROM sessions WHERE chat_id = ?", (chat_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("DELETE FROM sessions WHERE chat_id = ?", (chat_id,))
+            self._db.commit()
+        return json.loads(row[0])
+
+    def _spill(self, sessions: List[Any]):
+        """Write evicted sessions to SQLite, keeping the newest within the cap"""
+        now = time.time()
+        try:
+            with self._db_lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO sessions (chat_id, messages, updated) VALUES (?, ?, ?)",
+                    [(chat_id, json.dumps(messages), now) for chat_id, messages in sessions]
+                )
+                self._db.execute(
+                    "DELETE FROM sessions WHERE chat_id NOT IN "
+                    "(SELECT chat_id FROM sessions ORDER BY updated DESC LIMIT ?)",
+                    (settings.session_disk_max_sessions,)
+                )
+                self._db.commit()
+        except Exception as e:
+            logger.error(f"Failed to spill chat sessions: {e}")
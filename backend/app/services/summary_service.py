@@ -0,0 +1,118 @@
+"""
+Rolling conversation summaries to keep prompts bounded on long chats
+"""
+from typing import Dict, Any, List, Optional, Set
+from collections import OrderedDict
+import asyncio
+
+from loguru import logger
+
+from app.config import settings
+from app.services.llm_service import LLMService
+
+
+class ConversationSummaryService:
+    """
+    Singleton keeping an incrementally updated summary per chat
+
+    Once enough messages have fallen out of the recent window, they are
+    folded into the chat's summary by a background task. Prompts then carry
+    the summary plus only the messages it does not cover yet.
+    """
+
+    _instance = None
+
+    def __init__(self):
+        self.llm_service = LLMService.get_instance()
+        self._summaries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._updating: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    @classmethod
+    def get_instance(cls):
+        """Get singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def get_summary(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Get the current summary of a chat
+
+        Args:
+            chat_id: Moodle chat ID
+
+        Returns:
+            Dict with 'summary' text and 'covered' message count, or None
+        """
+        entry = self._summaries.get(chat_id)
+        if entry:
+            self._summaries.move_to_end(chat_id)
+        return entry
+
+    def schedule_update(self, chat_id: int, transcript: List[Dict[str, str]]):
+        """
+        Fold older messages into the summary off the request path
+
+        Args:
+            chat_id: Moodle chat ID
+            transcript: Full conversation including the latest answer
+        """
+        if chat_id in self._updating:
+            return
+
+        entry = self._summaries.get(chat_id) or {"summary": "", "covered": 0}
+        foldable = len(transcript) - settings.summary_recent_messages
+        if foldable - entry["covered"] < settings.summary_batch_messages:
+            return
+
+        self._updating.add(chat_id)
+        task = asyncio.create_task(
+            self._update(chat_id, entry, transcript[entry["covered"]:foldable], foldable)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _update(
+        self,
+        chat_id: int,
+        entry: Dict[str, Any],
+        messages: List[Dict[str, str]],
+        covered: int
+    ):
+        """Ask the LLM to merge new messages into the existing summary"""
+        try:
+            conversation = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+            prompt = f"""Update the summary of a tutoring conversation between a student and an AI assistant.
+
+Existing summary:
+{entry['summary'] or '(none)'}
+
+New messages:
+{conversation}
+
+Write the updated summary in at most {settings.summary_max_words} words. Keep the student's goals,
+questions asked, key facts and explanations given, and anything they said they still need help with.
+Respond with ONLY the summary."""
+
+            summary = await self.llm_service.generate_response([{"role": "user", "content": prompt}])
+
+            self._summaries[chat_id] = {"summary": summary.strip(), "covered": covered}
+            self._summaries.move_to_end(chat_id)
+            while len(self._summaries) > settings.summary_max_chats:
+                self._summaries.popitem(last=False)
+
+            logger.info(f"✓ Updated summary for chat {chat_id} ({covered} messages covered)")
+
+        except Exception as e:
+            logger.error(f"Failed to update summary for chat {chat_id}: {e}")
+
+        finally:
+            self._updating.discard(chat_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get summary store statistics"""
+        return {
+            "chats": len(self._summaries),
+            "updating": len(self._updating)
+        }
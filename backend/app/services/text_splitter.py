@@ -0,0 +1,340 @@
+"""
+Structure-aware text splitting for ingestion
+"""
+from typing import List, Dict, Any, Optional, Tuple
+import re
+
+import tiktoken
+
+from app.config import settings
+
+# Strength of the boundary before a line; chunks are cut at the strongest one available
+HEADING = 4
+PARAGRAPH = 3
+LINE = 2
+WORD = 1
+
+HEADING_PATTERN = re.compile(r'(#{1,6})[ \t]+(.+)')
+# Lines that start a block of their own even without a blank line before them
+BLOCK_START_PATTERN = re.compile(r'[*\-+>|][ \t]|\d+[.)][ \t]')
+NON_SPACE_PATTERN = re.compile(r'\S')
+SENTENCE_ENDS = ('. ', '! ', '? ', '.\n', '!\n', '?\n')
+LINE_ENDS = '.!?:;'
+BLOCK_MARKERS = set('*-+>|0123456789')
+
+
+class TextSplitter:
+    """
+    Splits text into chunks at headings, paragraphs, lines and sentences
+
+    The text is read once as lines, each tagged with the strength of the
+    boundary before it: a heading, a paragraph (after a blank line), a line
+    that starts a block (after sentence-ending punctuation, or a list item,
+    quote or table row), or a line break inside a sentence, as in wrapped
+    PDF text. Lines are packed greedily up to CHUNK_SIZE. When the next line
+    does not fit, the chunk is cut at the strongest line boundary in its
+    second half; if that is only a wrapped line, or a single line is longer
+    than a chunk, it is cut at the last sentence end instead, then at a
+    space. Sentence ends are only searched (with str.rfind) in the window
+    where a cut is needed, so the pass stays linear and mostly in C.
+
+    A markdown heading starts a new chunk once the current one is a quarter
+    full, and the overlap of CHUNK_OVERLAP carried into the next chunk
+    starts at a sentence and never reaches back across a heading.
+
+    With CHUNK_LENGTH_UNIT=tokens, CHUNK_SIZE and CHUNK_OVERLAP are
+    measured in tokens of CHUNK_TOKENIZER (tiktoken) instead of characters.
+
+    Each chunk is an exact slice of its text; its metadata records the
+    'start' and 'end' character offsets and, under a heading, the
+    'section' as the path of headings ("Guide > Install").
+    """
+
+    def __init__(
+        self,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None,
+        length_unit: Optional[str] = None,
+        tokenizer: Optional[str] = None
+    ):
+        self.chunk_size = chunk_size or settings.chunk_size
+        self.chunk_overlap = settings.chunk_overlap if chunk_overlap is None else chunk_overlap
+        self.length_unit = length_unit or settings.chunk_length_unit
+        if self.length_unit not in ('chars', 'tokens'):
+            raise ValueError(f"Unknown chunk length unit: {self.length_unit}")
+        if self.chunk_overlap >= self.chunk_size:
+            raise ValueError("Chunk overlap must be smaller than the chunk size")
+
+        self.encoding = None
+        if self.length_unit == 'tokens':
+            self.encoding = tiktoken.get_encoding(tokenizer or settings.chunk_tokenizer)
+
+    def split_text(self, text: str) -> List[str]:
+        """Split text into chunk texts"""
+        return [chunk for chunk, _ in self.split(text)]
+
+    def split_texts(
+        self,
+        texts: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        Split several texts, e.g. the pages of a PDF
+
+        Args:
+            texts: Texts to split
+            metadatas: Metadata of each text, copied into its chunks
+
+        Returns:
+            Chunk texts and their metadata, in order
+        """
+        chunks: List[str] = []
+        chunk_metadatas: List[Dict[str, Any]] = []
+        for i, text in enumerate(texts):
+            base = metadatas[i] if metadatas else {}
+            for chunk, metadata in self.split(text):
+                chunks.append(chunk)
+                chunk_metadatas.append({**base, **metadata})
+        return chunks, chunk_metadatas
+
+    def split(self, text: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Split text into chunks with their offsets and section
+
+        Args:
+            text: Text to split
+
+        Returns:
+            (chunk text, metadata) pairs in order
+        """
+        starts, ends, strengths, sections = self._lines(text)
+        if not starts:
+            return []
+
+        size = self.chunk_size
+        count = len(starts)
+        tokens = self.encoding is not None
+        if tokens:
+            # Tokens up to the end of each line, one more per line for its line break
+            reach = []
+            total = 0
+            for encoded in self.encoding.encode_ordinary_batch([text[a:b] for a, b in zip(starts, ends)]):
+                total += len(encoded) + 1
+                reach.append(total)
+        else:
+            reach = ends
+
+        chunks = []
+        pos = following = starts[0]
+        current = 0  # line that pos is in
+        last_cut = pos
+        while True:
+            # The length from pos to the end of a line is reach[line] - offset
+            if tokens:
+                if pos == starts[current]:
+                    offset = (reach[current - 1] if current else 0) + 1
+                else:
+                    offset = reach[current] - self._measure(text[pos:ends[current]])
+            else:
+                offset = pos
+            limit = offset + size
+
+            if reach[current] > limit:
+                # A single line longer than a chunk
+                cut = self._cut_inside(text, pos, ends[current])
+            else:
+                section_limit = offset + size // 4
+                last = current
+                while last + 1 < count and reach[last + 1] <= limit:
+                    if strengths[last + 1] == HEADING and reach[last] >= section_limit:
+                        break
+                    last += 1
+
+                cut = ends[last]
+                if last + 1 < count and strengths[last + 1] < HEADING:
+                    # Out of room mid-section: strongest line boundary in the second half
+                    half = offset + size // 2
+                    best, strength = last, strengths[last + 1]
+                    for line in range(last - 1, current - 1, -1):
+                        if reach[line] < half:
+                            break
+                        if strengths[line + 1] > strength:
+                            best, strength = line, strengths[line + 1]
+                    if best > current and strengths[best] == HEADING:
+                        # Never end a chunk on a heading
+                        best, strength = best - 1, HEADING
+                    cut = ends[best]
+
+                    if strengths[best] == HEADING:
+                        # A heading followed by a line too long to join it: cut inside that line
+                        cut = self._cut_inside(text, pos, ends[best + 1])
+                    elif strength < LINE:
+                        # Only wrapped lines to cut at: prefer the last sentence end that fits
+                        window = ends[last] if tokens else min(pos + size, ends[last + 1])
+                        sentence = self._sentence_end(text, pos + (window - pos) // 2, window)
+                        if sentence > last_cut:
+                            cut = sentence
+
+            length = cut - pos
+            if tokens:
+                cut, length = self._shrink(text, pos, cut)
+            while cut > pos + 1 and text[cut - 1].isspace():
+                cut -= 1
+
+            if cut <= last_cut and pos < following:
+                # The overlap left no room to get past the last chunk: start without it
+                pos = following
+                while ends[current] <= pos:
+                    current += 1
+                continue
+
+            metadata = {'start': pos, 'end': cut}
+            if sections[current]:
+                metadata['section'] = sections[current]
+            chunks.append((text[pos:cut], metadata))
+            last_cut = cut
+
+            following = NON_SPACE_PATTERN.search(text, cut)
+            if following is None:
+                break
+            following = following.start()
+            while ends[current] <= following:
+                current += 1
+
+            # Carry the end of this chunk over, from a sentence start, unless
+            # the next chunk opens a new section
+            start = following
+            if self.chunk_overlap and not (following == starts[current] and strengths[current] == HEADING):
+                start = self._overlap_start(text, pos, cut, following, length)
+                line = current
+                while line > 0 and starts[line] > start:
+                    line -= 1
+                for heading in range(current, line - 1, -1):
+                    if starts[heading] < start:
+                        break
+                    if strengths[heading] == HEADING:
+                        start = starts[heading]
+                        break
+                current = line
+                while ends[current] <= start:
+                    current += 1
+            pos = start
+
+        return chunks
+
+    def _lines(self, text: str) -> Tuple[List[int], List[int], List[int], List[Optional[str]]]:
+        """
+        Read text as lines with the boundary before each, and its section
+
+        Returns:
+            Start and end offsets of each non-blank line (stripped), the
+            strength of the boundary before it, and the heading path in
+            effect at it
+        """
+        starts: List[int] = []
+        ends: List[int] = []
+        strengths: List[int] = []
+        sections: List[Optional[str]] = []
+        headings: List[Tuple[int, str]] = []
+        section: Optional[str] = None
+        block_start = BLOCK_START_PATTERN.match
+
+        offset = 0
+        blank = True
+        previous = '.'
+        for raw in text.split('\n'):
+            line_start = offset
+            offset += len(raw) + 1
+            line = raw.strip()
+            if not line:
+                blank = True
+                continue
+
+            first = line[0]
+            start = line_start if raw[0] == first else line_start + raw.index(first)
+            if first == '#' and HEADING_PATTERN.match(line):
+                heading = HEADING_PATTERN.match(line)
+                level = len(heading.group(1))
+                while headings and headings[-1][0] >= level:
+                    headings.pop()
+                headings.append((level, heading.group(2).strip()))
+                section = ' > '.join(title for _, title in headings)
+                strength = HEADING
+            elif blank:
+                strength = PARAGRAPH
+            elif previous in LINE_ENDS or (first in BLOCK_MARKERS and block_start(line)):
+                strength = LINE
+            else:
+                strength = WORD
+
+            starts.append(start)
+            ends.append(start + len(line))
+            strengths.append(strength)
+            sections.append(section)
+            blank = False
+            previous = line[-1]
+
+        return starts, ends, strengths, sections
+
+    def _measure(self, text: str) -> int:
+        """Length of text in the configured unit"""
+        if self.encoding is None:
+            return len(text)
+        return len(self.encoding.encode_ordinary(text))
+
+    def _cut_inside(self, text: str, pos: int, end: int) -> int:
+        """Where to cut a line that does not fit: a sentence end, else a space, else anywhere"""
+        if self.encoding is None:
+            limit = pos + self.chunk_size
+        else:
+            # Estimate where the budget runs out; _shrink corrects it
+            limit = pos + (end - pos) * self.chunk_size // max(1, self._measure(text[pos:end]))
+        limit = max(pos + 1, min(limit, end))
+
+        sentence = self._sentence_end(text, pos + (limit - pos) // 2, limit)
+        if sentence > pos:
+            return sentence
+        space = max(text.rfind(' ', pos + 1, limit + 1), text.rfind('\t', pos + 1, limit + 1))
+        return space if space > pos else limit
+
+    def _shrink(self, text: str, pos: int, cut: int) -> Tuple[int, int]:
+        """Move a cut back until the chunk fits the token budget; return it and the chunk's tokens"""
+        while cut - pos > 1:
+            length = self._measure(text[pos:cut])
+            if length <= self.chunk_size:
+                return cut, length
+            limit = pos + max(1, (cut - pos) * self.chunk_size // length - 1)
+            cut = self._cut_inside(text, pos, limit)
+        cut = max(cut, pos + 1)
+        return cut, self._measure(text[pos:cut])
+
+    def _sentence_end(self, text: str, low: int, high: int) -> int:
+        """Position just after the last sentence-ending punctuation in text[low:high], or -1"""
+        best = -1
+        for end in SENTENCE_ENDS:
+            found = text.rfind(end, low, high + 1)
+            if found > best:
+                best = found
+        return best + 1 if best >= 0 else -1
+
+    def _overlap_start(self, text: str, pos: int, cut: int, following: int, length: int) -> int:
+        """Start of the overlap carried into the next chunk, at a sentence or word"""
+        overlap = self.chunk_overlap
+        if self.encoding is not None:
+            # Convert the token overlap to characters at this chunk's density
+            overlap = overlap * (cut - pos) // max(1, length)
+
+        low = max(pos + 1, cut - overlap)
+        best = cut
+        for end in SENTENCE_ENDS:
+            found = text.find(end, low, cut)
+            if 0 <= found < best:
+                best = found + len(end)
+        if best >= cut:
+            space = text.find(' ', low, cut)
+            if space < 0:
+                return following
+            best = space
+
+        start = NON_SPACE_PATTERN.search(text, best)
+        return start.start() if start is not None and start.start() < cut else following
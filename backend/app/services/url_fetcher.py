@@ -0,0 +1,264 @@
+"""
+Async URL fetching with a shared connection pool and conditional requests
+"""
+from typing import Dict, Any, List, Optional
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+
+import httpx
+from loguru import logger
+
+from app.config import settings
+
+USER_AGENT = "MoodleAIAssistant/1.0 (+knowledge base ingestion)"
+
+
+class URLFetcher:
+    """
+    Singleton fetcher for URL documents
+
+    All fetches share one httpx.AsyncClient, so connections to a site are
+    reused. Bodies are streamed and abandoned once they exceed
+    FETCH_MAX_BYTES. For every ingested URL the ETag, Last-Modified and a
+    hash of the body are remembered (in SQLite if URL_STATE_PATH is set), so
+    a refresh sends a conditional request and can tell an unchanged page
+    apart without re-extracting or re-embedding it. A failed fetch counts as
+    a check too; every consecutive failure doubles the time until the next
+    refresh, and after URL_REFRESH_MAX_FAILURES the URL is no longer tracked.
+    """
+
+    _instance = None
+
+    def __init__(self):
+        self.client: Optional[httpx.AsyncClient] = None
+        self.fetches = 0
+        self.not_modified = 0
+        self.unchanged = 0
+        self.bytes_downloaded = 0
+
+        self._states: Dict[int, Dict[str, Any]] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if settings.url_state_path:
+            self._db = sqlite3.connect(settings.url_state_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS urls ("
+                "document_id INTEGER PRIMARY KEY, url TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+                "content_hash TEXT NOT NULL, chunks INTEGER NOT NULL, title TEXT, checked REAL NOT NULL, "
+                "course_id INTEGER NOT NULL DEFAULT 0, failures INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(urls)")]
+            if 'course_id' not in columns:
+                # State files written before documents were scoped to courses
+                self._db.execute("ALTER TABLE urls ADD COLUMN course_id INTEGER NOT NULL DEFAULT 0")
+            if 'failures' not in columns:
+                self._db.execute("ALTER TABLE urls ADD COLUMN failures INTEGER NOT NULL DEFAULT 0")
+            self._db.commit()
+            cursor = self._db.execute("SELECT * FROM urls")
+            columns = [column[0] for column in cursor.description]
+            for row in cursor.fetchall():
+                state = dict(zip(columns, row))
+                self._states[state['document_id']] = state
+
+    @classmethod
+    def get_instance(cls):
+        """Get singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def _client(self) -> httpx.AsyncClient:
+        """Create the shared client on first use, inside the running loop"""
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=httpx.Timeout(settings.fetch_timeout_seconds, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=settings.fetch_max_connections,
+                    max_keepalive_connections=settings.fetch_max_keepalive_connections
+                ),
+                follow_redirects=True,
+                headers={"User-Agent": USER_AGENT}
+            )
+        return self.client
+
+    async def fetch(self, url: str, document_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Fetch a URL, conditionally if the document was fetched before
+
+        Args:
+            url: URL to fetch
+            document_id: Moodle document ID whose stored validators to send
+
+        Returns:
+            Dict with 'modified' (False when the server answered 304 or the
+            body hash is unchanged), and otherwise 'content', the final
+            'url' after redirects, 'content_type', 'etag', 'last_modified'
+            and 'content_hash'
+        """
+        state = self.get_state(document_id) if document_id is not None else None
+        if state is not None and state['url'] != url:
+            state = None
+
+        headers = {}
+        if state is not None:
+            if state['etag']:
+                headers['If-None-Match'] = state['etag']
+            if state['last_modified']:
+                headers['If-Modified-Since'] = state['last_modified']
+
+        self.fetches += 1
+        async with self._client().stream("GET", url, headers=headers) as response:
+            if response.status_code == 304 and state is not None:
+                self.not_modified += 1
+                return {'modified': False}
+            response.raise_for_status()
+
+            declared = response.headers.get('Content-Length')
+            if declared and declared.isdigit() and int(declared) > settings.fetch_max_bytes:
+                raise ValueError(f"{url} is larger than {settings.fetch_max_bytes} bytes")
+
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+                if len(body) > settings.fetch_max_bytes:
+                    raise ValueError(f"{url} is larger than {settings.fetch_max_bytes} bytes")
+
+        self.bytes_downloaded += len(body)
+        content_hash = hashlib.sha256(body).hexdigest()
+        if state is not None and state['content_hash'] == content_hash:
+            self.unchanged += 1
+            return {'modified': False}
+
+        return {
+            'modified': True,
+            'content': bytes(body),
+            'url': str(response.url),
+            'content_type': response.headers.get('Content-Type', ''),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'content_hash': content_hash
+        }
+
+    def get_state(self, document_id: int) -> Optional[Dict[str, Any]]:
+        """Get what was stored about a document's URL at its last ingestion"""
+        state = self._states.get(document_id)
+        return dict(state) if state is not None else None
+
+    def get_due(self, max_age_seconds: float) -> List[Dict[str, Any]]:
+        """
+        Get URL documents last checked more than max_age_seconds ago
+
+        The age doubles with every consecutive failed check, so a broken URL
+        is retried less and less often.
+        """
+        now = time.time()
+        return [
+            dict(state) for state in self._states.values()
+            if state['checked'] < now - max_age_seconds * 2 ** min(state['failures'], 10)
+        ]
+
+    def get_tracked(self) -> List[int]:
+        """Get the IDs of all tracked URL documents"""
+        return list(self._states)
+
+    async def save_state(self, document_id: int, url: str, fetched: Dict[str, Any], chunks: int,
+                         title: Optional[str], course_id: int = 0):
+        """
+        Remember a URL document after it was ingested
+
+        Args:
+            document_id: Moodle document ID
+            url: Fetched URL
+            fetched: Result of fetch() with 'modified' True
+            chunks: Number of chunks stored
+            title: Page title
+            course_id: Moodle course of the document, reused by scheduled refreshes
+        """
+        self._states[document_id] = {
+            'document_id': document_id,
+            'url': url,
+            'etag': fetched['etag'],
+            'last_modified': fetched['last_modified'],
+            'content_hash': fetched['content_hash'],
+            'chunks': chunks,
+            'title': title,
+            'checked': time.time(),
+            'course_id': course_id,
+            'failures': 0
+        }
+        await self._persist(document_id)
+
+    async def mark_checked(self, document_id: int):
+        """Record that a document's URL was found unchanged"""
+        if document_id in self._states:
+            self._states[document_id].update(checked=time.time(), failures=0)
+            await self._persist(document_id)
+
+    async def mark_failed(self, document_id: int):
+        """
+        Record a failed fetch or ingestion of a document's URL
+
+        Postpones the next refresh, and stops tracking the URL once it failed
+        URL_REFRESH_MAX_FAILURES times in a row. Its chunks are kept.
+        """
+        state = self._states.get(document_id)
+        if state is None:
+            return
+
+        state.update(checked=time.time(), failures=state['failures'] + 1)
+        if 0 < settings.url_refresh_max_failures <= state['failures']:
+            logger.warning(
+                f"URL of document {document_id} failed {state['failures']} times in a row, "
+                f"no longer refreshed: {state['url']}"
+            )
+            del self._states[document_id]
+        await self._persist(document_id)
+
+    async def forget(self, document_id: int):
+        """Stop tracking a deleted document"""
+        if self._states.pop(document_id, None) is not None:
+            await self._persist(document_id)
+
+    async def close(self):
+        """Close the shared client"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get fetcher statistics"""
+        return {
+            "tracked_urls": len(self._states),
+            "fetches": self.fetches,
+            "not_modified": self.not_modified,
+            "unchanged": self.unchanged,
+            "bytes_downloaded": self.bytes_downloaded
+        }
+
+    async def _persist(self, document_id: int):
+        """Write a document's state to SQLite, or delete it if untracked"""
+        if self._db is not None:
+            await asyncio.to_thread(self._store, document_id, self.get_state(document_id))
+
+    def _store(self, document_id: int, state: Optional[Dict[str, Any]]):
+        """Upsert or delete a state row"""
+        try:
+            with self._db_lock:
+                if state is None:
+                    self._db.execute("DELETE FROM urls WHERE document_id = ?", (document_id,))
+                else:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO urls (document_id, url, etag, last_modified, content_hash, "
+                        "chunks, title, checked, course_id, failures) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            document_id, state['url'], state['etag'], state['last_modified'],
+                            state['content_hash'], state['chunks'], state['title'], state['checked'],
+                            state['course_id'], state['failures']
+                        )
+                    )
+                self._db.commit()
+        except Exception as e:
+            logger.error(f"Failed to store URL state for document {document_id}: {e}")
@@ -1,27 +1,88 @@
 """
 Qdrant vector store service for RAG
 """
-from typing import List, Dict, Any, Optional
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
-from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, PointIdsList, Filter, FieldCondition, MatchValue, MatchAny,
+    SetPayload, SetPayloadOperation, IsEmptyCondition, PayloadField, HnswConfigDiff, ScalarQuantization,
+    ScalarQuantizationConfig, ScalarType, SearchParams, QuantizationSearchParams, PayloadSchemaType,
+    VectorParamsDiff, Disabled
+)
+from collections import Counter
 from loguru import logger
+import asyncio
+import hashlib
+import httpx
+import inspect
 import uuid
 
 from app.config import settings
+from app.services.lexical_index import LexicalIndex
+from app.services.embedding_service import EmbeddingService
+
+# Points fetched per scroll request
+LEXICAL_SCROLL_BATCH = 256
+
+# Namespace for deterministic chunk point IDs
+CHUNK_ID_NAMESPACE = uuid.UUID("c7167162-f14d-42db-a735-170250ee48a5")
+
+
+def payload_indexes() -> Dict[str, PayloadSchemaType]:
+    """
+    Parse QDRANT_PAYLOAD_INDEXES, e.g. "document_id:integer,metadata.type:keyword"
+
+    Returns:
+        Payload field to index schema
+    """
+    indexes = {}
+    for entry in settings.qdrant_payload_indexes.split(","):
+        if not entry.strip():
+            continue
+        field, _, schema = entry.strip().rpartition(":")
+        if not field:
+            raise ValueError(f"Payload index needs a field and a type: {entry.strip()}")
+        indexes[field] = PayloadSchemaType(schema.strip().lower())
+    return indexes
+
+
+def reciprocal_rank_fusion(rankings: List[List[Dict[str, Any]]], k: int) -> List[Dict[str, Any]]:
+    """
+    Fuse ranked result lists by reciprocal rank
+
+    Args:
+        rankings: Result lists, best first, each result carrying an 'id'
+        k: RRF constant, larger values flatten the contribution of top ranks
+
+    Returns:
+        Results ordered by fused score, with 'score' set to the fused score
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, result in enumerate(ranking, 1):
+            entry = fused.setdefault(result['id'], {**result, 'score': 0.0})
+            entry['score'] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda result: result['score'], reverse=True)
 
 
 class VectorStoreService:
-    """Singleton service for managing vector store operations"""
+    """
+    Singleton service for managing vector store operations
+
+    Uses the asynchronous Qdrant client, so searches, upserts and deletes
+    never block the event loop, over REST with a pooled connection or gRPC.
+    """
 
     _instance = None
 
     def __init__(self):
-        self.client: Optional[QdrantClient] = None
-        self.embeddings: Optional[OpenAIEmbeddings] = None
-        self.vector_store: Optional[QdrantVectorStore] = None
+        self.client: Optional[AsyncQdrantClient] = None
+        self.embeddings: Optional[EmbeddingService] = None
+        self.lexical_index = LexicalIndex()
+        self.search_params: Optional[SearchParams] = None
         self.initialized = False
+        # Bumped whenever the knowledge base changes so caches can invalidate
+        self.kb_version = 0
 
     @classmethod
     def get_instance(cls):
@@ -37,42 +98,51 @@ class VectorStoreService:
 
         try:
             # Initialize Qdrant client
-            self.client = QdrantClient(
+            self.client = AsyncQdrantClient(
                 host=settings.qdrant_host,
                 port=settings.qdrant_port,
+                grpc_port=settings.qdrant_grpc_port,
+                prefer_grpc=settings.qdrant_prefer_grpc,
                 api_key=settings.qdrant_api_key,
-                timeout=30.0
+                timeout=30,
+                limits=httpx.Limits(
+                    max_connections=settings.qdrant_max_connections,
+                    max_keepalive_connections=settings.qdrant_max_keepalive_connections
+                )
             )
 
-            # Initialize embeddings
-            self.embeddings = OpenAIEmbeddings(
-                model=settings.openai_embedding_model,
-                openai_api_key=settings.openai_api_key
-            )
+            # Initialize embeddings, failing fast if they do not fit the collection
+            self.embeddings = EmbeddingService.get_instance()
+            await self.embeddings.initialize()
 
             # Check if collection exists
-            collections = self.client.get_collections().collections
+            collections = (await self.client.get_collections()).collections
             collection_names = [c.name for c in collections]
 
             if settings.qdrant_collection_name not in collection_names:
                 logger.info(f"Creating collection: {settings.qdrant_collection_name}")
-                self.client.create_collection(
+                await self.client.create_collection(
                     collection_name=settings.qdrant_collection_name,
-                    vectors_config=VectorParams(
-                        size=settings.qdrant_vector_size,
-                        distance=Distance.COSINE
-                    )
+                    **self.collection_config()
                 )
                 logger.info("✓ Collection created")
             else:
                 logger.info(f"✓ Collection already exists: {settings.qdrant_collection_name}")
+                drift = await self.collection_drift()
+                drift.pop('payload_indexes', None)
+                if drift:
+                    logger.warning(
+                        f"Collection {settings.qdrant_collection_name} differs from settings "
+                        f"({', '.join(drift)}); run python -m app.migrate_collection to apply them"
+                    )
 
-            # Initialize LangChain vector store wrapper
-            self.vector_store = QdrantVectorStore(
-                client=self.client,
-                collection_name=settings.qdrant_collection_name,
-                embedding=self.embeddings
-            )
+            # Cheap and idempotent, so missing payload indexes are always created
+            await self.ensure_payload_indexes()
+            await self._backfill_course_ids()
+            self.search_params = self._search_params()
+
+            if settings.search_mode == "hybrid":
+                await self._rebuild_lexical_index()
 
             self.initialized = True
             logger.info("✓ Vector store service initialized")
@@ -81,19 +151,167 @@ class VectorStoreService:
             logger.error(f"Failed to initialize vector store: {e}")
             raise
 
+    @staticmethod
+    def collection_config() -> Dict[str, Any]:
+        """
+        Vector, HNSW and quantization parameters of the collection, from settings
+
+        Returns:
+            Keyword arguments for create_collection
+        """
+        if settings.qdrant_quantization not in ('none', 'int8'):
+            raise ValueError(f"Unknown quantization: {settings.qdrant_quantization}")
+
+        quantization = None
+        if settings.qdrant_quantization == 'int8':
+            quantization = ScalarQuantization(
+                scalar=ScalarQuantizationConfig(
+                    type=ScalarType.INT8,
+                    quantile=settings.qdrant_quantization_quantile,
+                    always_ram=True
+                )
+            )
+        return {
+            'vectors_config': VectorParams(
+                size=settings.qdrant_vector_size,
+                distance=Distance.COSINE,
+                on_disk=settings.qdrant_on_disk_vectors
+            ),
+            'hnsw_config': HnswConfigDiff(m=settings.qdrant_hnsw_m, ef_construct=settings.qdrant_hnsw_ef_construct),
+            'quantization_config': quantization
+        }
+
+    async def collection_drift(self) -> Dict[str, Any]:
+        """
+        Compare the collection with the tuning settings
+
+        Returns:
+            Setting name to (current, configured) for every difference;
+            'payload_indexes' maps fields missing or of another type to
+            their current and configured schema
+        """
+        info = await self.client.get_collection(settings.qdrant_collection_name)
+        vectors = info.config.params.vectors
+        hnsw = info.config.hnsw_config
+        quantization = info.config.quantization_config
+
+        current_quantization = 'none'
+        if isinstance(quantization, ScalarQuantization) and quantization.scalar.type == ScalarType.INT8:
+            current_quantization = 'int8'
+        elif quantization is not None:
+            current_quantization = type(quantization).__name__
+
+        drift: Dict[str, Any] = {}
+        if bool(vectors.on_disk) != settings.qdrant_on_disk_vectors:
+            drift['on_disk_vectors'] = (bool(vectors.on_disk), settings.qdrant_on_disk_vectors)
+        if hnsw.m != settings.qdrant_hnsw_m:
+            drift['hnsw_m'] = (hnsw.m, settings.qdrant_hnsw_m)
+        if hnsw.ef_construct != settings.qdrant_hnsw_ef_construct:
+            drift['hnsw_ef_construct'] = (hnsw.ef_construct, settings.qdrant_hnsw_ef_construct)
+        if current_quantization != settings.qdrant_quantization:
+            drift['quantization'] = (current_quantization, settings.qdrant_quantization)
+        elif current_quantization == 'int8' and quantization.scalar.quantile != settings.qdrant_quantization_quantile:
+            drift['quantization_quantile'] = (quantization.scalar.quantile, settings.qdrant_quantization_quantile)
+
+        indexes = {}
+        for field, schema in payload_indexes().items():
+            existing = info.payload_schema.get(field)
+            current = existing.data_type.value if existing is not None else None
+            if current != schema.value:
+                indexes[field] = (current, schema.value)
+        if indexes:
+            drift['payload_indexes'] = indexes
+        return drift
+
+    async def migrate_collection(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Apply the tuning settings to an existing collection
+
+        Qdrant rebuilds the HNSW graph, quantized vectors or vector storage
+        in the background; the collection stays searchable meanwhile and
+        its status is 'yellow' until the optimizers finish.
+
+        Args:
+            dry_run: Only report what would change
+
+        Returns:
+            The differences found and whether they were applied
+        """
+        drift = await self.collection_drift()
+        if dry_run or not drift:
+            return {'changes': drift, 'applied': False}
+
+        config = self.collection_config()
+        update: Dict[str, Any] = {}
+        if 'on_disk_vectors' in drift:
+            update['vectors_config'] = {"": VectorParamsDiff(on_disk=settings.qdrant_on_disk_vectors)}
+        if 'hnsw_m' in drift or 'hnsw_ef_construct' in drift:
+            update['hnsw_config'] = config['hnsw_config']
+        if 'quantization' in drift or 'quantization_quantile' in drift:
+            update['quantization_config'] = config['quantization_config'] or Disabled.DISABLED
+
+        if update:
+            await self.client.update_collection(collection_name=settings.qdrant_collection_name, **update)
+            logger.info(f"✓ Updated collection {settings.qdrant_collection_name}: {', '.join(update)}")
+        await self.ensure_payload_indexes()
+        return {'changes': drift, 'applied': True}
+
+    async def ensure_payload_indexes(self) -> List[str]:
+        """
+        Create the configured payload indexes that are missing
+
+        An index of another type on the same field is replaced.
+
+        Returns:
+            Fields indexed
+        """
+        info = await self.client.get_collection(settings.qdrant_collection_name)
+        created = []
+        for field, schema in payload_indexes().items():
+            existing = info.payload_schema.get(field)
+            if existing is not None and existing.data_type == schema:
+                continue
+            if existing is not None:
+                await self.client.delete_payload_index(settings.qdrant_collection_name, field)
+            await self.client.create_payload_index(
+                collection_name=settings.qdrant_collection_name,
+                field_name=field,
+                field_schema=schema
+            )
+            created.append(field)
+
+        if created:
+            logger.info(f"✓ Created payload indexes: {', '.join(created)}")
+        return created
+
     async def add_documents(
         self,
         texts: List[str],
         metadatas: List[Dict[str, Any]],
-        document_id: int
+        document_id: int,
+        progress_callback: Optional[Callable[[int, int], Any]] = None,
+        point_ids: Optional[List[str]] = None,
+        embed_callback: Optional[Callable[[int, int], Any]] = None,
+        course_id: int = 0
     ) -> int:
         """
         Add documents to vector store
 
+        Chunks are embedded and upserted in batches through a pipeline: up to
+        INGEST_EMBED_CONCURRENCY batches are embedded at once while earlier
+        batches are upserted, and a bounded queue between the stages keeps
+        memory flat regardless of document size. Each batch is retried on
+        failure; if a batch still fails, the chunks already written are
+        removed again.
+
         Args:
             texts: List of text chunks
             metadatas: List of metadata dicts for each chunk
             document_id: Moodle document ID
+            progress_callback: Called with (chunks_done, total_chunks) after each batch
+            point_ids: Point IDs for the chunks, derived from their content if omitted
+            embed_callback: Called with (chunks_embedded, total_chunks) after each embedding request
+            course_id: Moodle course the document belongs to, 0 for site-wide
 
         Returns:
             Number of chunks added
@@ -101,56 +319,204 @@ class VectorStoreService:
         if not self.initialized:
             await self.initialize()
 
-        try:
-            # Add document_id to all metadatas
-            for meta in metadatas:
-                meta['document_id'] = document_id
-
-            # Generate embeddings and add to Qdrant
-            embeddings_list = await self.embeddings.aembed_documents(texts)
-
-            points = []
-            for i, (text, embedding, metadata) in enumerate(zip(texts, embeddings_list, metadatas)):
-                point_id = str(uuid.uuid4())
-                points.append(
-                    PointStruct(
-                        id=point_id,
-                        vector=embedding,
-                        payload={
-                            'text': text,
-                            'metadata': metadata,
-                            'document_id': document_id
-                        }
+        point_ids = point_ids or self.chunk_ids(document_id, texts)
+        total = len(texts)
+        batch_size = settings.ingest_batch_size
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.ingest_queue_size)
+        semaphore = asyncio.Semaphore(settings.ingest_embed_concurrency)
+        written: List[str] = []
+        embedded = 0
+
+        async def embed_batch(start: int):
+            nonlocal embedded
+            try:
+                batch_texts = texts[start:start + batch_size]
+                vectors = await self._with_retry(
+                    lambda: self.embeddings.aembed_documents(batch_texts),
+                    f"embed chunks {start}-{start + len(batch_texts)}"
+                )
+                embedded += len(vectors)
+                await self._notify(embed_callback, embedded, total)
+                points = []
+                batch = zip(
+                    point_ids[start:start + batch_size],
+                    batch_texts,
+                    vectors,
+                    metadatas[start:start + batch_size]
+                )
+                for point_id, text, embedding, metadata in batch:
+                    metadata['document_id'] = document_id
+                    metadata['course_id'] = course_id
+                    points.append(
+                        PointStruct(
+                            id=point_id,
+                            vector=embedding,
+                            payload={
+                                'text': text,
+                                'metadata': metadata,
+                                'document_id': document_id,
+                                'course_id': course_id
+                            }
+                        )
                     )
+                await queue.put(points)
+            finally:
+                semaphore.release()
+
+        async def produce():
+            tasks = []
+            for start in range(0, total, batch_size):
+                await semaphore.acquire()
+                tasks.append(asyncio.create_task(embed_batch(start)))
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+            await queue.put(None)
+
+        producer = asyncio.create_task(produce())
+
+        try:
+            while True:
+                getter = asyncio.create_task(queue.get())
+                await asyncio.wait({getter, producer}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    # The producer failed before queueing the end marker
+                    getter.cancel()
+                    producer.result()
+                points = getter.result()
+                if points is None:
+                    break
+
+                await self._with_retry(
+                    lambda: self.client.upsert(collection_name=settings.qdrant_collection_name, points=points),
+                    f"upsert {len(points)} chunks"
                 )
+                written.extend(point.id for point in points)
+                if settings.search_mode == "hybrid":
+                    for point in points:
+                        self.lexical_index.add(point.id, point.payload)
 
-            self.client.upsert(
-                collection_name=settings.qdrant_collection_name,
-                points=points
-            )
+                await self._notify(progress_callback, len(written), total)
 
-            logger.info(f"✓ Added {len(points)} chunks for document {document_id}")
-            return len(points)
+            await producer
+            logger.info(f"✓ Added {len(written)} chunks for document {document_id}")
+            return len(written)
 
         except Exception as e:
             logger.error(f"Failed to add documents: {e}")
+            producer.cancel()
+            await self._remove_points(written)
             raise
 
+        finally:
+            if written:
+                self.kb_version += 1
+
+    async def sync_documents(
+        self,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        document_id: int,
+        progress_callback: Optional[Callable[[int, int], Any]] = None,
+        course_id: int = 0
+    ) -> Dict[str, int]:
+        """
+        Re-ingest a document, touching only chunks that changed
+
+        The document's existing point IDs are compared with the IDs of the new
+        chunks. Only new chunks are embedded and upserted, only vanished ones
+        are deleted, and kept chunks just get their metadata refreshed (e.g.
+        a page number that moved).
+
+        Args:
+            texts: List of text chunks
+            metadatas: List of metadata dicts for each chunk
+            document_id: Moodle document ID
+            progress_callback: Called with (chunks_done, total_chunks) while adding
+            course_id: Moodle course the document belongs to, 0 for site-wide
+
+        Returns:
+            Counts of 'added', 'kept' and 'removed' chunks
+        """
+        sync = await self.start_sync(document_id, course_id=course_id)
+        await sync.add(texts, metadatas, progress_callback)
+        return await sync.finish()
+
+    async def start_sync(
+        self,
+        document_id: int,
+        incremental: bool = True,
+        writer: Optional["SharedBatchWriter"] = None,
+        course_id: int = 0
+    ) -> "DocumentSync":
+        """
+        Start writing a document whose chunks arrive in parts
+
+        Args:
+            document_id: Moodle document ID
+            incremental: Diff against stored chunks; otherwise delete them first
+            writer: Shared batch writer for new chunks, when ingesting several documents
+            course_id: Moodle course the document belongs to, 0 for site-wide
+
+        Returns:
+            DocumentSync to add chunk windows to and finish
+        """
+        if not self.initialized:
+            await self.initialize()
+
+        if incremental:
+            existing = await self._scroll_document(document_id)
+        else:
+            await self.delete_document(document_id)
+            existing = {}
+
+        return DocumentSync(self, document_id, existing, writer, course_id)
+
+    @staticmethod
+    def chunk_ids(document_id: int, texts: List[str], seen: Optional[Counter] = None) -> List[str]:
+        """
+        Derive stable point IDs for a document's chunks
+
+        IDs depend on the document, the chunk text and how many identical
+        chunks came before it, so unchanged chunks keep their ID when text
+        elsewhere in the document is added or removed.
+
+        Args:
+            document_id: Moodle document ID
+            texts: Chunk texts, in document order
+            seen: Running counts of chunk hashes when a document arrives in parts
+        """
+        seen = Counter() if seen is None else seen
+        point_ids = []
+        for text in texts:
+            digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            point_ids.append(str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{document_id}:{digest}:{seen[digest]}")))
+            seen[digest] += 1
+        return point_ids
+
     async def search(
         self,
         query: str,
         top_k: int = None,
         score_threshold: float = None,
-        filter_dict: Optional[Dict] = None
+        filter_dict: Optional[Dict] = None,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict[str, Any]]:
         """
         Search for similar documents
 
+        In hybrid mode dense and BM25 candidates are fused by reciprocal rank,
+        so exact terms such as course codes are found even when their
+        embedding similarity is low.
+
         Args:
             query: Search query
             top_k: Number of results to return
             score_threshold: Minimum similarity score
             filter_dict: Optional filters
+            query_embedding: Precomputed query embedding, if available
 
         Returns:
             List of search results with text and metadata
@@ -163,24 +529,19 @@ class VectorStoreService:
 
         try:
             # Generate query embedding
-            query_embedding = await self.embeddings.aembed_query(query)
-
-            # Search in Qdrant
-            search_results = self.client.search(
-                collection_name=settings.qdrant_collection_name,
-                query_vector=query_embedding,
-                limit=top_k,
-                score_threshold=score_threshold,
-                query_filter=self._build_filter(filter_dict) if filter_dict else None
-            )
+            if query_embedding is None:
+                query_embedding = await self.embed_query(query)
 
-            results = []
-            for result in search_results:
-                results.append({
-                    'text': result.payload.get('text', ''),
-                    'metadata': result.payload.get('metadata', {}),
-                    'score': result.score
-                })
+            if settings.search_mode == "hybrid":
+                candidates = top_k * settings.hybrid_candidate_multiplier
+                dense = await self._dense_search(query_embedding, candidates, score_threshold, filter_dict)
+                lexical = [
+                    self._to_result(point_id, payload, score)
+                    for point_id, score, payload in self.lexical_index.search(query, candidates, filter_dict)
+                ]
+                results = reciprocal_rank_fusion([dense, lexical], settings.hybrid_rrf_k)[:top_k]
+            else:
+                results = await self._dense_search(query_embedding, top_k, score_threshold, filter_dict)
 
             logger.info(f"✓ Found {len(results)} results for query: {query[:50]}...")
             return results
@@ -203,7 +564,7 @@ class VectorStoreService:
             await self.initialize()
 
         try:
-            self.client.delete(
+            await self.client.delete(
                 collection_name=settings.qdrant_collection_name,
                 points_selector=Filter(
                     must=[
@@ -214,6 +575,8 @@ class VectorStoreService:
                     ]
                 )
             )
+            self.lexical_index.remove_document(document_id)
+            self.kb_version += 1
 
             logger.info(f"✓ Deleted all chunks for document {document_id}")
             return True
@@ -222,30 +585,463 @@ class VectorStoreService:
             logger.error(f"Failed to delete document: {e}")
             return False
 
+    async def embed_query(self, query: str) -> List[float]:
+        """
+        Embed a search query
+
+        Args:
+            query: Search query
+
+        Returns:
+            Query embedding
+        """
+        if not self.initialized:
+            await self.initialize()
+
+        return await self.embeddings.aembed_query(query)
+
+    async def _dense_search(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        score_threshold: float,
+        filter_dict: Optional[Dict]
+    ) -> List[Dict[str, Any]]:
+        """Run a vector similarity search in Qdrant"""
+        search_results = await self.client.search(
+            collection_name=settings.qdrant_collection_name,
+            query_vector=query_embedding,
+            limit=limit,
+            score_threshold=score_threshold,
+            query_filter=self._build_filter(filter_dict) if filter_dict else None,
+            search_params=self.search_params
+        )
+        return [self._to_result(str(result.id), result.payload, result.score) for result in search_results]
+
+    @staticmethod
+    def _search_params() -> Optional[SearchParams]:
+        """HNSW ef and quantization rescoring for searches, from settings"""
+        params: Dict[str, Any] = {}
+        if settings.qdrant_search_ef:
+            params['hnsw_ef'] = settings.qdrant_search_ef
+        if settings.qdrant_quantization != 'none':
+            params['quantization'] = QuantizationSearchParams(
+                rescore=settings.qdrant_quantization_rescore,
+                oversampling=settings.qdrant_quantization_oversampling
+            )
+        return SearchParams(**params) if params else None
+
+    def _to_result(self, point_id: str, payload: Dict[str, Any], score: float) -> Dict[str, Any]:
+        """Convert a point payload to a search result"""
+        return {
+            'id': point_id,
+            'text': payload.get('text', ''),
+            'metadata': payload.get('metadata', {}),
+            'score': score
+        }
+
+    async def _scroll_document(self, document_id: int) -> Dict[str, Dict[str, Any]]:
+        """Get the point IDs and metadata of every chunk of a document"""
+        points_filter = self._build_filter({'document_id': document_id})
+        existing = {}
+        offset = None
+        while True:
+            points, offset = await self.client.scroll(
+                collection_name=settings.qdrant_collection_name,
+                scroll_filter=points_filter,
+                limit=LEXICAL_SCROLL_BATCH,
+                offset=offset,
+                with_payload=['metadata'],
+                with_vectors=False
+            )
+            for point in points:
+                existing[str(point.id)] = (point.payload or {}).get('metadata', {})
+            if offset is None:
+                break
+        return existing
+
+    async def _rebuild_lexical_index(self):
+        """Load every chunk in the collection into the lexical index"""
+        self.lexical_index.clear()
+        offset = None
+        while True:
+            points, offset = await self.client.scroll(
+                collection_name=settings.qdrant_collection_name,
+                limit=LEXICAL_SCROLL_BATCH,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
+            )
+            for point in points:
+                self.lexical_index.add(str(point.id), point.payload or {})
+            if offset is None:
+                break
+
+        logger.info(f"✓ Lexical index built with {len(self.lexical_index)} chunks")
+
+    async def _with_retry(self, operation: Callable[[], Awaitable[Any]], description: str) -> Any:
+        """Run an ingestion step, retrying with exponential backoff"""
+        for attempt in range(settings.ingest_max_retries + 1):
+            try:
+                return await operation()
+            except Exception as e:
+                if attempt == settings.ingest_max_retries:
+                    raise
+                delay = settings.ingest_retry_backoff_seconds * 2 ** attempt
+                logger.warning(f"Failed to {description} ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    async def _notify(callback: Optional[Callable[..., Any]], *args):
+        """Call a progress callback, which may be sync or async"""
+        if callback:
+            result = callback(*args)
+            if inspect.isawaitable(result):
+                await result
+
+    async def _remove_points(self, point_ids: List[str]):
+        """Remove points written by a failed ingestion"""
+        if not point_ids:
+            return
+
+        try:
+            await self.client.delete(
+                collection_name=settings.qdrant_collection_name,
+                points_selector=PointIdsList(points=point_ids)
+            )
+            for point_id in point_ids:
+                self.lexical_index.remove(point_id)
+            logger.info(f"Rolled back {len(point_ids)} chunks")
+
+        except Exception as e:
+            logger.error(f"Failed to roll back {len(point_ids)} chunks: {e}")
+
     def _build_filter(self, filter_dict: Dict) -> Filter:
-        """Build Qdrant filter from dict"""
+        """Build Qdrant filter from dict, matching any of the values given as a list"""
         conditions = []
         for key, value in filter_dict.items():
             conditions.append(
                 FieldCondition(
                     key=key,
-                    match=MatchValue(value=value)
+                    match=MatchAny(any=list(value)) if isinstance(value, (list, tuple)) else MatchValue(value=value)
                 )
             )
         return Filter(must=conditions)
 
+    async def _backfill_course_ids(self):
+        """Mark chunks stored before course scoping as site-wide, so course filters still find them"""
+        legacy = Filter(must=[IsEmptyCondition(is_empty=PayloadField(key='course_id'))])
+        count = await self.client.count(settings.qdrant_collection_name, count_filter=legacy, exact=True)
+        if count.count:
+            await self.client.set_payload(settings.qdrant_collection_name, payload={'course_id': 0}, points=legacy)
+            logger.info(f"✓ Marked {count.count} chunks without a course as site-wide")
+
     async def get_collection_stats(self) -> Dict[str, Any]:
         """Get collection statistics"""
         if not self.initialized:
             await self.initialize()
 
         try:
-            info = self.client.get_collection(settings.qdrant_collection_name)
-            return {
+            info = await self.client.get_collection(settings.qdrant_collection_name)
+            stats = {
                 'vectors_count': info.vectors_count,
                 'points_count': info.points_count,
-                'status': info.status
+                'status': info.status,
+                'search_mode': settings.search_mode
             }
+            if settings.search_mode == "hybrid":
+                stats['lexical_index'] = self.lexical_index.get_stats()
+            return stats
         except Exception as e:
             logger.error(f"Failed to get stats: {e}")
             return {}
+
+
+class DocumentSync:
+    """
+    Incremental write of one document whose chunks arrive in windows
+
+    Each window's new chunks are embedded and upserted straight away, so
+    they are searchable before the rest of the document is processed.
+    Chunks that were stored before but never seen again are deleted by
+    finish().
+    """
+
+    def __init__(
+        self,
+        store: VectorStoreService,
+        document_id: int,
+        existing: Dict[str, Dict[str, Any]],
+        writer: Optional["SharedBatchWriter"] = None,
+        course_id: int = 0
+    ):
+        self.store = store
+        self.document_id = document_id
+        self.existing = existing
+        self.writer = writer
+        self.course_id = course_id
+        self.seen_hashes: Counter = Counter()
+        self.seen_ids = set()
+        self.added = 0
+        self.kept = 0
+        self.updated = 0
+
+    async def add(
+        self,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        progress_callback: Optional[Callable[[int, int], Any]] = None,
+        embed_callback: Optional[Callable[[int, int], Any]] = None
+    ):
+        """
+        Write the next window of chunks
+
+        Args:
+            texts: Chunk texts, continuing in document order
+            metadatas: Metadata for each chunk
+            progress_callback: Called with (chunks_done, total_chunks) while adding
+            embed_callback: Called with (chunks_embedded, total_chunks) while adding
+        """
+        store = self.store
+        point_ids = store.chunk_ids(self.document_id, texts, self.seen_hashes)
+        self.seen_ids.update(point_ids)
+
+        new = [i for i, point_id in enumerate(point_ids) if point_id not in self.existing]
+        kept = [i for i, point_id in enumerate(point_ids) if point_id in self.existing]
+
+        # Refresh metadata of unchanged chunks where it differs, e.g. after a course change
+        updates = []
+        for i in kept:
+            metadata = {**metadatas[i], 'document_id': self.document_id, 'course_id': self.course_id}
+            if self.existing[point_ids[i]] != metadata:
+                updates.append(SetPayloadOperation(
+                    set_payload=SetPayload(
+                        payload={'metadata': metadata, 'course_id': self.course_id},
+                        points=[point_ids[i]]
+                    )
+                ))
+                if settings.search_mode == "hybrid":
+                    store.lexical_index.add(point_ids[i], {
+                        'text': texts[i], 'metadata': metadata, 'document_id': self.document_id,
+                        'course_id': self.course_id
+                    })
+        if updates:
+            await store.client.batch_update_points(
+                collection_name=settings.qdrant_collection_name,
+                update_operations=updates
+            )
+            store.kb_version += 1
+
+        if new and self.writer is not None:
+            await self.writer.write(
+                texts=[texts[i] for i in new],
+                metadatas=[metadatas[i] for i in new],
+                document_id=self.document_id,
+                point_ids=[point_ids[i] for i in new],
+                progress_callback=progress_callback,
+                embed_callback=embed_callback,
+                course_id=self.course_id
+            )
+        elif new:
+            await store.add_documents(
+                texts=[texts[i] for i in new],
+                metadatas=[metadatas[i] for i in new],
+                document_id=self.document_id,
+                progress_callback=progress_callback,
+                point_ids=[point_ids[i] for i in new],
+                embed_callback=embed_callback,
+                course_id=self.course_id
+            )
+
+        self.added += len(new)
+        self.kept += len(kept)
+        self.updated += len(updates)
+
+    async def finish(self) -> Dict[str, int]:
+        """
+        Delete stored chunks that were not seen again
+
+        Returns:
+            Counts of 'added', 'kept' and 'removed' chunks
+        """
+        store = self.store
+        removed = [point_id for point_id in self.existing if point_id not in self.seen_ids]
+        if removed:
+            await store.client.delete(
+                collection_name=settings.qdrant_collection_name,
+                points_selector=PointIdsList(points=removed)
+            )
+            for point_id in removed:
+                store.lexical_index.remove(point_id)
+            store.kb_version += 1
+
+        logger.info(
+            f"✓ Synced document {self.document_id}: {self.added} added, {self.kept} kept "
+            f"({self.updated} with new metadata), {len(removed)} removed"
+        )
+        return {'added': self.added, 'kept': self.kept, 'removed': len(removed)}
+
+
+class SharedBatchWriter:
+    """
+    Embeds and upserts the new chunks of several documents in shared batches
+
+    Used by bulk ingestion: documents ingested at the same time hand their
+    new chunks to one writer, which fills INGEST_BATCH_SIZE embedding
+    requests and upserts across document boundaries instead of sending a
+    short last batch for every document. A partial batch is sent once it
+    has waited BULK_INGEST_LINGER_MS, and up to INGEST_EMBED_CONCURRENCY
+    batches are in flight. If a batch fails, every document with chunks in
+    it fails and its chunks already written are removed.
+    """
+
+    def __init__(self, store: VectorStoreService):
+        self.store = store
+        self.batches = 0
+        self.chunks = 0
+        self._pending: List[Tuple[Dict[str, Any], int]] = []
+        self._semaphore = asyncio.Semaphore(settings.ingest_embed_concurrency)
+        self._flusher: Optional[asyncio.Task] = None
+        self._tasks = set()
+
+    async def write(
+        self,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        document_id: int,
+        point_ids: List[str],
+        progress_callback: Optional[Callable[[int, int], Any]] = None,
+        embed_callback: Optional[Callable[[int, int], Any]] = None,
+        course_id: int = 0
+    ) -> int:
+        """
+        Write chunks of one document, batched with other documents' chunks
+
+        Args:
+            texts: List of text chunks
+            metadatas: List of metadata dicts for each chunk
+            document_id: Moodle document ID
+            point_ids: Point IDs for the chunks
+            progress_callback: Called with (chunks_done, total_chunks) after each batch
+            embed_callback: Called with (chunks_embedded, total_chunks) after each embedding request
+            course_id: Moodle course the document belongs to, 0 for site-wide
+
+        Returns:
+            Number of chunks added
+        """
+        if not texts:
+            return 0
+        if not self.store.initialized:
+            await self.store.initialize()
+
+        write = {
+            'texts': texts,
+            'metadatas': metadatas,
+            'document_id': document_id,
+            'course_id': course_id,
+            'point_ids': point_ids,
+            'progress_callback': progress_callback,
+            'embed_callback': embed_callback,
+            'embedded': 0,
+            'written': [],
+            'future': asyncio.get_running_loop().create_future()
+        }
+        self._pending.extend((write, i) for i in range(len(texts)))
+
+        batch_size = settings.ingest_batch_size
+        while len(self._pending) >= batch_size:
+            self._send(self._pending[:batch_size])
+            del self._pending[:batch_size]
+        if self._pending and (self._flusher is None or self._flusher.done()):
+            self._flusher = asyncio.create_task(self._flush_later())
+
+        try:
+            await write['future']
+        except BaseException:
+            if not write['future'].done():
+                write['future'].cancel()
+            await self.store._remove_points(write['written'])
+            raise
+
+        logger.info(f"✓ Added {len(write['written'])} chunks for document {document_id}")
+        return len(write['written'])
+
+    async def _flush_later(self):
+        """Send the partial batch once it has waited for more chunks"""
+        await asyncio.sleep(settings.bulk_ingest_linger_ms / 1000)
+        if self._pending:
+            self._send(self._pending)
+            self._pending = []
+
+    def _send(self, items: List[Tuple[Dict[str, Any], int]]):
+        """Start writing one batch"""
+        task = asyncio.create_task(self._write_batch(items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write_batch(self, items: List[Tuple[Dict[str, Any], int]]):
+        """Embed and upsert one batch, then settle the writes it completes"""
+        store = self.store
+        async with self._semaphore:
+            # Skip chunks of documents that failed while the batch waited
+            items = [(write, i) for write, i in items if not write['future'].done()]
+            writes = list({id(write): write for write, _ in items}.values())
+            if not items:
+                return
+
+            try:
+                texts = [write['texts'][i] for write, i in items]
+                vectors = await store._with_retry(
+                    lambda: store.embeddings.aembed_documents(texts),
+                    f"embed a shared batch of {len(texts)} chunks"
+                )
+
+                points = []
+                for (write, i), embedding in zip(items, vectors):
+                    metadata = write['metadatas'][i]
+                    metadata['document_id'] = write['document_id']
+                    metadata['course_id'] = write['course_id']
+                    points.append(
+                        PointStruct(
+                            id=write['point_ids'][i],
+                            vector=embedding,
+                            payload={
+                                'text': write['texts'][i],
+                                'metadata': metadata,
+                                'document_id': write['document_id'],
+                                'course_id': write['course_id']
+                            }
+                        )
+                    )
+                    write['embedded'] += 1
+                for write in writes:
+                    await store._notify(write['embed_callback'], write['embedded'], len(write['texts']))
+
+                await store._with_retry(
+                    lambda: store.client.upsert(collection_name=settings.qdrant_collection_name, points=points),
+                    f"upsert a shared batch of {len(points)} chunks"
+                )
+                if settings.search_mode == "hybrid":
+                    for point in points:
+                        store.lexical_index.add(point.id, point.payload)
+                store.kb_version += 1
+                self.batches += 1
+                self.chunks += len(points)
+
+            except Exception as e:
+                logger.error(f"Failed to write a shared batch for {len(writes)} documents: {e}")
+                for write in writes:
+                    if not write['future'].done():
+                        write['future'].set_exception(e)
+                return
+
+            for write in writes:
+                ids = [point.id for (owner, _), point in zip(items, points) if owner is write]
+                if write['future'].done():
+                    # The document failed in another batch meanwhile
+                    await store._remove_points(ids)
+                    continue
+                write['written'].extend(ids)
+                await store._notify(write['progress_callback'], len(write['written']), len(write['texts']))
+                if len(write['written']) == len(write['texts']):
+                    write['future'].set_result(len(write['written']))
@@ -0,0 +1,184 @@
+"""
+Benchmark bulk ingestion against one ingestion job per document
+
+Usage (from backend/):
+    python -m benchmarks.bench_bulk [--documents 300] [--concurrency 4] [--embed-ms 150] [--server]
+
+A static site of --documents small pages (as in bench_crawl) is served on
+localhost, and every page is ingested as its own URL document twice: once
+submitted as separate jobs run by --concurrency workers, the way
+api_client::ingest_document is called per document, and once as a single
+/api/ingest/bulk request with BULK_INGEST_CONCURRENCY=--concurrency,
+driven over ASGI. Embeddings come from a stand-in model that answers
+each request after --embed-ms plus --embed-ms-per-chunk per chunk, like a
+remote embedding API, so the numbers do not depend on an API key. Points
+are written to an in-memory Qdrant, or with --server to a scratch
+collection on the configured server, which is deleted afterwards.
+
+For each mode the documents/s, embedding requests, upserts and mean
+chunks per request are reported.
+"""
+from typing import List
+import argparse
+import asyncio
+import functools
+import json
+import tempfile
+import threading
+import time
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+from http.server import ThreadingHTTPServer
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import Distance, VectorParams
+
+from app.config import settings
+
+settings.url_state_path = None
+settings.job_journal_path = None
+settings.url_refresh_interval_minutes = 0
+
+from app.api import ingest  # noqa: E402
+from app.services.job_queue import IngestionJobQueue  # noqa: E402
+from app.services.vector_store import VectorStoreService  # noqa: E402
+from benchmarks.bench_crawl import SlowHandler, build_site, page_path  # noqa: E402
+
+
+class StandInEmbeddings:
+    """Embedding model with the latency of a remote API and random vectors"""
+
+    def __init__(self, latency: float, per_chunk: float, size: int, concurrency: int):
+        self.latency = latency
+        self.per_chunk = per_chunk
+        self.size = size
+        self.limit = asyncio.Semaphore(concurrency) if concurrency else None
+        self.requests = 0
+        self.chunks = 0
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.requests += 1
+        self.chunks += len(texts)
+        if self.limit is None:
+            await asyncio.sleep(self.latency + self.per_chunk * len(texts))
+        else:
+            async with self.limit:
+                await asyncio.sleep(self.latency + self.per_chunk * len(texts))
+        return np.random.rand(len(texts), self.size).astype(np.float32).tolist()
+
+
+async def per_document(queue: IngestionJobQueue, urls: List[str], first_id: int):
+    """Submit one job per document and wait for all of them"""
+    jobs = [
+        await queue.submit(first_id + i, 'url', {'url': url, 'incremental': True})
+        for i, url in enumerate(urls)
+    ]
+    while True:
+        statuses = [(await queue.get(job['job_id']))['status'] for job in jobs]
+        if all(status in ('done', 'failed') for status in statuses):
+            return statuses.count('failed')
+        await asyncio.sleep(0.02)
+
+
+async def bulk(client: httpx.AsyncClient, urls: List[str], first_id: int):
+    """Send every document in one bulk request and read the results"""
+    items = [{'document_id': first_id + i, 'type': 'url', 'source': url} for i, url in enumerate(urls)]
+    failed = 0
+    async with client.stream('POST', '/api/ingest/bulk', json={'items': items}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            failed += json.loads(line)['status'] == 'failed'
+    return failed
+
+
+async def run(args, urls: List[str]):
+    store = VectorStoreService.get_instance()
+    collection = settings.qdrant_collection_name
+    if args.server:
+        store.client = AsyncQdrantClient(host=settings.qdrant_host, port=settings.qdrant_port,
+                                         api_key=settings.qdrant_api_key)
+        collection = settings.qdrant_collection_name = f"bench_bulk_{int(time.time())}"
+    else:
+        store.client = AsyncQdrantClient(location=":memory:")
+    await store.client.create_collection(
+        collection, vectors_config=VectorParams(size=settings.qdrant_vector_size, distance=Distance.COSINE)
+    )
+    embeddings = StandInEmbeddings(
+        args.embed_ms / 1000, args.embed_ms_per_chunk / 1000, settings.qdrant_vector_size, args.api_concurrency
+    )
+    store.embeddings = embeddings
+    store.initialized = True
+
+    upserts = 0
+    upsert = store.client.upsert
+
+    async def counted_upsert(*a, **kw):
+        nonlocal upserts
+        upserts += 1
+        return await upsert(*a, **kw)
+
+    store.client.upsert = counted_upsert
+
+    queue = IngestionJobQueue.get_instance()
+    app = FastAPI()
+    app.include_router(ingest.router, prefix="/api")
+
+    print(f"{len(urls)} documents, concurrency {args.concurrency}, batch {settings.ingest_batch_size}, "
+          f"embedding {args.embed_ms} ms + {args.embed_ms_per_chunk} ms/chunk\n")
+    print(f"{'mode':<13} {'seconds':>8} {'docs/s':>7} {'failed':>6} {'embed reqs':>10} {'upserts':>8} "
+          f"{'chunks/req':>10}")
+
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                     timeout=None) as client:
+            for mode, first_id in (("per-document", 1_000_000), ("bulk", 2_000_000)):
+                embeddings.requests = embeddings.chunks = upserts = 0
+                start = time.perf_counter()
+                if mode == "bulk":
+                    failed = await bulk(client, urls, first_id)
+                else:
+                    failed = await per_document(queue, urls, first_id)
+                seconds = time.perf_counter() - start
+                print(
+                    f"{mode:<13} {seconds:>8.2f} {len(urls) / seconds:>7.1f} {failed:>6} {embeddings.requests:>10} "
+                    f"{upserts:>8} {embeddings.chunks / max(1, embeddings.requests):>10.1f}"
+                )
+    finally:
+        await queue.stop()
+        await queue.documents.fetcher.close()
+        if args.server:
+            await store.client.delete_collection(collection)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=300, help="Pages, each ingested as a document")
+    parser.add_argument("--workers", type=int, default=settings.job_workers, help="JOB_WORKERS")
+    parser.add_argument("--concurrency", type=int, default=settings.bulk_ingest_concurrency,
+                        help="BULK_INGEST_CONCURRENCY")
+    parser.add_argument("--api-concurrency", type=int, default=0,
+                        help="Embedding requests the stand-in model serves at once (0 for no limit)")
+    parser.add_argument("--embed-ms", type=float, default=150, help="Latency of each embedding request")
+    parser.add_argument("--embed-ms-per-chunk", type=float, default=2, help="Added latency per chunk embedded")
+    parser.add_argument("--server", action="store_true", help="Use the configured Qdrant server")
+    args = parser.parse_args()
+
+    settings.job_workers = args.workers
+    settings.bulk_ingest_concurrency = args.concurrency
+
+    with tempfile.TemporaryDirectory() as root:
+        build_site(root, args.documents)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(SlowHandler, directory=root))
+        server.daemon_threads = True
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            asyncio.run(run(args, [f"{base}{page_path(index)}" for index in range(args.documents)]))
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
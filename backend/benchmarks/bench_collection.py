@@ -0,0 +1,221 @@
+"""
+Benchmark Qdrant collection tuning: payload indexes, on-disk vectors and quantization
+
+Usage (from backend/):
+    python -m benchmarks.bench_collection [--points 100000] [--documents 2000] [--queries 200]
+        [--quantization int8] [--on-disk] [--hnsw-m 16] [--ef 0]
+
+Needs the configured Qdrant server (QDRANT_HOST/QDRANT_PORT); the local
+in-memory mode ignores payload indexes, HNSW settings and quantization.
+Two scratch collections are filled with the same --points random vectors
+of QDRANT_VECTOR_SIZE, spread over --documents documents with a
+metadata.type payload: a baseline one as the collection used to be
+created (no payload indexes, vectors in RAM, no quantization) and a tuned
+one from the QDRANT_* tuning settings or the flags. Both are deleted
+afterwards.
+
+Once indexing finished, each collection reports:
+- search latency p50/p95 for --queries queries, unfiltered and filtered
+  on metadata.type, with the configured search parameters
+- recall@10 against exact (brute force) search
+- latency of deleting a document by document_id, as on re-ingestion
+- estimated vector RAM, and the server's resident memory from /metrics
+  when telemetry is enabled
+"""
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue, FilterSelector, SearchParams
+)
+
+from app.config import settings
+from app.services.vector_store import VectorStoreService, payload_indexes
+
+TYPES = ["pdf", "url", "site"]
+
+
+async def fill(client: AsyncQdrantClient, collection: str, vectors: np.ndarray, documents: int, batch: int):
+    """Upsert the vectors with document_id and metadata.type payloads"""
+    for start in range(0, len(vectors), batch):
+        points = [
+            PointStruct(
+                id=index,
+                vector=vectors[index].tolist(),
+                payload={
+                    'document_id': index % documents,
+                    'metadata': {'document_id': index % documents, 'type': TYPES[index % documents % len(TYPES)]}
+                }
+            )
+            for index in range(start, min(start + batch, len(vectors)))
+        ]
+        await client.upsert(collection, points=points, wait=False)
+
+
+async def wait_indexed(client: AsyncQdrantClient, collection: str):
+    """Wait until the optimizers built the HNSW graph and quantized vectors"""
+    while True:
+        info = await client.get_collection(collection)
+        if info.status.value == 'green' and (info.indexed_vectors_count or 0) >= (info.points_count or 0) * 0.95:
+            return
+        await asyncio.sleep(1)
+
+
+async def searches(client: AsyncQdrantClient, collection: str, queries: np.ndarray,
+                   query_filter: Optional[Filter], params: Optional[SearchParams]):
+    """Run the queries one at a time, returning latencies (ms) and result ids"""
+    latencies = []
+    ids = []
+    for query in queries:
+        start = time.perf_counter()
+        hits = await client.search(collection, query_vector=query.tolist(), limit=10,
+                                   query_filter=query_filter, search_params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append([hit.id for hit in hits])
+    return latencies, ids
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q))
+
+
+def recall(found: List[List], exact: List[List]) -> float:
+    hits = sum(len(set(a) & set(b)) for a, b in zip(found, exact))
+    return hits / max(1, sum(len(b) for b in exact))
+
+
+async def resident_memory(url: str) -> Optional[int]:
+    """Qdrant process resident memory from its Prometheus metrics, if exposed"""
+    try:
+        async with httpx.AsyncClient(timeout=5) as client:
+            response = await client.get(f"{url}/metrics",
+                                        headers={'api-key': settings.qdrant_api_key or ''})
+        for line in response.text.splitlines():
+            if line.startswith('memory_resident_bytes'):
+                return int(float(line.split()[-1]))
+    except (httpx.HTTPError, ValueError):
+        pass
+    return None
+
+
+def vector_ram(points: int, size: int, on_disk: bool, quantization: str) -> int:
+    """Bytes of vector data Qdrant keeps in RAM"""
+    ram = 0 if on_disk else points * size * 4
+    if quantization == 'int8':
+        ram += points * size
+    return ram
+
+
+async def measure(client: AsyncQdrantClient, collection: str, queries: np.ndarray,
+                  params: Optional[SearchParams], deletes: int) -> Dict[str, float]:
+    exact_params = SearchParams(exact=True)
+    type_filter = Filter(must=[FieldCondition(key='metadata.type', match=MatchValue(value='pdf'))])
+
+    latencies, found = await searches(client, collection, queries, None, params)
+    _, exact = await searches(client, collection, queries, None, exact_params)
+    filtered, found_filtered = await searches(client, collection, queries, type_filter, params)
+    _, exact_filtered = await searches(client, collection, queries, type_filter, exact_params)
+
+    delete_latencies = []
+    for document_id in range(deletes):
+        start = time.perf_counter()
+        await client.delete(collection, points_selector=FilterSelector(filter=Filter(
+            must=[FieldCondition(key='document_id', match=MatchValue(value=document_id))]
+        )))
+        delete_latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'recall': recall(found, exact),
+        'filtered p50': percentile(filtered, 50),
+        'filtered p95': percentile(filtered, 95),
+        'filtered recall': recall(found_filtered, exact_filtered),
+        'delete': statistics.mean(delete_latencies),
+    }
+
+
+async def run(args):
+    client = AsyncQdrantClient(host=settings.qdrant_host, port=settings.qdrant_port,
+                               api_key=settings.qdrant_api_key, timeout=300)
+    url = f"http://{settings.qdrant_host}:{settings.qdrant_port}"
+    size = settings.qdrant_vector_size
+    rng = np.random.default_rng(7)
+    vectors = rng.standard_normal((args.points, size), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, size), dtype=np.float32)
+    stamp = int(time.time())
+
+    settings.qdrant_quantization = args.quantization
+    settings.qdrant_on_disk_vectors = args.on_disk
+    settings.qdrant_hnsw_m = args.hnsw_m
+    settings.qdrant_search_ef = args.ef
+
+    variants = {
+        'baseline': ({'vectors_config': VectorParams(size=size, distance=Distance.COSINE)}, {}, None),
+        'tuned': (VectorStoreService.collection_config(), payload_indexes(), VectorStoreService._search_params()),
+    }
+
+    print(f"{args.points} points of {size} dims, {args.documents} documents, {args.queries} queries")
+    print(f"tuned: quantization {args.quantization}, on_disk {args.on_disk}, m {args.hnsw_m}, "
+          f"ef {args.ef or 'default'}, indexes {', '.join(payload_indexes()) or 'none'}\n")
+
+    results = {}
+    created = []
+    try:
+        for name, (config, indexes, params) in variants.items():
+            collection = f"bench_collection_{name}_{stamp}"
+            await client.create_collection(collection, **config)
+            created.append(collection)
+            for field, schema in indexes.items():
+                await client.create_payload_index(collection, field, field_schema=schema)
+
+            start = time.perf_counter()
+            await fill(client, collection, vectors, args.documents, args.batch)
+            await wait_indexed(client, collection)
+            indexed = time.perf_counter() - start
+
+            results[name] = await measure(client, collection, queries, params, args.deletes)
+            results[name]['index s'] = indexed
+            on_disk = bool(config['vectors_config'].on_disk)
+            quantization = args.quantization if name == 'tuned' else 'none'
+            results[name]['vector MB'] = vector_ram(args.points, size, on_disk, quantization) / 2**20
+            rss = await resident_memory(url)
+            results[name]['server RSS MB'] = rss / 2**20 if rss else float('nan')
+            # Dropped before the next variant so the server RSS only counts one collection
+            await client.delete_collection(collection)
+            created.remove(collection)
+    finally:
+        for collection in created:
+            await client.delete_collection(collection)
+        await client.close()
+
+    print(f"{'':<18}" + "".join(f"{name:>12}" for name in results))
+    for metric in results['baseline']:
+        unit = '' if 'recall' in metric or metric.endswith(('MB', ' s')) else ' ms'
+        print(f"{metric + unit:<18}" + "".join(f"{values[metric]:>12.3f}" for values in results.values()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=100_000, help="Vectors in each collection")
+    parser.add_argument("--documents", type=int, default=2000, help="Documents the points belong to")
+    parser.add_argument("--queries", type=int, default=200, help="Search queries per measurement")
+    parser.add_argument("--deletes", type=int, default=20, help="Documents deleted by filter")
+    parser.add_argument("--batch", type=int, default=500, help="Points per upsert")
+    parser.add_argument("--quantization", default=settings.qdrant_quantization, choices=["none", "int8"],
+                        help="QDRANT_QUANTIZATION of the tuned collection")
+    parser.add_argument("--on-disk", action="store_true", default=settings.qdrant_on_disk_vectors,
+                        help="QDRANT_ON_DISK_VECTORS of the tuned collection")
+    parser.add_argument("--hnsw-m", type=int, default=settings.qdrant_hnsw_m, help="QDRANT_HNSW_M")
+    parser.add_argument("--ef", type=int, default=settings.qdrant_search_ef, help="QDRANT_SEARCH_EF")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
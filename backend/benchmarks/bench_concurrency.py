@@ -0,0 +1,186 @@
+"""
+Benchmark chat search latency while a large ingestion runs
+
+Usage (from backend/):
+    python -m benchmarks.bench_concurrency [--client async|sync] [--grpc]
+        [--ingest-points 50000] [--ingest-batch 0] [--chats 20]
+
+Simulated chats search a scratch collection on the configured Qdrant server
+in a loop, first on their own and then while one large upsert runs on the
+same event loop. With --client sync every call goes through the blocking
+QdrantClient as the backend used to, so the event loop stalls for the whole
+upsert; with --client async (the default) the AsyncQdrantClient used by
+VectorStoreService lets searches proceed. Random vectors are used, so no
+embedding API is needed. The scratch collection is deleted afterwards.
+"""
+from typing import List
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+import numpy as np
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import Distance, VectorParams, PointStruct
+
+from app.config import settings
+
+CHUNK_TEXT = "x" * 1000
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def random_points(count: int, rng: np.random.Generator) -> List[PointStruct]:
+    """Build points with random unit vectors and chunk-sized payloads"""
+    vectors = rng.standard_normal((count, settings.qdrant_vector_size)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return [
+        PointStruct(id=str(uuid.uuid4()), vector=vector.tolist(), payload={"text": CHUNK_TEXT, "document_id": 0})
+        for vector in vectors
+    ]
+
+
+class BenchClient:
+    """Runs Qdrant calls through either the async or the blocking client"""
+
+    def __init__(self, kind: str, grpc: bool, location: str = None):
+        self.kind = kind
+        options = dict(
+            host=settings.qdrant_host,
+            port=settings.qdrant_port,
+            grpc_port=settings.qdrant_grpc_port,
+            prefer_grpc=grpc,
+            api_key=settings.qdrant_api_key,
+            timeout=300
+        )
+        if location:
+            options = dict(location=location)
+
+        if kind == "async":
+            if not location:
+                options["limits"] = httpx.Limits(
+                    max_connections=settings.qdrant_max_connections,
+                    max_keepalive_connections=settings.qdrant_max_keepalive_connections
+                )
+            self.client = AsyncQdrantClient(**options)
+        else:
+            self.client = QdrantClient(**options)
+
+    async def call(self, method: str, **kwargs):
+        result = getattr(self.client, method)(**kwargs)
+        if self.kind == "async":
+            result = await result
+        return result
+
+
+async def chat_loop(client: BenchClient, collection: str, stop: asyncio.Event,
+                    latencies: List[float], rng: np.random.Generator, interval: float):
+    """
+    Search on a fixed schedule like a stream of chat requests
+
+    Latency is measured from when each request was due, so time spent
+    waiting for a blocked event loop counts against it.
+    """
+    due = time.perf_counter()
+    while not stop.is_set():
+        wait = due - time.perf_counter()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        vector = rng.standard_normal(settings.qdrant_vector_size).astype(np.float32).tolist()
+        await client.call("search", collection_name=collection, query_vector=vector, limit=settings.rag_top_k)
+        latencies.append((time.perf_counter() - due) * 1000)
+        due += interval
+
+
+async def measure(client: BenchClient, collection: str, chats: int, duration: float,
+                  interval: float, ingestion=None) -> List[float]:
+    """Run chat loops for a fixed time or until the ingestion finishes"""
+    stop = asyncio.Event()
+    latencies: List[float] = []
+    rng = np.random.default_rng(1)
+    loops = [
+        asyncio.create_task(chat_loop(client, collection, stop, latencies, rng, interval))
+        for _ in range(chats)
+    ]
+
+    if ingestion is not None:
+        # Let the chat loops start before the ingestion takes the loop
+        await asyncio.sleep(0.2)
+        start = time.perf_counter()
+        await ingestion
+        print(f"  ingestion took {time.perf_counter() - start:.2f}s")
+    else:
+        await asyncio.sleep(duration)
+
+    stop.set()
+    await asyncio.gather(*loops)
+    return latencies
+
+
+async def ingest(client: BenchClient, collection: str, points: List[PointStruct], batch: int):
+    """Upsert the points, in one request when batch is 0"""
+    batch = batch or len(points)
+    for start in range(0, len(points), batch):
+        await client.call("upsert", collection_name=collection, points=points[start:start + batch])
+
+
+def report(name: str, latencies: List[float]):
+    print(
+        f"{name:<18} searches={len(latencies):>6} mean={statistics.mean(latencies):8.2f}ms "
+        f"p50={percentile(latencies, 50):8.2f}ms p99={percentile(latencies, 99):8.2f}ms "
+        f"max={max(latencies):8.2f}ms"
+    )
+
+
+async def run(args):
+    client = BenchClient(args.client, args.grpc, args.location)
+    collection = f"{settings.qdrant_collection_name}_bench_{uuid.uuid4().hex[:8]}"
+    rng = np.random.default_rng(0)
+
+    await client.call(
+        "create_collection",
+        collection_name=collection,
+        vectors_config=VectorParams(size=settings.qdrant_vector_size, distance=Distance.COSINE)
+    )
+
+    try:
+        print(f"Client: {args.client}{' (gRPC)' if args.grpc else ''}, collection {collection}")
+        await ingest(client, collection, random_points(args.seed_points, rng), 1000)
+
+        baseline = await measure(client, collection, args.chats, args.duration, args.interval)
+        report("idle", baseline)
+
+        points = random_points(args.ingest_points, rng)
+        during = await measure(
+            client, collection, args.chats, args.duration, args.interval,
+            ingestion=ingest(client, collection, points, args.ingest_batch)
+        )
+        report("during ingestion", during)
+
+    finally:
+        await client.call("delete_collection", collection_name=collection)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--client", choices=["async", "sync"], default="async")
+    parser.add_argument("--grpc", action="store_true", help="Use gRPC instead of REST")
+    parser.add_argument("--chats", type=int, default=20, help="Concurrent chat loops")
+    parser.add_argument("--interval", type=float, default=0.05, help="Seconds between searches per chat")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds to measure the idle baseline")
+    parser.add_argument("--seed-points", type=int, default=5000, help="Points in the collection before ingestion")
+    parser.add_argument("--ingest-points", type=int, default=50000, help="Points upserted during the measurement")
+    parser.add_argument("--ingest-batch", type=int, default=0, help="Upsert batch size, 0 for a single request")
+    parser.add_argument("--location", help="Qdrant location such as :memory: for a smoke test (in-process, so both clients block)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
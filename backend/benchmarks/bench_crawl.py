@@ -0,0 +1,155 @@
+"""
+Benchmark site crawling throughput against a local static site
+
+Usage (from backend/):
+    python -m benchmarks.bench_crawl [--pages 300] [--latency-ms 50] [--concurrency 1,4,8,16]
+
+A static site of --pages pages is generated in a temporary directory: every
+page links to a few others (some links with fragments), and a tenth of the
+pages have a copy under /copy/ with identical text, which the crawler should
+drop as duplicates. A sitemap.xml lists every page. The site is served by a
+threaded http.server on localhost that sleeps --latency-ms before each
+response, standing in for a remote site. Each concurrency level crawls the
+site twice, from the home page and from the sitemap, and reports pages
+ingested, duplicates dropped and pages/sec. Nothing is embedded: this
+measures fetching, parsing and deduplication only.
+"""
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import asyncio
+import functools
+import os
+import random
+import tempfile
+import threading
+import time
+
+from app.config import settings
+from app.services.crawler import SiteCrawler
+from app.services.extraction_service import ExtractionService
+from app.services.url_fetcher import URLFetcher
+
+WORDS = (
+    "course learning student teacher module quiz assignment forum grade lesson "
+    "activity resource calendar badge cohort enrolment feedback workshop wiki glossary"
+).split()
+
+
+def page_path(index: int) -> str:
+    """Path of a page; page 0 is the home page"""
+    return "/index.html" if index == 0 else f"/page{index}.html"
+
+
+def page_html(index: int, links: list, rng: random.Random) -> str:
+    """Build one page with a nav bar, a few paragraphs and links"""
+    paragraphs = "".join(
+        f"<p>{' '.join(rng.choice(WORDS) for _ in range(80))}</p>" for _ in range(4)
+    )
+    anchors = "".join(f'<li><a href="{link}">Link {n}</a></li>' for n, link in enumerate(links))
+    return (
+        f"<html><head><title>Page {index}</title></head><body>"
+        f'<nav><a href="/index.html">Home</a></nav>'
+        f"<h1>Page {index}</h1><h2>Section</h2>{paragraphs}<ul>{anchors}</ul>"
+        f"</body></html>"
+    )
+
+
+def build_site(root: str, pages: int, seed: int = 7):
+    """Write the pages and their duplicates under root"""
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(root, "copy"))
+    for index in range(pages):
+        links = [page_path(rng.randrange(pages)) for _ in range(5)]
+        links.append(f"{page_path((index + 1) % pages)}#top")
+        if index % 10 == 0:
+            links.append(f"/copy/page{index}.html")
+        html = page_html(index, links, random.Random(index))
+        with open(os.path.join(root, page_path(index).lstrip("/")), "w") as f:
+            f.write(html)
+        if index % 10 == 0:
+            with open(os.path.join(root, "copy", f"page{index}.html"), "w") as f:
+                f.write(html)
+
+
+def write_sitemap(root: str, base: str, pages: int):
+    """List every page, and the duplicates, in sitemap.xml"""
+    urls = [f"{base}{page_path(index)}" for index in range(pages)]
+    urls += [f"{base}/copy/page{index}.html" for index in range(0, pages, 10)]
+    entries = "".join(f"<url><loc>{url}</loc></url>" for url in urls)
+    with open(os.path.join(root, "sitemap.xml"), "w") as f:
+        f.write(
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'
+        )
+
+
+class SlowHandler(SimpleHTTPRequestHandler):
+    """Static file handler that waits before answering, without logging"""
+
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+async def crawl(seed: str, pages: int) -> dict:
+    """Crawl the site once and return the crawl statistics"""
+    crawler = SiteCrawler(seed, max_pages=pages * 2, max_depth=pages, same_domain=True)
+    async for _ in crawler.pages():
+        pass
+    return crawler.get_stats()
+
+
+async def run(args, base: str):
+    levels = [int(level) for level in args.concurrency.split(",")]
+    print(f"Site: {args.pages} pages (+{len(range(0, args.pages, 10))} duplicates), "
+          f"{args.latency_ms} ms latency, {settings.extraction_workers} extraction workers\n")
+    print(f"{'mode':<8} {'concurrency':>11} {'pages':>6} {'duplicates':>10} {'errors':>6} "
+          f"{'seconds':>8} {'pages/s':>8}")
+
+    for concurrency in levels:
+        settings.crawl_concurrency = concurrency
+        settings.crawl_per_host_concurrency = concurrency
+        for mode, seed in (("seed", f"{base}/index.html"), ("sitemap", f"{base}/sitemap.xml")):
+            stats = await crawl(seed, args.pages)
+            print(
+                f"{mode:<8} {concurrency:>11} {stats['pages']:>6} {stats['duplicates']:>10} "
+                f"{stats['errors']:>6} {stats['seconds']:>8.2f} {stats['pages_per_second']:>8.1f}"
+            )
+
+    await URLFetcher.get_instance().close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300, help="Pages in the generated site")
+    parser.add_argument("--latency-ms", type=int, default=50, help="Server delay before each response")
+    parser.add_argument("--concurrency", default="1,4,8,16", help="Comma-separated CRAWL_CONCURRENCY values")
+    args = parser.parse_args()
+
+    settings.url_state_path = None
+    settings.crawl_max_pages = max(settings.crawl_max_pages, args.pages * 2)
+    SlowHandler.latency = args.latency_ms / 1000
+
+    with tempfile.TemporaryDirectory() as root:
+        build_site(root, args.pages)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(SlowHandler, directory=root))
+        server.daemon_threads = True
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        write_sitemap(root, base, args.pages)
+
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            asyncio.run(run(args, base))
+        finally:
+            server.shutdown()
+            ExtractionService.get_instance().shutdown()
+
+
+if __name__ == "__main__":
+    main()
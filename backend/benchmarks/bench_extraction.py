@@ -0,0 +1,133 @@
+"""
+Benchmark PDF text extraction throughput by extraction worker count
+
+Usage (from backend/):
+    python -m benchmarks.bench_extraction [--pdf file.pdf] [--pages 400] [--workers 0 1 2 4]
+
+Pages are extracted through ExtractionService in windows of PDF_PAGE_WINDOW
+pages, exactly as ingest_pdf does. Workers 0 runs extraction in a thread,
+as a baseline. Alongside pages/sec the benchmark reports the worst event
+loop stall seen by a 10ms ticker, which is what chat and health requests
+would wait for during ingestion. Without --pdf a synthetic text PDF is
+generated.
+"""
+from typing import List
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from app.config import settings
+from app.services.extraction_service import ExtractionService
+
+WORDS = "students submit the assignment before the deadline and review the course material".split()
+
+
+def build_pdf(path: str, pages: int, lines: int = 45):
+    """Write a plain PDF with one text stream per page"""
+    objects: List[bytes] = [b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    pages_ref = 2 * pages + 2
+
+    for page in range(pages):
+        text = b" ".join(
+            b"(" + " ".join(WORDS[(page + line + i) % len(WORDS)] for i in range(12)).encode() + b") Tj 0 -16 Td"
+            for line in range(lines)
+        )
+        stream = b"BT /F1 10 Tf 30 800 Td " + text + b" ET"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 1 0 R >> >> >>" % (pages_ref, len(objects))
+        )
+
+    kids = b" ".join(b"%d 0 R" % (3 + 2 * page) for page in range(pages))
+    objects.append(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages))
+    objects.append(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_ref)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, len(objects), xref)
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+async def ticker(stop: asyncio.Event, stalls: List[float], interval: float = 0.01):
+    """Record how late a periodic callback runs"""
+    while not stop.is_set():
+        due = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        stalls.append(max(0.0, time.perf_counter() - due) * 1000)
+
+
+async def measure(pdf_path: str, workers: int) -> None:
+    settings.extraction_workers = workers
+    ExtractionService._instance = None
+    service = ExtractionService.get_instance()
+
+    try:
+        total_pages = await service.count_pdf_pages(pdf_path)
+        # Warm up every worker so process spawn and PDF parsing are not counted
+        warm_pages = max(1, workers) * settings.extraction_min_pages_per_task
+        await service.extract_pdf_pages(pdf_path, 0, min(total_pages, warm_pages))
+
+        stop = asyncio.Event()
+        stalls: List[float] = []
+        tick = asyncio.create_task(ticker(stop, stalls))
+
+        start = time.perf_counter()
+        window = max(1, settings.pdf_page_window)
+        characters = 0
+        for page_start in range(0, total_pages, window):
+            pages = await service.extract_pdf_pages(pdf_path, page_start, min(page_start + window, total_pages))
+            characters += sum(len(text) for _, text in pages)
+        elapsed = time.perf_counter() - start
+
+        stop.set()
+        await tick
+        print(
+            f"workers={workers:<3} pages={total_pages:>5} {elapsed:7.2f}s "
+            f"{total_pages / elapsed:8.1f} pages/s  chars={characters:>9}  "
+            f"max loop stall={max(stalls, default=0.0):7.1f}ms"
+        )
+
+    finally:
+        service.shutdown()
+
+
+async def run(args):
+    pdf_path = args.pdf
+    generated = None
+    if pdf_path is None:
+        generated = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+        generated.close()
+        pdf_path = generated.name
+        build_pdf(pdf_path, args.pages)
+
+    try:
+        print(f"PDF: {pdf_path}, window {settings.pdf_page_window} pages, {os.cpu_count()} CPUs")
+        for workers in args.workers:
+            await measure(pdf_path, workers)
+    finally:
+        if generated is not None:
+            os.unlink(generated.name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="PDF to extract instead of a generated one")
+    parser.add_argument("--pages", type=int, default=400, help="Pages in the generated PDF")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4], help="Worker counts to compare")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark HTML extraction: single-pass tokenizer against BeautifulSoup + html2text
+
+Usage (from backend/):
+    python -m benchmarks.bench_html [--corpus DIR] [--pages 200] [--repeat 3]
+
+With --corpus, every *.html file under DIR (e.g. pages saved from the
+sites being ingested) is converted; otherwise a corpus of --pages synthetic
+pages is generated, with the chrome, scripts, tables, lists and long
+articles real pages have, from a few KB to a few hundred KB. Each extractor
+converts the whole corpus --repeat times and the best pass is reported as
+pages/s and MB/s.
+
+Equivalence is measured per page on the words of the two outputs, so
+markdown differences (emphasis markers, table separators, line wrapping) do
+not count: how many pages produce the identical word sequence, the overlap
+of the two word multisets, and whether titles and links agree.
+"""
+from collections import Counter
+import argparse
+import os
+import random
+import re
+import statistics
+import time
+
+from app.services.extraction_service import extract_html, extract_html_soup
+
+WORDS = (
+    "course learning student teacher module quiz assignment forum grade lesson activity "
+    "resource calendar badge cohort enrolment feedback workshop wiki glossary the a of to "
+    "and in is for on with as by at from"
+).split()
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+
+def sentence(rng: random.Random, words: int = 14) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def synthetic_page(index: int, rng: random.Random) -> bytes:
+    """Build a page with chrome around an article of random length"""
+    sections = rng.choice([2, 4, 8, 16, 64, 256])
+    body = []
+    for section in range(sections):
+        body.append(f"<h2>Section {section} {sentence(rng, 3)}</h2>")
+        for _ in range(rng.randint(1, 4)):
+            inline = f'<a href="/page/{rng.randrange(1000)}">{sentence(rng, 3)}</a> <strong>{rng.choice(WORDS)}</strong>'
+            body.append(f"<p>{sentence(rng)} {inline} {sentence(rng)} <em>{sentence(rng, 5)}</em></p>")
+        if section % 3 == 0:
+            items = "".join(f"<li>{sentence(rng, 6)}</li>" for _ in range(rng.randint(2, 6)))
+            body.append(f"<ul>{items}</ul>")
+        if section % 5 == 0:
+            rows = "".join(
+                "<tr>" + "".join(f"<td>{rng.choice(WORDS)}</td>" for _ in range(4)) + "</tr>"
+                for _ in range(rng.randint(2, 8))
+            )
+            body.append(f"<table><tr><th>A</th><th>B</th><th>C</th><th>D</th></tr>{rows}</table>")
+        if section % 7 == 0:
+            body.append(f"<blockquote><p>{sentence(rng)}</p></blockquote>")
+
+    nav = "".join(f'<li><a href="/nav/{n}">Menu {n}</a></li>' for n in range(30))
+    return (
+        f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Page {index} &amp; more</title>"
+        f'<link rel="canonical" href="/page/{index}">'
+        f"<style>body {{ font-family: sans-serif; }} .x > p {{ margin: 0 }}</style>"
+        f"<script>var data = {{'items': [1, 2, 3], 'html': '<p>not text</p>'}};</script></head>"
+        f"<body><header><div class=\"logo\">Site</div></header><nav><ul>{nav}</ul></nav>"
+        f"<main><article><h1>Page {index}</h1>{''.join(body)}</article></main>"
+        f"<footer><p>Copyright</p></footer><script>track();</script></body></html>"
+    ).encode("utf-8")
+
+
+def load_corpus(args) -> list:
+    if args.corpus:
+        paths = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(args.corpus) for name in names if name.endswith(".html")
+        )
+        pages = []
+        for path in paths:
+            with open(path, "rb") as f:
+                pages.append(f.read())
+        return pages
+
+    rng = random.Random(11)
+    return [synthetic_page(index, rng) for index in range(args.pages)]
+
+
+def timed(extractor, corpus: list, repeat: int):
+    """Convert the corpus repeat times; return the outputs and the best pass in seconds"""
+    best = float("inf")
+    outputs = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        outputs = [extractor(page, "https://example.org/") for page in corpus]
+        best = min(best, time.perf_counter() - start)
+    return outputs, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Directory of saved .html pages")
+    parser.add_argument("--pages", type=int, default=200, help="Synthetic pages when no corpus is given")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the corpus per extractor")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args)
+    if not corpus:
+        raise SystemExit("No .html pages found")
+    size = sum(len(page) for page in corpus)
+    print(f"Corpus: {len(corpus)} pages, {size / 2**20:.1f} MB (largest {max(map(len, corpus)) / 2**10:.0f} KB)\n")
+
+    results = {}
+    print(f"{'extractor':<10} {'seconds':>8} {'pages/s':>8} {'MB/s':>6}")
+    for name, extractor in (("html2text", extract_html_soup), ("native", extract_html)):
+        outputs, seconds = timed(extractor, corpus, args.repeat)
+        results[name] = outputs
+        print(f"{name:<10} {seconds:>8.2f} {len(corpus) / seconds:>8.1f} {size / 2**20 / seconds:>6.2f}")
+
+    overlaps = []
+    same_words = same_title = same_links = 0
+    for old, new in zip(results["html2text"], results["native"]):
+        old_words = WORD_PATTERN.findall(old["text"].lower())
+        new_words = WORD_PATTERN.findall(new["text"].lower())
+        same_words += old_words == new_words
+        common = sum((Counter(old_words) & Counter(new_words)).values())
+        overlaps.append(common / max(len(old_words), len(new_words), 1))
+        same_title += old["title"] == new["title"]
+        same_links += old["links"] == new["links"] and old["canonical"] == new["canonical"]
+
+    print(f"\nIdentical word sequence: {same_words}/{len(corpus)} pages")
+    print(f"Word overlap: mean {statistics.mean(overlaps):.4f}, min {min(overlaps):.4f}")
+    print(f"Same title: {same_title}/{len(corpus)}, same links and canonical: {same_links}/{len(corpus)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark dense-only against hybrid (dense + BM25) retrieval
+
+Usage (from backend/):
+    python -m benchmarks.bench_retrieval [--k 5] [--threshold 0.7] [--repeat 20]
+
+The fixed corpus in data/retrieval_corpus.json is loaded into an in-memory
+Qdrant collection through VectorStoreService, so both modes run the same
+code path as the API. Query embeddings are computed once up front, so the
+reported latencies cover retrieval only. Embeddings come from the
+configured EMBEDDING_PROVIDER.
+"""
+from typing import Dict, List
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import Distance, VectorParams
+
+from app.config import settings
+from app.services.vector_store import VectorStoreService
+from app.services.embedding_service import EmbeddingService
+
+DATA_FILE = Path(__file__).parent / "data" / "retrieval_corpus.json"
+MODES = ["dense", "hybrid"]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def load_corpus(corpus: Dict) -> VectorStoreService:
+    """Ingest the corpus into an in-memory collection"""
+    service = VectorStoreService()
+    service.client = AsyncQdrantClient(location=":memory:")
+    await service.client.create_collection(
+        collection_name=settings.qdrant_collection_name,
+        vectors_config=VectorParams(size=settings.qdrant_vector_size, distance=Distance.COSINE)
+    )
+    service.embeddings = EmbeddingService.get_instance()
+    await service.embeddings.initialize()
+    service.initialized = True
+
+    # Ingest in hybrid mode so the lexical index is filled too
+    settings.search_mode = "hybrid"
+    for document in corpus["documents"]:
+        await service.add_documents(
+            texts=[chunk["text"] for chunk in document["chunks"]],
+            metadatas=[{"source": document["source"], "chunk_id": chunk["id"]} for chunk in document["chunks"]],
+            document_id=document["document_id"]
+        )
+    return service
+
+
+async def run(k: int, threshold: float, repeat: int):
+    corpus = json.loads(DATA_FILE.read_text())
+    queries = corpus["queries"]
+
+    service = await load_corpus(corpus)
+    print(f"Corpus: {sum(len(d['chunks']) for d in corpus['documents'])} chunks, {len(queries)} queries")
+
+    start = time.perf_counter()
+    embeddings = await asyncio.gather(*(service.embeddings.aembed_query(q["query"]) for q in queries))
+    print(f"Query embedding: {(time.perf_counter() - start) * 1000 / len(queries):.1f}ms per query (not included below)\n")
+
+    kinds = sorted({q["kind"] for q in queries})
+    print(f"{'mode':<8} " + " ".join(f"{'R@' + str(k) + ' ' + kind:>14}" for kind in kinds + ["all"])
+          + f" {'MRR':>6} {'p50':>9} {'p99':>9}")
+
+    for mode in MODES:
+        settings.search_mode = mode
+        recall: Dict[str, List[float]] = {kind: [] for kind in kinds + ["all"]}
+        reciprocal_ranks, latencies = [], []
+
+        for query, embedding in zip(queries, embeddings):
+            for _ in range(repeat):
+                start = time.perf_counter()
+                results = await service.search(
+                    query["query"], top_k=k, score_threshold=threshold, query_embedding=embedding
+                )
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            found = [r["metadata"].get("chunk_id") for r in results]
+            relevant = set(query["relevant"])
+            hit_rate = len(relevant & set(found)) / len(relevant)
+            recall[query["kind"]].append(hit_rate)
+            recall["all"].append(hit_rate)
+
+            ranks = [i for i, chunk_id in enumerate(found, 1) if chunk_id in relevant]
+            reciprocal_ranks.append(1 / ranks[0] if ranks else 0.0)
+
+        print(
+            f"{mode:<8} "
+            + " ".join(f"{statistics.mean(recall[kind]):>14.3f}" for kind in kinds + ["all"])
+            + f" {statistics.mean(reciprocal_ranks):>6.3f}"
+            + f" {percentile(latencies, 50):>7.3f}ms {percentile(latencies, 99):>7.3f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=settings.rag_top_k, help="Results per query")
+    parser.add_argument("--threshold", type=float, default=settings.rag_score_threshold,
+                        help="Dense similarity threshold")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed searches per query")
+    args = parser.parse_args()
+    asyncio.run(run(args.k, args.threshold, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
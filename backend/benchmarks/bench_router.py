@@ -0,0 +1,91 @@
+"""
+Benchmark the local query router against the LLM router
+
+Usage (from backend/):
+    python -m benchmarks.bench_router [--with-llm] [--threshold 0.6]
+
+Without --with-llm only the local classifier is measured against the
+labelled queries. With --with-llm every query is also classified by the
+LLM router so latency and agreement can be compared.
+"""
+from typing import Dict, List
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.services.router_service import LocalQueryRouter, LLMQueryRouter, CATEGORY_ROUTES
+
+DATA_FILE = Path(__file__).parent / "data" / "router_queries.json"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarise(name: str, latencies: List[float]):
+    """Print latency summary in milliseconds"""
+    print(
+        f"{name:<8} mean={statistics.mean(latencies):8.3f}ms "
+        f"p50={percentile(latencies, 50):8.3f}ms p99={percentile(latencies, 99):8.3f}ms"
+    )
+
+
+async def run(with_llm: bool, threshold: float):
+    labelled: Dict[str, List[str]] = json.loads(DATA_FILE.read_text())
+    queries = [(query, category) for category, items in labelled.items() for query in items]
+
+    local_router = LocalQueryRouter()
+    llm_router = LLMQueryRouter() if with_llm else None
+
+    local_latencies, llm_latencies = [], []
+    local_correct = llm_correct = agreement = confident = hybrid_correct = 0
+
+    for query, expected in queries:
+        start = time.perf_counter()
+        local = local_router.classify(query)
+        local_latencies.append((time.perf_counter() - start) * 1000)
+
+        local_correct += local["category"] == expected
+        is_confident = local["confidence"] >= threshold
+        confident += is_confident
+
+        if llm_router:
+            start = time.perf_counter()
+            llm = await llm_router.classify(query)
+            llm_latencies.append((time.perf_counter() - start) * 1000)
+
+            llm_correct += llm["category"] == expected
+            agreement += llm["route"] == local["route"]
+            hybrid = local if is_confident else llm
+            hybrid_correct += hybrid["category"] == expected
+
+    total = len(queries)
+    print(f"Queries: {total} across {len(CATEGORY_ROUTES)} categories\n")
+    summarise("local", local_latencies)
+    print(f"local accuracy: {local_correct / total:.1%}")
+    print(f"local confident (>= {threshold}): {confident / total:.1%} of queries skip the LLM")
+
+    if llm_router:
+        print()
+        summarise("llm", llm_latencies)
+        print(f"llm accuracy: {llm_correct / total:.1%}")
+        print(f"local/llm route agreement: {agreement / total:.1%}")
+        print(f"hybrid accuracy: {hybrid_correct / total:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--with-llm", action="store_true", help="Also run the LLM router (needs API key)")
+    parser.add_argument("--threshold", type=float, default=0.6, help="Hybrid confidence threshold")
+    args = parser.parse_args()
+    asyncio.run(run(args.with_llm, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
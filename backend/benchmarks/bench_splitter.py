@@ -0,0 +1,162 @@
+"""
+Benchmark chunking: TextSplitter against LangChain's RecursiveCharacterTextSplitter
+
+Usage (from backend/):
+    python -m benchmarks.bench_splitter [--size-mb 4] [--chunk-size 1000] [--chunk-overlap 200] [--tokens]
+
+Two texts of --size-mb each are generated: markdown as produced by the
+HTML extractor (headings, paragraphs, lists, one block per line) and PDF
+text (lines wrapped mid-sentence, paragraphs separated by blank lines).
+Both splitters chunk each text with the same size and overlap, and the
+best of three runs is reported as chunks/s and MB/s, together with the
+mean chunk length and how many chunks start and end cleanly, at a
+sentence, paragraph or heading rather than mid-sentence (a wrapped PDF
+line end does not count). --tokens also compares both
+splitters measuring in tokens of --tokenizer (a tiktoken encoding, which
+must be available locally), with a quarter of the character budgets.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from app.config import settings
+from app.services.text_splitter import TextSplitter
+
+WORDS = (
+    "course learning student teacher module quiz assignment forum grade lesson activity "
+    "resource calendar badge cohort enrolment feedback workshop wiki glossary the a of to "
+    "and in is for on with as by at from"
+).split()
+
+
+def sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 24))).capitalize() + "."
+
+
+def markdown_text(size: int, rng: random.Random) -> str:
+    """Markdown like the HTML extractor's output"""
+    lines = []
+    length = 0
+    section = 0
+    while length < size:
+        section += 1
+        block = [f"## Section {section}"]
+        for _ in range(rng.randint(2, 8)):
+            block.append(" ".join(sentence(rng) for _ in range(rng.randint(1, 6))))
+        if section % 3 == 0:
+            block.extend(f"* {sentence(rng)}" for _ in range(rng.randint(2, 6)))
+        if section % 10 == 1:
+            block.insert(0, f"# Chapter {section // 10 + 1}")
+        lines.extend(block)
+        length += sum(len(line) + 1 for line in block)
+    return "\n".join(lines)
+
+
+def pdf_text(size: int, rng: random.Random) -> str:
+    """Text like pypdf's output: wrapped lines, blank lines between paragraphs"""
+    paragraphs = []
+    length = 0
+    while length < size:
+        words = " ".join(sentence(rng) for _ in range(rng.randint(2, 10))).split(" ")
+        lines, line = [], []
+        for word in words:
+            line.append(word)
+            if sum(len(w) + 1 for w in line) > 80:
+                lines.append(" ".join(line))
+                line = []
+        lines.append(" ".join(line))
+        paragraphs.append("\n".join(lines))
+        length += len(paragraphs[-1]) + 2
+    return "\n\n".join(paragraphs)
+
+
+def clean_start(text: str, offset: int) -> bool:
+    """Whether a chunk starts a heading or follows a sentence or blank line"""
+    before = text[max(0, offset - 16):offset]
+    stripped = before.rstrip()
+    return (
+        offset == 0 or text[offset] == "#" or not stripped
+        or stripped[-1] in ".!?:;" or "\n\n" in before[len(stripped):]
+    )
+
+
+def clean_end(text: str, end: int) -> bool:
+    """Whether a chunk ends a sentence or is followed by a blank line"""
+    return end >= len(text) or text[end - 1] in ".!?:;" or text[end:end + 16].lstrip(" \t").startswith("\n\n")
+
+
+def run(name: str, split, text: str, repeat: int = 3):
+    """Time a splitter on text; split returns (chunk, start offset) pairs"""
+    best = float("inf")
+    chunks = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = split(text)
+        best = min(best, time.perf_counter() - start)
+
+    starts = sum(clean_start(text, offset) for _, offset in chunks)
+    ends = sum(clean_end(text, offset + len(chunk)) for chunk, offset in chunks)
+    print(
+        f"{name:<22} {len(chunks):>7} {len(chunks) / best:>10.0f} {len(text) / 2**20 / best:>6.2f} "
+        f"{statistics.mean(len(chunk) for chunk, _ in chunks):>8.0f} {starts / len(chunks):>7.0%} "
+        f"{ends / len(chunks):>7.0%}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=4, help="Size of each generated text")
+    parser.add_argument("--chunk-size", type=int, default=settings.chunk_size)
+    parser.add_argument("--chunk-overlap", type=int, default=settings.chunk_overlap)
+    parser.add_argument("--tokens", action="store_true", help="Also split measuring in tokens")
+    parser.add_argument("--tokenizer", default=settings.chunk_tokenizer, help="tiktoken encoding for --tokens")
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    size = int(args.size_mb * 2**20)
+    texts = {"markdown": markdown_text(size, rng), "pdf": pdf_text(size, rng)}
+
+    recursive = RecursiveCharacterTextSplitter(
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""],
+        add_start_index=True
+    )
+    native = TextSplitter(args.chunk_size, args.chunk_overlap, "chars")
+    splitters = [
+        ("recursive (chars)", lambda text: [
+            (doc.page_content, doc.metadata["start_index"]) for doc in recursive.create_documents([text])
+        ]),
+        ("native (chars)", lambda text: [(chunk, meta["start"]) for chunk, meta in native.split(text)]),
+    ]
+    if args.tokens:
+        # Token budgets are about a quarter of the character ones
+        recursive_tokens = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            encoding_name=args.tokenizer,
+            chunk_size=args.chunk_size // 4,
+            chunk_overlap=args.chunk_overlap // 4,
+            add_start_index=True
+        )
+        native_tokens = TextSplitter(args.chunk_size // 4, args.chunk_overlap // 4, "tokens", args.tokenizer)
+        splitters += [
+            ("recursive (tokens)", lambda text: [
+                (doc.page_content, doc.metadata["start_index"]) for doc in recursive_tokens.create_documents([text])
+            ]),
+            ("native (tokens)", lambda text: [(chunk, meta["start"]) for chunk, meta in native_tokens.split(text)]),
+        ]
+
+    print(f"Chunk size {args.chunk_size}, overlap {args.chunk_overlap}")
+    for kind, text in texts.items():
+        print(f"\n{kind}: {len(text) / 2**20:.1f} MB")
+        print(f"{'splitter':<22} {'chunks':>7} {'chunks/s':>10} {'MB/s':>6} {'mean len':>8} {'clean':>7} {'clean':>7}")
+        print(f"{'':<22} {'':>7} {'':>10} {'':>6} {'(chars)':>8} {'start':>7} {'end':>7}")
+        for name, split in splitters:
+            run(name, split, text)
+
+
+if __name__ == "__main__":
+    main()
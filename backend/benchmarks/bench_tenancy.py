@@ -0,0 +1,159 @@
+"""
+Benchmark course-scoped retrieval as the rest of the site grows
+
+Usage (from backend/):
+    python -m benchmarks.bench_tenancy [--courses 10,40,160] [--chunks-per-course 300]
+        [--site-chunks 300] [--queries 200] [--dim 384] [--memory]
+
+A scratch collection is created on the configured Qdrant server the way
+the service creates it (QDRANT_* tuning settings and payload indexes,
+including course_id) and grown in steps: course 1 and --site-chunks
+site-wide chunks (course 0) stay the same, while more and more other
+courses of --chunks-per-course random chunks are added. At every step,
+once Qdrant finished indexing, --queries searches are run through
+VectorStoreService.search with the filter the agent applies for a chat in
+course 1, and without a filter for comparison. The collection is deleted
+afterwards.
+
+For each site size the p50/p95 latency of both is reported, with the
+mean results per course-filtered search and how many of them came from
+another course (always 0). With the course_id index, filtered latency
+stays flat while unfiltered search covers the whole site. --memory runs
+against the in-memory client instead, which has no payload indexes and
+scans every point on filtered searches, as a quick smoke test.
+"""
+from typing import List
+import argparse
+import asyncio
+import time
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import PointStruct
+
+from app.config import settings
+
+settings.search_mode = "dense"
+settings.rag_score_threshold = -1.0  # random vectors are barely similar; rank them all
+
+from app.services.vector_store import VectorStoreService  # noqa: E402
+
+COURSE = 1
+
+
+def course_filter(course_id: int):
+    """The filter AgentService applies for a chat in the course"""
+    return {'course_id': [course_id, 0] if course_id else [0]}
+
+
+async def add_course(client: AsyncQdrantClient, course_id: int, chunks: int, first_id: int, dim: int,
+                     rng: np.random.Generator, batch: int = 500):
+    """Upsert random chunks of one course, one document per course"""
+    vectors = rng.standard_normal((chunks, dim), dtype=np.float32)
+    document_id = course_id + 1_000_000
+    for start in range(0, chunks, batch):
+        points = [
+            PointStruct(
+                id=first_id + index,
+                vector=vectors[index].tolist(),
+                payload={
+                    'text': f"chunk {index} of course {course_id}",
+                    'metadata': {'document_id': document_id, 'course_id': course_id, 'type': 'pdf'},
+                    'document_id': document_id,
+                    'course_id': course_id
+                }
+            )
+            for index in range(start, min(start + batch, chunks))
+        ]
+        await client.upsert(settings.qdrant_collection_name, points=points, wait=False)
+
+
+async def wait_indexed(client: AsyncQdrantClient, memory: bool):
+    """Wait until the optimizers caught up with the upserts"""
+    while not memory:
+        info = await client.get_collection(settings.qdrant_collection_name)
+        if info.status.value == 'green' and (info.indexed_vectors_count or 0) >= (info.points_count or 0) * 0.95:
+            return
+        await asyncio.sleep(1)
+
+
+async def latencies(store: VectorStoreService, queries: np.ndarray, filtered: bool):
+    """Search with each query, returning latencies (ms), results and results outside the course"""
+    timings: List[float] = []
+    found = 0
+    leaked = 0
+    for query in queries:
+        start = time.perf_counter()
+        results = await store.search(
+            query="",
+            top_k=settings.rag_top_k,
+            score_threshold=settings.rag_score_threshold,
+            filter_dict=course_filter(COURSE) if filtered else None,
+            query_embedding=query.tolist()
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+        found += len(results)
+        if filtered:
+            leaked += sum(result['metadata']['course_id'] not in (COURSE, 0) for result in results)
+    return timings, found / len(queries), leaked
+
+
+async def run(args):
+    steps = sorted(int(step) for step in args.courses.split(","))
+    settings.qdrant_vector_size = args.dim
+    settings.qdrant_collection_name = f"bench_tenancy_{int(time.time())}"
+
+    store = VectorStoreService.get_instance()
+    if args.memory:
+        store.client = AsyncQdrantClient(location=":memory:")
+    else:
+        store.client = AsyncQdrantClient(host=settings.qdrant_host, port=settings.qdrant_port,
+                                         api_key=settings.qdrant_api_key, timeout=300)
+    await store.client.create_collection(settings.qdrant_collection_name, **store.collection_config())
+    await store.ensure_payload_indexes()
+    store.search_params = store._search_params()
+    store.initialized = True
+
+    rng = np.random.default_rng(7)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    print(f"{args.chunks_per_course} chunks per course, {args.site_chunks} site-wide, {args.dim} dims, "
+          f"{args.queries} queries, top {settings.rag_top_k}, {'in-memory' if args.memory else 'server'}\n")
+    print(f"{'courses':>8} {'points':>8} {'course p50':>11} {'course p95':>11} {'site p50':>9} {'site p95':>9} "
+          f"{'results':>8} {'leaked':>7}")
+
+    try:
+        await add_course(store.client, 0, args.site_chunks, 0, args.dim, rng)
+        next_id = args.site_chunks
+        courses = 0
+        for step in steps:
+            while courses < step:
+                courses += 1
+                await add_course(store.client, courses, args.chunks_per_course, next_id, args.dim, rng)
+                next_id += args.chunks_per_course
+            await wait_indexed(store.client, args.memory)
+
+            course, found, leaked = await latencies(store, queries, True)
+            site, _, _ = await latencies(store, queries, False)
+            print(
+                f"{courses:>8} {next_id:>8} {np.percentile(course, 50):>9.2f}ms {np.percentile(course, 95):>9.2f}ms "
+                f"{np.percentile(site, 50):>7.2f}ms {np.percentile(site, 95):>7.2f}ms {found:>8.1f} {leaked:>7}"
+            )
+    finally:
+        await store.client.delete_collection(settings.qdrant_collection_name)
+        await store.client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", default="10,40,160", help="Comma-separated course counts to measure at")
+    parser.add_argument("--chunks-per-course", type=int, default=300, help="Chunks in every course")
+    parser.add_argument("--site-chunks", type=int, default=300, help="Site-wide chunks (course 0)")
+    parser.add_argument("--queries", type=int, default=200, help="Searches per measurement")
+    parser.add_argument("--dim", type=int, default=384, help="Vector size")
+    parser.add_argument("--memory", action="store_true", help="Use the in-memory client instead of the server")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
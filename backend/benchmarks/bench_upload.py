@@ -0,0 +1,157 @@
+"""
+Benchmark peak memory of PDF transfer: base64-in-JSON against multipart upload
+
+Usage (from backend/):
+    python -m benchmarks.bench_upload [--size-mb 200] [--receive-kb 64]
+
+A file of --size-mb random bytes is sent through the real ingest endpoints,
+mounted on a bare FastAPI app and driven directly over ASGI. The request body
+is read from disk in --receive-kb chunks, like a server receiving it from the
+network, so everything measured is held by the backend: for /api/ingest/pdf
+the JSON body, its base64 string and the decoded bytes; for
+/api/ingest/pdf/upload the multipart parser's buffers and the chunked copy
+into the job spool. Peak memory is measured with tracemalloc. Jobs are
+queued with no workers, so nothing is ingested. On the PHP side, the old
+client read and base64-encoded the whole file, while CURLFile streams it
+from disk.
+"""
+from typing import List, Tuple
+import argparse
+import asyncio
+import base64
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from fastapi import FastAPI
+
+from app.config import settings
+
+settings.job_workers = 0
+settings.job_journal_path = None
+
+from app.api import ingest  # noqa: E402
+
+CHUNK = 1024 * 1024
+
+
+def write_pdf(path: str, size: int):
+    """Write a file of random bytes with a PDF header"""
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        remaining = size - 9
+        while remaining > 0:
+            block = os.urandom(min(CHUNK, remaining))
+            f.write(block)
+            remaining -= len(block)
+
+
+def write_json_body(path: str, pdf_path: str) -> Tuple[str, int]:
+    """Write the JSON request body the old PHP client sent"""
+    with open(path, "wb") as out, open(pdf_path, "rb") as pdf:
+        out.write(b'{"document_id": 1, "filename": "bench.pdf", "file_content": "')
+        while block := pdf.read(3 * CHUNK):
+            out.write(base64.b64encode(block))
+        out.write(b'"}')
+    return "application/json", os.path.getsize(path)
+
+
+def write_multipart_body(path: str, pdf_path: str) -> Tuple[str, int]:
+    """Write a multipart body like curl sends for a CURLFile"""
+    boundary = "benchboundary7d9c4a"
+    with open(path, "wb") as out, open(pdf_path, "rb") as pdf:
+        out.write(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="document_id"\r\n\r\n1\r\n'
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="bench.pdf"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n'.encode()
+        )
+        while block := pdf.read(CHUNK):
+            out.write(block)
+        out.write(f"\r\n--{boundary}--\r\n".encode())
+    return f"multipart/form-data; boundary={boundary}", os.path.getsize(path)
+
+
+async def post(app: FastAPI, path: str, body_path: str, content_type: str, length: int,
+               receive_size: int) -> Tuple[int, dict]:
+    """Send a request body from disk through the ASGI app"""
+    body = open(body_path, "rb")
+    status: List[int] = []
+    response: List[bytes] = []
+
+    async def receive():
+        block = body.read(receive_size)
+        return {"type": "http.request", "body": block, "more_body": len(block) == receive_size}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+        elif message["type"] == "http.response.body":
+            response.append(message.get("body", b""))
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(length).encode())],
+        "server": ("bench", 80), "client": ("bench", 1),
+    }
+    try:
+        await app(scope, receive, send)
+    finally:
+        body.close()
+    return status[0], json.loads(b"".join(response))
+
+
+async def run(args):
+    app = FastAPI()
+    app.include_router(ingest.router, prefix="/api")
+    size = args.size_mb * 1024 * 1024
+
+    with tempfile.TemporaryDirectory() as workdir:
+        settings.job_spool_dir = os.path.join(workdir, "spool")
+        ingest.IngestionJobQueue._instance = None
+
+        pdf_path = os.path.join(workdir, "bench.pdf")
+        write_pdf(pdf_path, size)
+        print(f"File: {args.size_mb} MB, received in {args.receive_kb} KB chunks\n")
+        print(f"{'endpoint':<24} {'body MB':>8} {'peak MB':>8} {'peak/file':>9} {'seconds':>8}")
+
+        cases = [
+            ("/api/ingest/pdf", write_json_body),
+            ("/api/ingest/pdf/upload", write_multipart_body),
+        ]
+        for path, write_body in cases:
+            body_path = os.path.join(workdir, "body")
+            content_type, length = write_body(body_path, pdf_path)
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            status, response = await post(app, path, body_path, content_type, length, args.receive_kb * 1024)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            if status != 200:
+                raise RuntimeError(f"{path} returned {status}: {response}")
+            spooled = [os.path.join(settings.job_spool_dir, name) for name in os.listdir(settings.job_spool_dir)]
+            if [os.path.getsize(p) for p in spooled] != [size]:
+                raise RuntimeError(f"{path} spooled {spooled} instead of one {size} byte file")
+            for spooled_path in spooled:
+                os.unlink(spooled_path)
+            os.unlink(body_path)
+
+            print(
+                f"{path:<24} {length / 2**20:>8.1f} {peak / 2**20:>8.1f} {peak / size:>9.2f} {elapsed:>8.2f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=200, help="Size of the uploaded file")
+    parser.add_argument("--receive-kb", type=int, default=64, help="Size of each received body chunk")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
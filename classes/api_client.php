@@ -22,76 +22,353 @@ defined('MOODLE_INTERNAL') || die();
  * Client for communicating with Python backend
  */
 class api_client {
+    /** @var int HTTP status the backend returns when it has no session for a chat */
+    const HTTP_UNKNOWN_SESSION = 409;
+
+    /** @var int HTTP status the backend returns for an unknown job or document */
+    const HTTP_NOT_FOUND = 404;
+
+    /** @var int Seconds allowed for uploading a document file to the backend */
+    const UPLOAD_TIMEOUT = 600;
+
+    /** @var int Seconds a bulk ingestion may go without reporting a finished document */
+    const BULK_STALL_TIMEOUT = 600;
+
     /**
      * Send chat request to backend
      *
+     * With a chat ID only the new message is sent, since the backend keeps
+     * the transcript. The full history is sent if the backend does not know
+     * the chat yet (e.g. after a restart).
+     *
      * @param string $backendurl Backend URL
      * @param string $message User message
      * @param array $history Chat history
      * @param int|null $userage User age
+     * @param int|null $chatid Chat ID, lets the backend keep the session and a rolling summary
+     * @param int $courseid Course ID, limits retrieval to the course's and site-wide documents
      * @return array Response
      */
-    public static function chat($backendurl, $message, $history, $userage = null) {
+    public static function chat($backendurl, $message, $history, $userage = null, $chatid = null, $courseid = 0) {
         $url = rtrim($backendurl, '/') . '/api/chat';
 
-        $data = [
-            'message' => $message,
-            'history' => self::format_history($history),
-            'user_age' => $userage,
-            'llm_provider' => get_config('local_aiassistant', 'llmprovider'),
-            'api_key' => self::get_api_key(),
-        ];
+        if ($chatid) {
+            $response = self::send_request($url, self::build_chat_data($message, null, $userage, $chatid, $courseid),
+                [self::HTTP_UNKNOWN_SESSION]);
+            if ($response !== null) {
+                return $response;
+            }
+        }
 
-        return self::send_request($url, $data);
+        return self::send_request($url, self::build_chat_data($message, $history, $userage, $chatid, $courseid));
+    }
+
+    /**
+     * Stream a chat response from the backend
+     *
+     * Each Server-Sent Event received from the backend is passed to $onevent
+     * as soon as it arrives, so the caller can relay tokens to the browser.
+     * Like chat(), only the new message is sent unless the backend asks for
+     * the full history.
+     *
+     * @param string $backendurl Backend URL
+     * @param string $message User message
+     * @param array $history Chat history
+     * @param int|null $userage User age
+     * @param int|null $chatid Chat ID, lets the backend keep the session and a rolling summary
+     * @param callable $onevent Called with (array $event, string $frame) for each event
+     * @param int $courseid Course ID, limits retrieval to the course's and site-wide documents
+     * @return array|null The final "done" event, if one was received
+     */
+    public static function chat_stream($backendurl, $message, $history, $userage, $chatid, callable $onevent, $courseid = 0) {
+        if ($chatid) {
+            $data = self::build_chat_data($message, null, $userage, $chatid, $courseid);
+            $final = self::send_stream_request($backendurl, $data, $onevent, [self::HTTP_UNKNOWN_SESSION]);
+            if ($final !== false) {
+                return $final;
+            }
+        }
+
+        $data = self::build_chat_data($message, $history, $userage, $chatid, $courseid);
+        return self::send_stream_request($backendurl, $data, $onevent);
     }
 
     /**
-     * Send document for ingestion
+     * Post a chat request to the streaming endpoint and relay its events
+     *
+     * @param string $backendurl Backend URL
+     * @param array $data Request data
+     * @param callable $onevent Called with (array $event, string $frame) for each event
+     * @param array $allowedcodes HTTP error codes to report as false instead of throwing
+     * @return array|null|false The final "done" event, or false for an allowed error code
+     */
+    private static function send_stream_request($backendurl, $data, callable $onevent, $allowedcodes = []) {
+        $url = rtrim($backendurl, '/') . '/api/chat/stream';
+
+        $buffer = '';
+        $final = null;
+
+        $curl = curl_init();
+
+        curl_setopt_array($curl, [
+            CURLOPT_URL => $url,
+            CURLOPT_POST => true,
+            CURLOPT_POSTFIELDS => json_encode($data),
+            CURLOPT_HTTPHEADER => [
+                'Content-Type: application/json',
+                'Accept: text/event-stream',
+            ],
+            CURLOPT_CONNECTTIMEOUT => 10,
+            // No overall limit for streams, only abort if the backend stalls.
+            CURLOPT_TIMEOUT => 0,
+            CURLOPT_LOW_SPEED_LIMIT => 1,
+            CURLOPT_LOW_SPEED_TIME => 60,
+            CURLOPT_WRITEFUNCTION => function($curl, $chunk) use (&$buffer, &$final, $onevent) {
+                if (curl_getinfo($curl, CURLINFO_HTTP_CODE) !== 200) {
+                    return strlen($chunk);
+                }
+
+                $buffer .= $chunk;
+                while (($pos = strpos($buffer, "\n\n")) !== false) {
+                    $frame = substr($buffer, 0, $pos + 2);
+                    $buffer = substr($buffer, $pos + 2);
+
+                    $event = self::parse_sse_frame($frame);
+                    if ($event === null) {
+                        continue;
+                    }
+                    if ($event['type'] === 'done') {
+                        $final = $event;
+                    }
+                    $onevent($event, $frame);
+                }
+
+                return strlen($chunk);
+            },
+        ]);
+
+        curl_exec($curl);
+        $httpcode = curl_getinfo($curl, CURLINFO_HTTP_CODE);
+        $error = curl_error($curl);
+
+        curl_close($curl);
+
+        if ($error) {
+            throw new \Exception('Backend connection error: ' . $error);
+        }
+
+        if (in_array($httpcode, $allowedcodes, true)) {
+            return false;
+        }
+
+        if ($httpcode !== 200) {
+            throw new \Exception('Backend error: HTTP ' . $httpcode);
+        }
+
+        return $final;
+    }
+
+    /**
+     * Queue a document for ingestion
+     *
+     * The backend returns as soon as the job is queued; poll get_document_job()
+     * for its progress and result.
      *
      * @param string $backendurl Backend URL
      * @param int $documentid Document ID
      * @param string $source File path or URL
      * @param string $type Document type
-     * @return array Response
+     * @param int $courseid Course whose chats may retrieve the document, 0 for site-wide
+     * @return array Response with job_id and status
      */
-    public static function ingest_document($backendurl, $documentid, $source, $type) {
+    public static function ingest_document($backendurl, $documentid, $source, $type, $courseid = 0) {
         $url = rtrim($backendurl, '/') . '/api/ingest/' . $type;
 
+        // Upload PDF files as multipart form data, which curl streams from disk
+        if ($type === 'pdf' && file_exists($source)) {
+            return self::send_request($url . '/upload', [
+                'document_id' => $documentid,
+                'course_id' => (int)$courseid,
+                'file' => new \CURLFile($source, 'application/pdf', basename($source)),
+            ], [], true);
+        }
+
         $data = [
             'document_id' => $documentid,
             'source' => $source,
+            'course_id' => (int)$courseid,
         ];
 
-        // For PDF files, we need to send the file content
-        if ($type === 'pdf' && file_exists($source)) {
-            $data['file_content'] = base64_encode(file_get_contents($source));
-            $data['filename'] = basename($source);
-        }
-
         return self::send_request($url, $data);
     }
 
     /**
-     * Send HTTP request
+     * Ingest many documents in one request
      *
-     * @param string $url URL
-     * @param array $data Request data
-     * @return array Response
+     * The backend runs the documents with bounded concurrency, sharing
+     * embedding and upsert batches between them, and answers with one JSON
+     * line per document as its job finishes. Each line is passed to $onresult
+     * as it arrives. Local PDF files are uploaded in the same multipart
+     * request, streamed from disk by curl. If the connection drops, the jobs
+     * keep running on the backend and can still be polled.
+     *
+     * @param string $backendurl Backend URL
+     * @param array $documents Arrays with 'documentid', 'source' (file path or URL), 'type' (pdf, url or crawl)
+     *                         and optionally 'courseid'
+     * @param callable $onresult Called with (array $job) for each finished document
+     * @return int Number of results received
      */
-    private static function send_request($url, $data) {
+    public static function ingest_bulk($backendurl, array $documents, callable $onresult) {
+        $url = rtrim($backendurl, '/') . '/api/ingest/bulk';
+
+        $items = [];
+        $fields = [];
+        foreach ($documents as $document) {
+            $item = [
+                'document_id' => (int)$document['documentid'],
+                'type' => $document['type'],
+                'course_id' => (int)($document['courseid'] ?? 0),
+            ];
+            if ($document['type'] === 'pdf' && file_exists($document['source'])) {
+                $field = 'file' . count($fields);
+                $fields[$field] = new \CURLFile($document['source'], 'application/pdf', basename($document['source']));
+                $item['file'] = $field;
+            } else {
+                $item['source'] = $document['source'];
+            }
+            $items[] = $item;
+        }
+        $fields['manifest'] = json_encode(['items' => $items]);
+
+        $buffer = '';
+        $received = 0;
+
         $curl = curl_init();
 
         curl_setopt_array($curl, [
             CURLOPT_URL => $url,
-            CURLOPT_RETURNTRANSFER => true,
             CURLOPT_POST => true,
-            CURLOPT_POSTFIELDS => json_encode($data),
+            CURLOPT_POSTFIELDS => $fields,
             CURLOPT_HTTPHEADER => [
-                'Content-Type: application/json',
+                'Accept: application/x-ndjson',
             ],
-            CURLOPT_TIMEOUT => 60,
+            CURLOPT_CONNECTTIMEOUT => 10,
+            // No overall limit, only abort if no document finishes for a long time.
+            CURLOPT_TIMEOUT => 0,
+            CURLOPT_LOW_SPEED_LIMIT => 1,
+            CURLOPT_LOW_SPEED_TIME => self::BULK_STALL_TIMEOUT,
+            CURLOPT_WRITEFUNCTION => function($curl, $chunk) use (&$buffer, &$received, $onresult) {
+                if (curl_getinfo($curl, CURLINFO_HTTP_CODE) !== 200) {
+                    $buffer .= $chunk;
+                    return strlen($chunk);
+                }
+
+                $buffer .= $chunk;
+                while (($pos = strpos($buffer, "\n")) !== false) {
+                    $line = substr($buffer, 0, $pos);
+                    $buffer = substr($buffer, $pos + 1);
+
+                    $job = json_decode($line, true);
+                    if (!is_array($job) || !isset($job['document_id'])) {
+                        continue;
+                    }
+                    $received++;
+                    $onresult($job);
+                }
+
+                return strlen($chunk);
+            },
         ]);
 
+        curl_exec($curl);
+        $httpcode = curl_getinfo($curl, CURLINFO_HTTP_CODE);
+        $error = curl_error($curl);
+
+        curl_close($curl);
+
+        if ($error) {
+            throw new \Exception('Backend connection error: ' . $error);
+        }
+
+        if ($httpcode !== 200) {
+            $response = json_decode($buffer, true);
+            $detail = is_array($response) && is_string($response['detail'] ?? null) ? ': ' . $response['detail'] : '';
+            throw new \Exception('Backend error: HTTP ' . $httpcode . $detail);
+        }
+
+        return $received;
+    }
+
+    /**
+     * Get the latest ingestion job of a document
+     *
+     * @param string $backendurl Backend URL
+     * @param int $documentid Document ID
+     * @return array|null Job with status, progress and result, or null if the backend has none
+     */
+    public static function get_document_job($backendurl, $documentid) {
+        $url = rtrim($backendurl, '/') . '/api/documents/' . (int)$documentid . '/job';
+        return self::send_request($url, null, [self::HTTP_NOT_FOUND]);
+    }
+
+    /**
+     * Remove a document from the backend knowledge base
+     *
+     * @param string $backendurl Backend URL
+     * @param int $documentid Document ID
+     * @return bool False if the backend did not know the document
+     */
+    public static function delete_document($backendurl, $documentid) {
+        $url = rtrim($backendurl, '/') . '/api/documents/' . (int)$documentid;
+        return self::send_request($url, null, [self::HTTP_NOT_FOUND], false, 'DELETE') !== null;
+    }
+
+    /**
+     * Remove URL documents the backend still refreshes but Moodle no longer has
+     *
+     * @param string $backendurl Backend URL
+     * @param array $documentids IDs of all documents that still exist
+     * @return array IDs of the documents the backend deleted
+     */
+    public static function prune_url_documents($backendurl, array $documentids) {
+        $url = rtrim($backendurl, '/') . '/api/documents/prune-urls';
+        $response = self::send_request($url, ['document_ids' => array_map('intval', array_values($documentids))]);
+        return $response['pruned'] ?? [];
+    }
+
+    /**
+     * Send HTTP request
+     *
+     * @param string $url URL
+     * @param array|null $data Request data, or null for a GET request
+     * @param array $allowedcodes HTTP error codes to report as null instead of throwing
+     * @param bool $multipart Send $data as multipart form data instead of JSON
+     * @param string|null $method HTTP method overriding GET/POST
+     * @return array|null Response
+     */
+    private static function send_request($url, $data, $allowedcodes = [], $multipart = false, $method = null) {
+        $curl = curl_init();
+
+        $options = [
+            CURLOPT_URL => $url,
+            CURLOPT_RETURNTRANSFER => true,
+            CURLOPT_TIMEOUT => $multipart ? self::UPLOAD_TIMEOUT : 60,
+        ];
+        if ($method !== null) {
+            $options[CURLOPT_CUSTOMREQUEST] = $method;
+        }
+        if ($data !== null && $multipart) {
+            $options[CURLOPT_POST] = true;
+            $options[CURLOPT_POSTFIELDS] = $data;
+        } else if ($data !== null) {
+            $options[CURLOPT_POST] = true;
+            $options[CURLOPT_POSTFIELDS] = json_encode($data);
+            $options[CURLOPT_HTTPHEADER] = [
+                'Content-Type: application/json',
+            ];
+        }
+        curl_setopt_array($curl, $options);
+
         $response = curl_exec($curl);
         $httpcode = curl_getinfo($curl, CURLINFO_HTTP_CODE);
         $error = curl_error($curl);
@@ -102,6 +379,10 @@ class api_client {
             throw new \Exception('Backend connection error: ' . $error);
         }
 
+        if (in_array($httpcode, $allowedcodes, true)) {
+            return null;
+        }
+
         if ($httpcode !== 200) {
             throw new \Exception('Backend error: HTTP ' . $httpcode);
         }
@@ -114,6 +395,58 @@ class api_client {
         return $result;
     }
 
+    /**
+     * Build the request body for chat endpoints
+     *
+     * @param string $message User message
+     * @param array|null $history Chat history, or null to rely on the backend session
+     * @param int|null $userage User age
+     * @param int|null $chatid Chat ID
+     * @return array Request data
+     */
+    private static function build_chat_data($message, $history, $userage, $chatid = null, $courseid = 0) {
+        $data = [
+            'message' => $message,
+            'user_age' => $userage,
+            'chat_id' => $chatid,
+            'course_id' => (int)$courseid,
+            'llm_provider' => get_config('local_aiassistant', 'llmprovider'),
+            'api_key' => self::get_api_key(),
+        ];
+
+        if ($history !== null) {
+            $data['history'] = self::format_history($history);
+        }
+
+        return $data;
+    }
+
+    /**
+     * Parse a Server-Sent Events frame
+     *
+     * @param string $frame Raw frame including the trailing blank line
+     * @return array|null Decoded event data, or null if the frame has none
+     */
+    private static function parse_sse_frame($frame) {
+        $data = '';
+        foreach (explode("\n", $frame) as $line) {
+            if (strpos($line, 'data:') === 0) {
+                $data .= ltrim(substr($line, 5));
+            }
+        }
+
+        if ($data === '') {
+            return null;
+        }
+
+        $event = json_decode($data, true);
+        if (!is_array($event) || !isset($event['type'])) {
+            return null;
+        }
+
+        return $event;
+    }
+
     /**
      * Format chat history for backend
      *
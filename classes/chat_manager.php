@@ -28,15 +28,17 @@ class chat_manager {
      * @param int $userid User ID
      * @param string $theme Theme name
      * @param string $title Optional title
+     * @param int $courseid Course the chat was started in, 0 for none
      * @return int Chat ID
      */
-    public static function create_chat($userid, $theme = 'default', $title = '') {
+    public static function create_chat($userid, $theme = 'default', $title = '', $courseid = 0) {
         global $DB;
 
         $chat = new \stdClass();
         $chat->userid = $userid;
         $chat->theme = $theme;
         $chat->title = $title;
+        $chat->courseid = $courseid;
         $chat->timecreated = time();
         $chat->timemodified = time();
 
@@ -130,6 +132,34 @@ class chat_manager {
         return $DB->get_record('local_aiassistant_chats', ['id' => $chatid]);
     }
 
+    /**
+     * Get the course a chat's document retrieval is limited to
+     *
+     * Access is checked on every call, so a user unenrolled from the course
+     * can no longer retrieve its documents through an older chat.
+     *
+     * @param int $chatid Chat ID
+     * @return int Course ID, 0 for none or a deleted course
+     */
+    public static function get_course_id($chatid) {
+        global $DB;
+
+        $chat = self::get_chat($chatid);
+        if (!$chat || empty($chat->courseid)) {
+            return 0;
+        }
+
+        $course = $DB->get_record('course', ['id' => $chat->courseid]);
+        if (!$course) {
+            return 0;
+        }
+        if (!can_access_course($course)) {
+            throw new \moodle_exception('nopermission');
+        }
+
+        return (int)$course->id;
+    }
+
     /**
      * Delete a chat and its messages
      *
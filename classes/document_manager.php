@@ -26,13 +26,14 @@ class document_manager {
      * Add a document record
      *
      * @param string $title Document title
-     * @param string $sourcetype Source type (pdf, url)
+     * @param string $sourcetype Source type (pdf, url, site)
      * @param int $uploaderid Uploader user ID
      * @param string $sourceurl Optional source URL
      * @param string $filepath Optional file path
+     * @param int $courseid Course whose chats may use the document, 0 for site-wide
      * @return int Document ID
      */
-    public static function add_document($title, $sourcetype, $uploaderid, $sourceurl = '', $filepath = '') {
+    public static function add_document($title, $sourcetype, $uploaderid, $sourceurl = '', $filepath = '', $courseid = 0) {
         global $DB;
 
         $document = new \stdClass();
@@ -40,6 +41,7 @@ class document_manager {
         $document->sourcetype = $sourcetype;
         $document->sourceurl = $sourceurl;
         $document->filepath = $filepath;
+        $document->courseid = $courseid;
         $document->status = 'pending';
         $document->chunks = 0;
         $document->uploaderid = $uploaderid;
@@ -69,6 +71,96 @@ class document_manager {
         return $DB->update_record('local_aiassistant_documents', $document);
     }
 
+    /**
+     * Refresh a document's status from its backend ingestion job
+     *
+     * @param int $documentid Document ID
+     * @return array Status, chunk count and job progress
+     */
+    public static function refresh_status($documentid) {
+        $document = self::get_document($documentid);
+        if (!$document) {
+            throw new \moodle_exception('invalidrecord');
+        }
+
+        $progress = null;
+        if ($document->status === 'pending' || $document->status === 'processing') {
+            $backendurl = get_config('local_aiassistant', 'backendurl');
+            $job = api_client::get_document_job($backendurl, $documentid);
+
+            if ($job !== null) {
+                $progress = $job['progress'];
+                self::apply_job($document, $job);
+                $document = self::get_document($documentid);
+            }
+        }
+
+        return [
+            'status' => $document->status,
+            'statuslabel' => get_string('status_' . $document->status, 'local_aiassistant'),
+            'chunks' => (int)$document->chunks,
+            'progress' => $progress,
+        ];
+    }
+
+    /**
+     * Ingest several documents in one bulk request
+     *
+     * Each document's status is updated as soon as the backend reports its
+     * job finished, so a long onboarding run shows progress per document.
+     * Documents not reported (e.g. if the connection drops) keep their
+     * status and are picked up by refresh_status().
+     *
+     * @param array $documentids Document IDs
+     * @param callable|null $onresult Called with (object $document, array $job) after each status update
+     * @return int Number of documents the backend reported on
+     */
+    public static function ingest_documents(array $documentids, ?callable $onresult = null) {
+        global $DB;
+
+        $documents = $DB->get_records_list('local_aiassistant_documents', 'id', $documentids);
+        if (!$documents) {
+            return 0;
+        }
+
+        $items = [];
+        foreach ($documents as $document) {
+            $item = ['documentid' => $document->id, 'courseid' => $document->courseid];
+            if ($document->sourcetype === 'pdf') {
+                $items[] = $item + ['source' => $document->filepath, 'type' => 'pdf'];
+            } else {
+                $type = $document->sourcetype === 'site' ? 'crawl' : 'url';
+                $items[] = $item + ['source' => $document->sourceurl, 'type' => $type];
+            }
+        }
+
+        $backendurl = get_config('local_aiassistant', 'backendurl');
+        return api_client::ingest_bulk($backendurl, $items, function($job) use ($documents, $onresult) {
+            if (isset($documents[$job['document_id']])) {
+                self::apply_job($documents[$job['document_id']], $job);
+                if ($onresult !== null) {
+                    $onresult($documents[$job['document_id']], $job);
+                }
+            }
+        });
+    }
+
+    /**
+     * Update a document's status from its backend ingestion job
+     *
+     * @param object $document Document record
+     * @param array $job Job as returned by the backend
+     */
+    private static function apply_job($document, $job) {
+        if ($job['status'] === 'done') {
+            self::update_status($document->id, 'completed', $job['result']['chunks'] ?? 0);
+        } else if ($job['status'] === 'failed') {
+            self::update_status($document->id, 'failed');
+        } else if ($document->status !== 'processing') {
+            self::update_status($document->id, 'processing');
+        }
+    }
+
     /**
      * Get all documents
      *
@@ -104,6 +196,13 @@ class document_manager {
             return false;
         }
 
+        // Remove its chunks from the backend, which also stops URL refreshes
+        try {
+            api_client::delete_document(get_config('local_aiassistant', 'backendurl'), $documentid);
+        } catch (\Exception $e) {
+            debugging('Could not delete document ' . $documentid . ' from the backend: ' . $e->getMessage());
+        }
+
         // Delete file if exists
         if (!empty($document->filepath)) {
             @unlink($document->filepath);
@@ -0,0 +1,50 @@
+<?php
+// This file is part of Moodle - http://moodle.org/
+//
+// Moodle is free software: you can redistribute it and/or modify
+// it under the terms of the GNU General Public License as published by
+// the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+
+/**
+ * Scheduled removal of deleted URL documents from the backend
+ *
+ * @package    local_aiassistant
+ * @copyright  2024 AI Assistant Team
+ * @license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+ */
+
+namespace local_aiassistant\task;
+
+use local_aiassistant\api_client;
+
+defined('MOODLE_INTERNAL') || die();
+
+/**
+ * Delete URL documents from the backend that no longer exist in Moodle
+ *
+ * Deleting a document only reaches the backend if it is up at that moment;
+ * otherwise the backend would keep refreshing the URL indefinitely.
+ */
+class prune_url_documents extends \core\task\scheduled_task {
+    /**
+     * Get the task name
+     *
+     * @return string Task name
+     */
+    public function get_name() {
+        return get_string('task_prune_url_documents', 'local_aiassistant');
+    }
+
+    /**
+     * Run the task
+     */
+    public function execute() {
+        global $DB;
+
+        $documentids = $DB->get_fieldset_select('local_aiassistant_documents', 'id', '');
+        $pruned = api_client::prune_url_documents(get_config('local_aiassistant', 'backendurl'), $documentids);
+
+        mtrace('Removed ' . count($pruned) . ' deleted URL documents from the backend');
+    }
+}
@@ -0,0 +1,104 @@
+<?php
+// This file is part of Moodle - http://moodle.org/
+//
+// Moodle is free software: you can redistribute it and/or modify
+// it under the terms of the GNU General Public License as published by
+// the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+
+/**
+ * Ingest knowledge base documents in bulk requests
+ *
+ * @package    local_aiassistant
+ * @copyright  2024 AI Assistant Team
+ * @license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+ */
+
+define('CLI_SCRIPT', true);
+
+require(__DIR__ . '/../../../config.php');
+require_once($CFG->libdir . '/clilib.php');
+
+list($options, $unrecognized) = cli_get_params([
+    'help' => false,
+    'all' => false,
+    'status' => 'pending,failed',
+    'course' => null,
+    'ids' => '',
+    'batch' => 100,
+], [
+    'h' => 'help',
+]);
+
+if ($unrecognized) {
+    cli_error(get_string('cliunknowoption', 'admin', implode("\n  ", $unrecognized)));
+}
+
+if ($options['help']) {
+    echo "Ingest knowledge base documents through the backend's bulk endpoint, which shares
+embedding and upsert batches across documents. Use it after adding many documents
+to a course, or to retry failed ones. Statuses are updated as documents finish.
+
+Options:
+-h, --help        Print out this help
+--all             Ingest every document, whatever its status
+--status=LIST     Comma-separated statuses to ingest (default: pending,failed)
+--course=ID       Only documents of this course, 0 for site-wide ones
+--ids=LIST        Only these comma-separated document IDs
+--batch=N         Documents per bulk request (default: 100)
+
+Example:
+\$ sudo -u www-data /usr/bin/php local/aiassistant/cli/ingest_documents.php --course=12
+";
+    exit(0);
+}
+
+$where = [];
+$params = [];
+if (!$options['all']) {
+    $statuses = array_filter(array_map('trim', explode(',', $options['status'])));
+    list($sql, $statusparams) = $DB->get_in_or_equal($statuses, SQL_PARAMS_NAMED, 'status');
+    $where[] = 'status ' . $sql;
+    $params += $statusparams;
+}
+if ($options['course'] !== null) {
+    $where[] = 'courseid = :courseid';
+    $params['courseid'] = (int)$options['course'];
+}
+if ($options['ids'] !== '') {
+    $ids = array_map('intval', explode(',', $options['ids']));
+    list($sql, $idparams) = $DB->get_in_or_equal($ids, SQL_PARAMS_NAMED, 'id');
+    $where[] = 'id ' . $sql;
+    $params += $idparams;
+}
+
+$documentids = $DB->get_fieldset_select('local_aiassistant_documents', 'id', implode(' AND ', $where), $params);
+if (!$documentids) {
+    cli_writeln('No documents to ingest.');
+    exit(0);
+}
+
+$batches = array_chunk($documentids, max(1, (int)$options['batch']));
+cli_writeln('Ingesting ' . count($documentids) . ' documents in ' . count($batches) . ' bulk requests');
+
+$failed = 0;
+foreach ($batches as $batch) {
+    try {
+        $received = \local_aiassistant\document_manager::ingest_documents($batch, function($document, $job) use (&$failed) {
+            if ($job['status'] === 'failed') {
+                $failed++;
+            }
+            cli_writeln('  ' . $document->id . ' ' . $document->title . ': ' . $job['status']
+                . (!empty($job['error']) ? ' (' . $job['error'] . ')' : ''));
+        });
+    } catch (\Exception $e) {
+        cli_error('Bulk request failed: ' . $e->getMessage());
+    }
+
+    if ($received < count($batch)) {
+        cli_writeln('  ' . (count($batch) - $received) . ' documents still running; their status updates when polled');
+    }
+}
+
+cli_writeln('Done, ' . $failed . ' failed.');
+exit($failed ? 1 : 0);
@@ -17,14 +17,22 @@
 require_once(__DIR__ . '/../../config.php');
 require_once($CFG->libdir . '/adminlib.php');
 
-require_login();
-require_capability('local/aiassistant:use', context_system::instance());
-
 $chatid = optional_param('chatid', 0, PARAM_INT);
 $theme = optional_param('theme', '', PARAM_ALPHA);
+$courseid = optional_param('courseid', 0, PARAM_INT);
+
+// Opened from a course, new chats only draw on its documents and site-wide ones
+if ($courseid) {
+    $course = get_course($courseid);
+    require_login($course);
+    $PAGE->set_url(new moodle_url('/local/aiassistant/index.php', ['courseid' => $courseid]));
+} else {
+    require_login();
+    $PAGE->set_url(new moodle_url('/local/aiassistant/index.php'));
+    $PAGE->set_context(context_system::instance());
+}
+require_capability('local/aiassistant:use', context_system::instance());
 
-$PAGE->set_url(new moodle_url('/local/aiassistant/index.php'));
-$PAGE->set_context(context_system::instance());
 $PAGE->set_title(get_string('aiassistant', 'local_aiassistant'));
 $PAGE->set_heading(get_string('aiassistant', 'local_aiassistant'));
 $PAGE->set_pagelayout('standard');
@@ -39,6 +47,7 @@ if (empty($theme)) {
 $PAGE->requires->js_call_amd('local_aiassistant/chat', 'init', [
     'userid' => $USER->id,
     'chatid' => $chatid,
+    'courseid' => $courseid,
     'theme' => $theme,
     'backendurl' => get_config('local_aiassistant', 'backendurl'),
     'sesskey' => sesskey(),
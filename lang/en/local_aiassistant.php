@@ -67,6 +67,8 @@ $string['uploaddocument'] = 'Upload Document';
 $string['addurl'] = 'Add URL';
 $string['documenttitle'] = 'Document Title';
 $string['documenturl'] = 'Document URL';
+$string['crawlsite'] = 'Crawl the whole site (follows links, or every page of a sitemap.xml)';
+$string['sitewide'] = 'Site-wide (all courses)';
 $string['documentfile'] = 'Document File';
 $string['upload'] = 'Upload';
 $string['add'] = 'Add';
@@ -89,6 +91,9 @@ $string['documentdeleted'] = 'Document deleted successfully';
 $string['chatsaved'] = 'Chat saved';
 $string['chatdeleted'] = 'Chat deleted';
 
+// Tasks
+$string['task_prune_url_documents'] = 'Remove deleted URL documents from the backend';
+
 // Privacy
 $string['privacy:metadata:local_aiassistant_chats'] = 'Information about user chat sessions';
 $string['privacy:metadata:local_aiassistant_chats:userid'] = 'The ID of the user';
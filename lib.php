@@ -0,0 +1,39 @@
+<?php
+// This file is part of Moodle - http://moodle.org/
+//
+// Moodle is free software: you can redistribute it and/or modify
+// it under the terms of the GNU General Public License as published by
+// the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+
+/**
+ * Navigation callbacks for AI Assistant
+ *
+ * @package    local_aiassistant
+ * @copyright  2024 AI Assistant Team
+ * @license    http://www.gnu.org/copyleft/gpl.html GNU GPL v3 or later
+ */
+
+defined('MOODLE_INTERNAL') || die();
+
+/**
+ * Link a course to its course-scoped assistant
+ *
+ * @param navigation_node $navigation Course navigation node
+ * @param stdClass $course Course
+ * @param context_course $context Course context
+ */
+function local_aiassistant_extend_navigation_course($navigation, $course, $context) {
+    if (!has_capability('local/aiassistant:use', context_system::instance())) {
+        return;
+    }
+
+    $navigation->add(
+        get_string('aiassistant', 'local_aiassistant'),
+        new moodle_url('/local/aiassistant/index.php', ['courseid' => $course->id]),
+        navigation_node::TYPE_CUSTOM,
+        null,
+        'local_aiassistant',
+        new pix_icon('i/chats', '')
+    );
+}
@@ -39,6 +39,14 @@ $PAGE->requires->js_call_amd('local_aiassistant/documents', 'init', [
     'sesskey' => sesskey(),
 ]);
 
+// Course choices; site-wide documents are used in every course's chats
+$courseoptions = [0 => get_string('sitewide', 'local_aiassistant')];
+foreach (get_courses('all', 'c.fullname ASC', 'c.id, c.fullname') as $course) {
+    if ($course->id != SITEID) {
+        $courseoptions[$course->id] = format_string($course->fullname);
+    }
+}
+
 echo $OUTPUT->header();
 
 // Upload form
@@ -68,6 +76,8 @@ echo html_writer::empty_tag('input', [
     'required' => 'required',
     'class' => 'form-control',
 ]);
+echo html_writer::label(get_string('course'), 'pdf-course');
+echo html_writer::select($courseoptions, 'courseid', 0, false, ['id' => 'pdf-course', 'class' => 'custom-select']);
 echo html_writer::tag('button', get_string('upload', 'local_aiassistant'), [
     'type' => 'submit',
     'class' => 'btn btn-primary',
@@ -95,6 +105,18 @@ echo html_writer::empty_tag('input', [
     'required' => 'required',
     'class' => 'form-control',
 ]);
+echo html_writer::label(get_string('course'), 'url-course');
+echo html_writer::select($courseoptions, 'courseid', 0, false, ['id' => 'url-course', 'class' => 'custom-select']);
+echo html_writer::start_div('form-check');
+echo html_writer::empty_tag('input', [
+    'type' => 'checkbox',
+    'id' => 'url-crawl',
+    'name' => 'crawl',
+    'value' => 1,
+    'class' => 'form-check-input',
+]);
+echo html_writer::label(get_string('crawlsite', 'local_aiassistant'), 'url-crawl', true, ['class' => 'form-check-label']);
+echo html_writer::end_div();
 echo html_writer::tag('button', get_string('add', 'local_aiassistant'), [
     'type' => 'submit',
     'class' => 'btn btn-primary',
@@ -115,6 +137,7 @@ if (empty($documents)) {
     $table->head = [
         get_string('documenttitle', 'local_aiassistant'),
         get_string('sourcetype', 'local_aiassistant'),
+        get_string('course'),
         get_string('status', 'local_aiassistant'),
         get_string('chunks', 'local_aiassistant'),
         get_string('uploadedby', 'local_aiassistant'),
@@ -130,18 +153,25 @@ if (empty($documents)) {
             'sesskey' => sesskey(),
         ]);
 
-        $table->data[] = [
+        // Status and chunk cells are updated by documents.js while ingestion runs
+        $row = new html_table_row([
             $doc->title,
             $doc->sourcetype,
-            get_string('status_' . $doc->status, 'local_aiassistant'),
-            $doc->chunks,
+            $courseoptions[$doc->courseid] ?? $doc->courseid,
+            new html_table_cell(get_string('status_' . $doc->status, 'local_aiassistant')),
+            new html_table_cell($doc->chunks),
             fullname($uploader),
             userdate($doc->timecreated),
             html_writer::link($deleteurl, get_string('delete'), [
                 'class' => 'btn btn-danger btn-sm',
                 'onclick' => 'return confirm("' . get_string('confirmdelete', 'local_aiassistant') . '");',
             ]),
-        ];
+        ]);
+        $row->attributes['data-documentid'] = $doc->id;
+        $row->attributes['data-status'] = $doc->status;
+        $row->cells[3]->attributes['class'] = 'document-status';
+        $row->cells[4]->attributes['class'] = 'document-chunks';
+        $table->data[] = $row;
     }
 
     echo html_writer::table($table);
@@ -17,7 +17,7 @@
 defined('MOODLE_INTERNAL') || die();
 
 $plugin->component = 'local_aiassistant';
-$plugin->version = 2024111300;  // YYYYMMDDXX
+$plugin->version = 2026101701;  // YYYYMMDDXX
 $plugin->requires = 2022041900; // Moodle 4.0
 $plugin->maturity = MATURITY_STABLE;
 $plugin->release = 'v1.0.0';